@@ -0,0 +1,92 @@
+import re
+import tarfile
+import logging
+from urllib.parse import urlsplit
+
+import requests
+
+# codeload 直接返回仓库归档，不占用 REST API 的速率配额
+CODELOAD_URL = 'https://codeload.github.com'
+# 单个源文件超过该大小时跳过，避免把生成代码或数据文件送进解析器
+MAX_MEMBER_BYTES = 5 * 1024 * 1024
+
+SHA_PATTERN = re.compile(r'^[0-9a-f]{40}$')
+
+
+def parse_commit_sha(download_url):
+    """
+    从 raw.githubusercontent.com/{owner}/{repo}/{sha}/{path} 形式的 download_url 中取出提交 SHA
+    """
+    parts = urlsplit(download_url or '').path.split('/')
+    if len(parts) > 3 and SHA_PATTERN.match(parts[3]):
+        return parts[3]
+    return None
+
+
+def iter_archive_python_files(repo_full_name, sha, headers=None, timeout=(10, 300),
+                              path_filter=None, base_url=CODELOAD_URL):
+    """
+    流式下载并解压仓库在指定提交的 tar.gz 归档，不落盘，逐个产出 (文件路径, 代码内容)。
+    只处理 .py 文件，path_filter 可进一步按路径过滤
+    """
+    url = f'{base_url}/{repo_full_name}/tar.gz/{sha}'
+    with requests.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        # 'r|gz' 按顺序读取归档流，内存中只保留当前成员
+        with tarfile.open(fileobj=response.raw, mode='r|gz') as tar:
+            for member in tar:
+                if not member.isfile() or not member.name.endswith('.py'):
+                    continue
+                # 归档内的路径带有 {repo}-{sha}/ 前缀
+                file_path = member.name.split('/', 1)[1] if '/' in member.name else member.name
+                if path_filter is not None and not path_filter(file_path):
+                    continue
+                if member.size > MAX_MEMBER_BYTES:
+                    logging.info(f'跳过过大的文件 {repo_full_name}/{file_path}：{member.size} 字节')
+                    continue
+                data = tar.extractfile(member).read()
+                yield file_path, data.decode('utf-8', errors='ignore')
+
+
+def replay_from_cache(repo_full_name, sha, handle_file, cache):
+    """
+    归档内容已全部在缓存中时直接重放，不联网；清单或任一文件缺失时返回 False
+    """
+    manifest = cache.get_json(f'archive:{repo_full_name}@{sha}')
+    if manifest is None:
+        return False
+    sources = []
+    for file_path in manifest:
+        data = cache.get_pinned(repo_full_name, sha, file_path)
+        if data is None:
+            return False
+        sources.append((file_path, data.decode('utf-8', errors='ignore')))
+    for file_path, code_content in sources:
+        handle_file(file_path, code_content)
+    return True
+
+
+def ingest_repository(repo_full_name, download_url, handle_file, cache=None, **kwargs):
+    """
+    一次请求处理仓库中全部 .py 文件，每个文件解压后立即交给 handle_file(文件路径, 代码内容)。
+    download_url 中没有提交 SHA 或下载失败时返回 False，由调用方退回逐文件下载。
+    提供 cache（HttpCache）时按 (仓库, 提交, 路径) 缓存每个文件和归档清单，重跑时不再下载
+    """
+    sha = parse_commit_sha(download_url)
+    if sha is None:
+        return False
+    if cache is not None and replay_from_cache(repo_full_name, sha, handle_file, cache):
+        return True
+    manifest = []
+    try:
+        for file_path, code_content in iter_archive_python_files(repo_full_name, sha, **kwargs):
+            if cache is not None:
+                cache.put_pinned(repo_full_name, sha, file_path, code_content)
+                manifest.append(file_path)
+            handle_file(file_path, code_content)
+    except (requests.exceptions.RequestException, tarfile.TarError, EOFError, OSError) as e:
+        logging.error(f'下载仓库归档 {repo_full_name}@{sha} 失败：{e}')
+        return False
+    if cache is not None:
+        cache.put_json([f'archive:{repo_full_name}@{sha}'], manifest)
+    return True
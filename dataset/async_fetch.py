@@ -0,0 +1,198 @@
+import time
+import asyncio
+import base64
+import logging
+import threading
+from urllib.parse import urlsplit
+
+import httpx
+
+try:
+    import h2  # noqa: F401  安装了 h2 时启用 HTTP/2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class AsyncFetcher:
+    """
+    基于 asyncio 的下载引擎：共享长连接池，全局并发上限加每个主机的并发上限，
+    令牌由 TokenScheduler 分配，403 / 滥用检测的处理与 send_request 保持一致
+    """
+
+    def __init__(self, scheduler, base_url='https://api.github.com', max_concurrency=64,
+                 per_host_limit=32, timeout=(10, 60), http2=True, cache=None):
+        self.scheduler = scheduler
+        self.cache = cache
+        self.base_url = base_url.rstrip('/')
+        self.max_concurrency = max_concurrency
+        self.per_host_limit = per_host_limit
+        self.timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.client = None
+        self.global_semaphore = None
+        self.host_semaphores = {}
+        self.loop = None
+        self.thread = None
+        self.requests_sent = 0
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def open(self):
+        limits = httpx.Limits(max_connections=self.max_concurrency,
+                              max_keepalive_connections=self.max_concurrency)
+        self.client = httpx.AsyncClient(http2=self.http2, limits=limits, timeout=self.timeout)
+        self.global_semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.host_semaphores = {}
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def _host_semaphore(self, url):
+        host = urlsplit(url).netloc
+        if host not in self.host_semaphores:
+            self.host_semaphores[host] = asyncio.Semaphore(self.per_host_limit)
+        return self.host_semaphores[host]
+
+    async def send_request(self, url, etag=None):
+        """
+        异步版 send_request，返回 httpx.Response；带 etag 时发条件请求，可能返回 304
+        """
+        while True:
+            # acquire 可能阻塞等待令牌，放到线程里执行，不占用事件循环；等待令牌和退避期间不占用并发名额，
+            # 一个被限流或出错的主机不会拖住其他请求
+            token_index = await asyncio.to_thread(self.scheduler.acquire)
+            headers = self.scheduler.headers(token_index)
+            if etag:
+                headers['If-None-Match'] = etag
+            try:
+                # 全局和每主机的并发上限只约束真正的 HTTP 请求
+                async with self.global_semaphore, self._host_semaphore(url):
+                    response = await self.client.get(url, headers=headers)
+            except BaseException:
+                self.scheduler.update(token_index)
+                raise
+            self.scheduler.update(token_index, response.status_code, response.headers)
+            self.requests_sent += 1
+
+            if response.status_code in (200, 304):
+                return response
+
+            elif response.status_code == 403:
+                remaining = response.headers.get('X-RateLimit-Remaining')
+                if remaining is not None and int(remaining) == 0:
+                    continue
+
+                elif 'abuse' in response.text.lower():
+                    logging.error(f'滥用检测机制触发：{response.text}')
+                    self.scheduler.backoff(token_index, int(response.headers.get('Retry-After', 60)))
+                    continue
+
+                else:
+                    logging.error(f'403 错误：{response.text}')
+                    await asyncio.sleep(10)
+                    return response
+
+            else:
+                logging.error(f'请求错误：{response.status_code}，响应内容：{response.text}')
+                await asyncio.sleep(10)
+                return response
+
+    async def download_file(self, repo_full_name, file_path, sha=None, max_retries=10):
+        """
+        异步版 download_file，返回 (代码内容, 文件路径)，失败时内容为空字符串；
+        有提交 SHA 时按该提交获取并优先读缓存
+        """
+        url = f'{self.base_url}/repos/{repo_full_name}/contents/{file_path}'
+        if sha:
+            url += f'?ref={sha}'
+        etag, cached = None, None
+        if self.cache is not None:
+            if sha:
+                cached = self.cache.get_pinned(repo_full_name, sha, file_path)
+                if cached is not None:
+                    return cached.decode('utf-8', errors='ignore'), file_path
+            else:
+                etag, cached = self.cache.get_conditional(url)
+        retries = 0
+        while retries < max_retries:
+            try:
+                response = await self.send_request(url, etag)
+                if response.status_code == 304:
+                    self.cache.mark_revalidated()
+                    return cached.decode('utf-8', errors='ignore'), file_path
+                if response.status_code != 200:
+                    logging.error(f'无法下载文件 {file_path}，仓库 {repo_full_name}：{response.status_code}')
+                    return '', file_path
+                payload = response.json()
+                content = payload.get('content', '')
+                if not content:
+                    return '', file_path
+                raw = base64.b64decode(content)
+                if self.cache is not None:
+                    if not sha:
+                        self.cache.mark_miss()
+                    self.cache.store_contents(url, repo_full_name, sha, file_path, raw,
+                                              payload.get('sha'), response.headers.get('ETag'))
+                return raw.decode('utf-8', errors='ignore'), file_path
+            except httpx.TransportError as e:
+                logging.error(f'网络错误，下载 {file_path} 时出错：{e}')
+                retries += 1
+                await asyncio.sleep(5)
+            except Exception as e:
+                logging.error(f'下载文件 {file_path} 时发生未知错误：{e}')
+                return '', file_path
+
+        logging.error(f'下载文件 {file_path} 失败，超过最大重试次数 {max_retries}')
+        return '', file_path
+
+    async def _download_timed(self, repo_full_name, file_path, sha=None):
+        # 单个文件从发起到取回的耗时，包括等待并发名额和令牌的时间，供下载阶段的吞吐统计
+        start = time.perf_counter()
+        code_content, file_path = await self.download_file(repo_full_name, file_path, sha)
+        return code_content, file_path, time.perf_counter() - start
+
+    async def download_many(self, repo_full_name, file_paths, sha=None, timed=False):
+        """
+        并发下载一个仓库的多个文件，返回 [(代码内容, 文件路径)]；timed 为 True 时每项再加上下载耗时（秒）
+        """
+        download = self._download_timed if timed else self.download_file
+        return await asyncio.gather(*(download(repo_full_name, path, sha) for path in file_paths))
+
+    def start_background(self):
+        """
+        在后台线程里运行事件循环，供线程池中的同步代码调用
+        """
+        ready = threading.Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            self.loop.run_until_complete(self.open())
+            ready.set()
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        ready.wait()
+        return self
+
+    def stop_background(self):
+        asyncio.run_coroutine_threadsafe(self.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+    def download_many_sync(self, repo_full_name, file_paths, sha=None, timed=False):
+        """
+        同步接口：把一个仓库的所有文件一次性交给事件循环，阻塞直到全部完成
+        """
+        future = asyncio.run_coroutine_threadsafe(self.download_many(repo_full_name, file_paths, sha, timed),
+                                                  self.loop)
+        return future.result()
@@ -0,0 +1,595 @@
+import os
+import re
+import sys
+import json
+import sqlite3
+import pathlib
+import argparse
+
+try:
+    from json_stream import iter_records, open_writer, WHITESPACE
+except ImportError:
+    # 顶层脚本以 dataset.corpus_store 导入时，dataset 目录不在 sys.path 中
+    from dataset.json_stream import iter_records, open_writer, WHITESPACE
+
+try:
+    import pyarrow  # 读写 Parquet 语料时才需要
+    import pyarrow.parquet
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# 语料存储：把 function_pairs.json 这类整块的 JSON 数组转成可以随机访问、按列读取的文件。
+#   SQLite（.sqlite / .db）  每条记录一行，行号即原数组中的位置（偏移索引），按位置取一条是一次主键查找；
+#                             常用的筛选字段（仓库、文件）建索引，按仓库 / 文件筛选在 SQLite 内完成；
+#                             代码等大字段放在行尾，只读取前面的小字段时不必读取溢出页；读取走 mmap，不经过 read() 拷贝
+#   Parquet（.parquet）       需要 pyarrow；按列存储，筛选条件下推到行组统计信息，memory_map 读取
+# 记录中的字符串、整数、浮点数和 None 存为列；布尔、列表、字典以及首条记录中没有的字段存入 JSON 格式的 _extra 列，
+# 读出的记录与写入的逐项相等。顶层为字符串数组（bbb.json）或字典（aaa.json）的文件按 value / key + value 包装成记录。
+# 用法：
+#   python corpus_store.py convert function_pairs.json function_pairs.sqlite
+#   python corpus_store.py stats function_pairs.sqlite --column repository
+#   python corpus_store.py get function_pairs.sqlite 10
+#   python corpus_store.py export function_pairs.sqlite function_pairs.json
+
+CORPUS_SUFFIXES = ('.sqlite', '.db')
+PARQUET_SUFFIX = '.parquet'
+BATCH_SIZE = 1000
+MMAP_SIZE = 1024 * 1024 * 1024
+
+# 建索引的字段（存在时）：函数对按仓库和文件，test_code_files.json 按仓库全名和文件路径
+INDEX_COLUMNS = ('repository', 'repository_full_name', 'function_file', 'test_function_file', 'file_path')
+# 放在行尾的大字段
+LARGE_COLUMNS = ('function_code', 'test_function_code', 'code', 'source')
+
+EXTRA = '_extra'
+MISSING = '__missing__'
+COLUMN_NAME = re.compile(r'[A-Za-z_][A-Za-z0-9_]*$')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+'''
+
+
+def _is_scalar(value):
+    # bool 存进 SQLite 会变成整数，读回时无法区分，放入 _extra
+    return value is None or (isinstance(value, (str, int, float)) and not isinstance(value, bool))
+
+
+def _quote(name):
+    return f'"{name}"'
+
+
+class CorpusStore:
+    """
+    SQLite 语料存储；写入接口与 JsonlWriter 相同（write / write_all / count / close / abort），
+    读取：len(store)、store.get(位置)、store.iter_records(columns, **筛选)、store.column(字段, **筛选)、
+    store.total(**筛选)、store.group_counts(字段, **筛选)。
+    筛选条件为 字段=值，值为列表时表示其中任意一个，为 None 时表示字段为空。
+    readonly 时以只读方式打开，不修改文件（不切换日志模式、不建表、不建索引），只读的副本也能读取
+    """
+
+    def __init__(self, path, shape='records', overwrite=False, batch_size=BATCH_SIZE, mmap_size=MMAP_SIZE,
+                 readonly=False):
+        if readonly and overwrite:
+            raise ValueError('只读打开时不能覆盖语料')
+        directory = os.path.dirname(path)
+        if directory and not readonly:
+            os.makedirs(directory, exist_ok=True)
+        # overwrite 时先写临时文件，close() 时原子替换，与 JsonArrayWriter 的行为一致
+        self.path = path
+        self.readonly = readonly
+        self.atomic = overwrite
+        self.db_path = path + '.tmp' if overwrite else path
+        if overwrite:
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(self.db_path + suffix):
+                    os.remove(self.db_path + suffix)
+        self.batch_size = batch_size
+        if readonly:
+            self.conn = sqlite3.connect(f'{pathlib.Path(os.path.abspath(path)).as_uri()}?mode=ro', uri=True,
+                                        isolation_level=None)
+        else:
+            self.conn = sqlite3.connect(self.db_path, isolation_level=None)
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            self.conn.executescript(SCHEMA)
+        self.conn.execute(f'PRAGMA mmap_size={int(mmap_size)}')
+        meta = dict(self.conn.execute('SELECT key, value FROM meta'))
+        self.fields = json.loads(meta['fields']) if 'fields' in meta else None
+        self.columns = json.loads(meta['columns']) if 'columns' in meta else None
+        self.shape = meta.get('shape', shape)
+        self.pending = []
+        self.count = 0
+
+    def _create(self, record):
+        # 首条记录的字段决定列：fields 保持原来的字段顺序，columns 为存储顺序（大字段在后）
+        self.fields = [field for field in record if COLUMN_NAME.match(field) and field not in ('id', EXTRA)]
+        self.columns = ([field for field in self.fields if field not in LARGE_COLUMNS]
+                        + [field for field in self.fields if field in LARGE_COLUMNS])
+        definitions = ''.join(f'{_quote(column)}, ' for column in self.columns)
+        self.conn.execute(f'CREATE TABLE IF NOT EXISTS records (id INTEGER PRIMARY KEY, {definitions}{EXTRA} TEXT)')
+        self.conn.executemany('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', [
+            ('fields', json.dumps(self.fields)),
+            ('columns', json.dumps(self.columns)),
+            ('shape', self.shape)
+        ])
+
+    def _row(self, record):
+        values = []
+        extra = {}
+        missing = []
+        for column in self.columns:
+            if column not in record:
+                missing.append(column)
+                values.append(None)
+            elif _is_scalar(record[column]):
+                values.append(record[column])
+            else:
+                extra[column] = record[column]
+                values.append(None)
+        for field, value in record.items():
+            if field not in self.fields:
+                extra[field] = value
+        if missing:
+            extra[MISSING] = missing
+        values.append(json.dumps(extra, ensure_ascii=False) if extra else None)
+        return values
+
+    def write(self, record):
+        if not isinstance(record, dict):
+            raise ValueError(f'语料记录必须是字典：{record!r:.80}')
+        if self.columns is None:
+            self._create(record)
+        self.pending.append(self._row(record))
+        self.count += 1
+        if len(self.pending) >= self.batch_size:
+            self._flush()
+
+    def write_all(self, items):
+        for item in items:
+            self.write(item)
+        return self.count
+
+    def _flush(self):
+        if not self.pending:
+            return
+        placeholders = ', '.join('?' * (len(self.columns) + 1))
+        names = ''.join(f'{_quote(column)}, ' for column in self.columns)
+        self.conn.execute('BEGIN')
+        self.conn.executemany(f'INSERT INTO records ({names}{EXTRA}) VALUES ({placeholders})', self.pending)
+        self.conn.execute('COMMIT')
+        self.pending = []
+
+    def _record(self, row, fields):
+        # row 与 fields 对应，最后一项是 _extra；按原来的字段顺序组装，缺失的字段不出现
+        extra = json.loads(row[-1]) if row[-1] else {}
+        missing = set(extra.pop(MISSING, ()))
+        values = dict(zip(fields, row))
+        record = {}
+        for field in fields:
+            if field in extra:
+                record[field] = extra.pop(field)
+            elif field not in missing:
+                record[field] = values[field]
+        record.update(extra)
+        return record
+
+    def _where(self, filters):
+        clauses = []
+        parameters = []
+        for field, value in filters.items():
+            if self.columns is None or field not in self.columns:
+                raise ValueError(f'不能按 {field} 筛选：不是语料的列，可选：{", ".join(self.columns or [])}')
+            if value is None:
+                clauses.append(f'{_quote(field)} IS NULL')
+            elif isinstance(value, (list, tuple, set)):
+                value = list(value)
+                clauses.append(f'{_quote(field)} IN ({", ".join("?" * len(value))})')
+                parameters.extend(value)
+            else:
+                clauses.append(f'{_quote(field)} = ?')
+                parameters.append(value)
+        return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), parameters
+
+    def _projection(self, columns):
+        # 只读取需要的列；不是列的字段只可能在 _extra 中，随 _extra 一起读出
+        if columns is None:
+            return list(self.fields)
+        return [field for field in self.fields if field in columns]
+
+    def iter_records(self, columns=None, **filters):
+        """
+        按位置顺序逐条读出记录；columns 指定只读取的字段，filters 为筛选条件
+        """
+        self._flush()
+        if self.columns is None:
+            return
+        fields = self._projection(columns)
+        where, parameters = self._where(filters)
+        names = ''.join(f'{_quote(field)}, ' for field in fields)
+        cursor = self.conn.execute(f'SELECT {names}{EXTRA} FROM records{where} ORDER BY id', parameters)
+        for row in cursor:
+            record = self._record(row, fields)
+            if columns is not None:
+                record = {field: value for field, value in record.items() if field in columns}
+            yield record
+
+    def get(self, index):
+        """
+        取第 index 条记录（从 0 开始，与原 JSON 数组中的位置一致）
+        """
+        self._flush()
+        if self.columns is not None and index >= 0:
+            names = ''.join(f'{_quote(field)}, ' for field in self.fields)
+            row = self.conn.execute(f'SELECT {names}{EXTRA} FROM records WHERE id = ?', (index + 1,)).fetchone()
+            if row is not None:
+                return self._record(row, self.fields)
+        raise IndexError(f'语料中没有第 {index} 条记录')
+
+    def column(self, field, **filters):
+        """
+        只读取一列，返回值的列表；记录中没有该字段时为 None
+        """
+        return [record.get(field) for record in self.iter_records([field], **filters)]
+
+    def total(self, **filters):
+        self._flush()
+        if self.columns is None:
+            return 0
+        where, parameters = self._where(filters)
+        return self.conn.execute(f'SELECT COUNT(*) FROM records{where}', parameters).fetchone()[0]
+
+    def group_counts(self, field, **filters):
+        """
+        {字段值: 条数}，按条数从多到少
+        """
+        self._flush()
+        if self.columns is None:
+            return {}
+        if field not in self.columns:
+            raise ValueError(f'不能按 {field} 分组：不是语料的列')
+        where, parameters = self._where(filters)
+        rows = self.conn.execute(f'SELECT {_quote(field)}, COUNT(*) AS n FROM records{where} '
+                                 f'GROUP BY {_quote(field)} ORDER BY n DESC, {_quote(field)}', parameters)
+        return dict(rows.fetchall())
+
+    def __len__(self):
+        return self.total()
+
+    def iter_items(self):
+        """
+        按原文件的形状逐项读出：records 为字典，values 为原来的值，mapping 为 (键, 值)
+        """
+        for record in self.iter_records():
+            if self.shape == 'values':
+                yield record['value']
+            elif self.shape == 'mapping':
+                yield record['key'], record['value']
+            else:
+                yield record
+
+    def close(self):
+        if self.conn is None:
+            return
+        if not self.readonly:
+            self._flush()
+            if self.columns is not None:
+                # 批量写入完成后再建索引，比边写边维护索引快
+                for column in INDEX_COLUMNS:
+                    if column in self.columns:
+                        self.conn.execute(f'CREATE INDEX IF NOT EXISTS records_{column} ON records ({_quote(column)})')
+            # 写完后切回 DELETE 日志模式：合并并删除 -wal，之后只读打开时不需要创建 -wal / -shm
+            self.conn.execute('PRAGMA journal_mode=DELETE')
+        self.conn.close()
+        self.conn = None
+        if self.atomic:
+            os.replace(self.db_path, self.path)
+
+    def abort(self):
+        # 出错时丢弃临时文件，保留原来的语料
+        if self.conn is None:
+            return
+        self.pending = []
+        self.conn.close()
+        self.conn = None
+        if self.atomic:
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(self.db_path + suffix):
+                    os.remove(self.db_path + suffix)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class ParquetCorpus:
+    """
+    只读的 Parquet 语料，读取接口与 CorpusStore 相同；筛选条件下推给 pyarrow
+    """
+
+    def __init__(self, path):
+        if not PYARROW_AVAILABLE:
+            raise ImportError('读取 Parquet 语料需要安装 pyarrow')
+        self.path = path
+        self.file = pyarrow.parquet.ParquetFile(path, memory_map=True)
+        self.fields = self.file.schema_arrow.names
+
+    def _read(self, columns=None, **filters):
+        expressions = []
+        for field, value in filters.items():
+            if isinstance(value, (list, tuple, set)):
+                expressions.append((field, 'in', list(value)))
+            else:
+                expressions.append((field, '=', value))
+        return pyarrow.parquet.read_table(self.path, columns=columns, filters=expressions or None, memory_map=True)
+
+    def iter_records(self, columns=None, **filters):
+        for batch in self._read(columns, **filters).to_batches():
+            yield from batch.to_pylist()
+
+    def get(self, index):
+        # 先按行组的行数定位行组，只读取这一个行组
+        if index >= 0:
+            for group in range(self.file.num_row_groups):
+                rows = self.file.metadata.row_group(group).num_rows
+                if index < rows:
+                    return self.file.read_row_group(group).slice(index, 1).to_pylist()[0]
+                index -= rows
+        raise IndexError(f'语料中没有第 {index} 条记录')
+
+    def column(self, field, **filters):
+        return self._read([field], **filters).column(field).to_pylist()
+
+    def total(self, **filters):
+        if not filters:
+            return self.file.metadata.num_rows
+        return self._read(self.fields[:1], **filters).num_rows
+
+    def group_counts(self, field, **filters):
+        counts = {}
+        for value in self.column(field, **filters):
+            counts[value] = counts.get(value, 0) + 1
+        return dict(sorted(counts.items(), key=lambda item: -item[1]))
+
+    def __len__(self):
+        return self.total()
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class ParquetCorpusWriter:
+    """
+    分批写出 Parquet 语料，接口与 JsonlWriter 相同；列类型由第一批记录推断。
+    先写临时文件，close() 时原子替换，abort() 时删除，原来的语料不受影响
+    """
+
+    def __init__(self, path, batch_size=BATCH_SIZE * 10):
+        if not PYARROW_AVAILABLE:
+            raise ImportError('写出 Parquet 语料需要安装 pyarrow')
+        self.path = path
+        self.tmp_path = path + '.tmp'
+        self.batch_size = batch_size
+        self.writer = None
+        self.rows = []
+        self.count = 0
+
+    def write(self, record):
+        self.rows.append(record)
+        self.count += 1
+        if len(self.rows) >= self.batch_size:
+            self._flush()
+
+    def write_all(self, items):
+        for item in items:
+            self.write(item)
+        return self.count
+
+    def _flush(self):
+        if not self.rows:
+            return
+        table = pyarrow.Table.from_pylist(self.rows, schema=self.writer.schema if self.writer else None)
+        if self.writer is None:
+            self.writer = pyarrow.parquet.ParquetWriter(self.tmp_path, table.schema)
+        self.writer.write_table(table)
+        self.rows = []
+
+    def close(self):
+        self._flush()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+            os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        self.rows = []
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def is_corpus(path):
+    return path.endswith(CORPUS_SUFFIXES + (PARQUET_SUFFIX,))
+
+
+def open_corpus(path):
+    """
+    打开已有的语料：.parquet 为 ParquetCorpus，其余为 CorpusStore
+    """
+    if path.endswith(PARQUET_SUFFIX):
+        return ParquetCorpus(path)
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    return CorpusStore(path, readonly=True)
+
+
+def iter_corpus(path, columns=None, **filters):
+    """
+    逐条读取函数对，path 可以是语料文件，也可以是 JSON 数组 / JSON Lines；
+    columns 和 filters 对语料文件在存储层完成，对 JSON 文件在读出后完成
+    """
+    if is_corpus(path):
+        with open_corpus(path) as corpus:
+            yield from corpus.iter_records(columns, **filters)
+        return
+    for record in iter_records(path):
+        if any(record.get(field) not in (value if isinstance(value, (list, tuple, set)) else (value,))
+               for field, value in filters.items()):
+            continue
+        yield record if columns is None else {field: record[field] for field in columns if field in record}
+
+
+def open_corpus_writer(path):
+    """
+    按扩展名打开输出：.sqlite / .db 为 CorpusStore（覆盖原文件），.parquet 为 ParquetCorpusWriter，其余交给 json_stream
+    """
+    if path.endswith(CORPUS_SUFFIXES):
+        return CorpusStore(path, overwrite=True)
+    if path.endswith(PARQUET_SUFFIX):
+        return ParquetCorpusWriter(path)
+    return open_writer(path)
+
+
+def _top_level_char(path):
+    # JSON 文件第一个非空白字符：[ 为数组，{ 为字典
+    with open(path, 'r', encoding='utf-8') as f:
+        while True:
+            chunk = f.read(4096)
+            if not chunk:
+                return ''
+            stripped = chunk.lstrip(WHITESPACE)
+            if stripped:
+                return stripped[0]
+
+
+def _shaped_records(path):
+    # 返回 (形状, 记录迭代器)；字典形状的文件（如 aaa.json）一般不大，整个读入
+    if not path.endswith(('.jsonl', '.jsonl.gz', '.jsonl.zst')) and _top_level_char(path) == '{':
+        with open(path, 'r', encoding='utf-8') as f:
+            mapping = json.load(f)
+        return 'mapping', ({'key': key, 'value': value} for key, value in mapping.items())
+    items = iter_records(path)
+    first = next(items, None)
+    if first is None:
+        return 'records', iter(())
+
+    def chained():
+        yield first
+        yield from items
+
+    if isinstance(first, dict):
+        return 'records', chained()
+    return 'values', ({'value': item} for item in chained())
+
+
+def convert(input_path, output_path):
+    """
+    把 JSON 数组 / JSON Lines / 顶层为字典的 JSON 文件转成语料，返回记录数
+    """
+    shape, records = _shaped_records(input_path)
+    if output_path.endswith(PARQUET_SUFFIX):
+        writer = ParquetCorpusWriter(output_path)
+    else:
+        writer = CorpusStore(output_path, shape=shape, overwrite=True)
+    with writer:
+        count = writer.write_all(records)
+    print(f'已转换: {input_path} -> {output_path}（{count} 条，{shape}）')
+    return count
+
+
+def export_json(corpus_path, output_path):
+    """
+    把 SQLite 语料还原成原来形状的 JSON 文件，返回记录数
+    """
+    with CorpusStore(corpus_path, readonly=True) as store:
+        if store.shape == 'mapping':
+            with open(output_path, 'w', encoding='utf-8') as f:
+                json.dump(dict(store.iter_items()), f, ensure_ascii=False, indent=4)
+            count = store.total()
+        else:
+            with open_writer(output_path) as writer:
+                count = writer.write_all(store.iter_items())
+    print(f'已导出: {corpus_path} -> {output_path}（{count} 条）')
+    return count
+
+
+def _parse_filters(entries):
+    filters = {}
+    for entry in entries:
+        field, _, value = entry.partition('=')
+        filters.setdefault(field, []).append(value)
+    return {field: values[0] if len(values) == 1 else values for field, values in filters.items()}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='语料存储：JSON 与 SQLite / Parquet 之间的转换和查询')
+    commands = parser.add_subparsers(dest='command', required=True)
+    convert_parser = commands.add_parser('convert', help='JSON 转成语料')
+    convert_parser.add_argument('inputs', nargs='+', help='JSON 文件；多个文件时按 输入名.sqlite 输出')
+    convert_parser.add_argument('output', help='输出的语料文件（.sqlite / .db / .parquet）或目录')
+    export_parser = commands.add_parser('export', help='SQLite 语料还原成 JSON')
+    export_parser.add_argument('corpus')
+    export_parser.add_argument('output')
+    stats_parser = commands.add_parser('stats', help='统计记录数，或按一列分组计数')
+    stats_parser.add_argument('corpus')
+    stats_parser.add_argument('--column', default=None, help='分组的列，如 repository')
+    stats_parser.add_argument('--where', nargs='+', default=[], metavar='字段=值', help='筛选条件')
+    stats_parser.add_argument('--top', type=int, default=20, help='显示前几组')
+    get_parser = commands.add_parser('get', help='按位置读取一条记录')
+    get_parser.add_argument('corpus')
+    get_parser.add_argument('index', type=int)
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        if len(args.inputs) == 1 and is_corpus(args.output):
+            convert(args.inputs[0], args.output)
+        else:
+            os.makedirs(args.output, exist_ok=True)
+            for input_path in args.inputs:
+                name = os.path.splitext(os.path.basename(input_path))[0]
+                convert(input_path, os.path.join(args.output, name + '.sqlite'))
+    elif args.command == 'export':
+        export_json(args.corpus, args.output)
+    else:
+        try:
+            with open_corpus(args.corpus) as corpus:
+                if args.command == 'get':
+                    print(json.dumps(corpus.get(args.index), ensure_ascii=False, indent=4))
+                    sys.exit(0)
+                filters = _parse_filters(args.where)
+                if args.column:
+                    counts = corpus.group_counts(args.column, **filters)
+                    print(f'{sum(counts.values())} 条，{len(counts)} 个不同的 {args.column}')
+                    for value, count in list(counts.items())[:args.top]:
+                        print(f'  {count:8d}  {value}')
+                else:
+                    print(f'{corpus.total(**filters)} 条')
+        except (ValueError, IndexError, FileNotFoundError, ImportError) as e:
+            print(e)
+            sys.exit(1)
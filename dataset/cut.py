@@ -6,49 +6,225 @@ LastEditTime: 2024-09-29 19:13:57
 FilePath: \mut-project-pycharm\dataset\cut.py
 Description: 这是默认设置,请设置`customMade`, 打开koroFileHeader查看配置 进行设置: https://github.com/OBKoro1/koro1FileHeader/wiki/%E9%85%8D%E7%BD%AE
 '''
-import json
 import os
-import math
+import re
+import sys
+import json
+import hashlib
+import argparse
+from json_stream import open_writer, JsonlWriter, ZSTD_AVAILABLE
+from corpus_store import iter_corpus
+
+# 流式切分数据集：只读一遍输入，每读到一条记录就决定它去哪个分片并立即写出，内存占用与文件大小无关。
+#   均衡方式   bytes 按序列化后的字节数，tokens 按代码的词元数，count 按条数；每条记录写入当前负载最小的分片
+#   分组       指定 group_key（如 repository）时同一组的记录总在同一个分片，避免同一仓库的函数对同时出现在训练集和测试集
+#   划分       train/val/test 按组名的稳定哈希映射到 [0, 1) 再按比例划分，结果与输入顺序、机器、运行次数无关
+#   输出       紧凑的 JSON Lines，文件名以 .gz / .zst 结尾时压缩；也可以输出与原来相同的带缩进 JSON 数组
+
+BALANCE_MODES = ('bytes', 'tokens', 'count')
+FORMATS = ('jsonl', 'json')
+COMPRESSION_EXTENSIONS = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+DEFAULT_RATIOS = (('train', 0.8), ('val', 0.1), ('test', 0.1))
+GROUP_KEY = 'repository'
+
+# tokens 均衡时统计这些字段；词元按标识符、数字和单个标点粗略切分，与子词分词器的计数大致成正比
+TOKEN_FIELDS = ('function_code', 'test_function_code')
+TOKEN_PATTERN = re.compile(r'\w+|[^\w\s]')
 
-def split_json(input_file, output_dir, n):
+
+def count_tokens(item):
     """
-    将输入的 JSON 文件均匀切分为 n 个大小相同的文件
+    记录中代码字段的词元数
     """
-    # 创建输出目录（如果不存在）
-    os.makedirs(output_dir, exist_ok=True)
+    return sum(len(TOKEN_PATTERN.findall(item.get(field) or '')) for field in TOKEN_FIELDS)
 
-    # 读取 JSON 文件
-    with open(input_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
-    # 计算每个文件中的元素数量
-    total_items = len(data)
-    items_per_file = math.ceil(total_items / n)
 
-    # 分割 JSON 数据
-    for i in range(n):
-        start_index = i * items_per_file
-        end_index = min(start_index + items_per_file, total_items)
-        split_data = data[start_index:end_index]
+def stable_fraction(key, seed=0):
+    """
+    把字符串稳定地映射到 [0, 1)；不用内置 hash()，它在每次启动 Python 时都不同
+    """
+    digest = hashlib.blake2b(f'{seed}:{key}'.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') / 2 ** 64
 
-        # 创建输出文件名
-        output_file = os.path.join(output_dir, f'split_{i + 1}.json')
 
-        # 保存分割后的 JSON 文件
-        with open(output_file, 'w', encoding='utf-8') as out_f:
-            json.dump(split_data, out_f, ensure_ascii=False, indent=4)
+def choose_split(fraction, ratios):
+    """
+    按累积比例选择划分；ratios 为 ((名称, 比例), ...)，比例之和不必为 1
+    """
+    total = sum(ratio for _, ratio in ratios)
+    cumulative = 0.0
+    for name, ratio in ratios:
+        cumulative += ratio / total
+        if fraction < cumulative:
+            return name
+    return ratios[-1][0]
 
-        print(f"已保存: {output_file}")
 
-if __name__ == "__main__":
-    # 输入的 JSON 文件路径
-    input_file = 'split_1.json'  # 替换为你的 JSON 文件路径
+def shard_path(output_dir, name, fmt='jsonl', compression=None):
+    return os.path.join(output_dir, name + ('.jsonl' if fmt == 'jsonl' else '.json') + COMPRESSION_EXTENSIONS[compression])
+
+
+class ShardedWriter:
+    """
+    把记录流式分配到多个分片文件：每条记录写入当前负载最小的分片；
+    指定 group_key 时一个组在第一次出现时分配分片，之后的记录都跟随它
+    """
+
+    def __init__(self, paths, balance='bytes', group_key=None, token_counter=None):
+        if balance not in BALANCE_MODES:
+            raise ValueError(f'未知的均衡方式：{balance}')
+        self.paths = paths
+        self.balance = balance
+        self.group_key = group_key
+        self.token_counter = token_counter or count_tokens
+        self.writers = []
+        try:
+            for path in paths:
+                self.writers.append(open_writer(path))
+        except BaseException:
+            # 某个分片打不开（如缺少 zstandard）时，丢弃已经创建的临时文件
+            self.abort()
+            raise
+        self.loads = [0] * len(paths)
+        self.groups = {}
+
+    def _weight(self, item, line):
+        if self.balance == 'bytes':
+            return len(line.encode('utf-8')) + 1
+        if self.balance == 'tokens':
+            return self.token_counter(item)
+        return 1
 
-    # 输出目录
-    output_dir = 'splits'  # 分割后的文件保存目录
+    def write(self, item, line=None):
+        """
+        写入一条记录，返回分片序号；line 是已经序列化好的紧凑 JSON，没有时在这里序列化
+        """
+        if line is None:
+            line = json.dumps(item, ensure_ascii=False)
+        group = item.get(self.group_key) if self.group_key else None
+        index = self.groups.get(group) if group is not None else None
+        if index is None:
+            index = min(range(len(self.loads)), key=self.loads.__getitem__)
+            if group is not None:
+                self.groups[group] = index
+        writer = self.writers[index]
+        if isinstance(writer, JsonlWriter):
+            writer.write_line(line)
+        else:
+            writer.write(item)
+        self.loads[index] += self._weight(item, line)
+        return index
 
-    # 要分割成的文件数量
-    n = 5  # 替换为你想要分割的文件数量
+    def stats(self):
+        """
+        [(路径, 条数, 负载)]
+        """
+        return [(path, writer.count, load) for path, writer, load in zip(self.paths, self.writers, self.loads)]
 
-    # 运行分割函数
-    split_json(input_file, output_dir, n)
+    def close(self):
+        for writer in self.writers:
+            writer.close()
+
+    def abort(self):
+        for writer in self.writers:
+            writer.abort()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def _print_stats(stats, balance):
+    unit = {'bytes': '字节', 'tokens': '词元', 'count': '条'}[balance]
+    for path, count, load in stats:
+        print(f"已保存: {path}（{count} 条，{load} {unit}）")
+
+
+def split_json(input_file, output_dir, n, balance='bytes', group_key=None, fmt='jsonl', compression=None,
+               token_counter=None):
+    """
+    将输入的 JSON / JSON Lines 文件或语料（corpus_store）切分为 n 个负载均衡的分片，只读一遍输入；
+    balance 选择按字节数、词元数还是条数均衡，group_key 指定不能拆开的分组字段；返回 [(路径, 条数, 负载)]
+    """
+    # 创建输出目录（如果不存在）
+    os.makedirs(output_dir, exist_ok=True)
+    paths = [shard_path(output_dir, f'split_{i + 1}', fmt, compression) for i in range(n)]
+    with ShardedWriter(paths, balance, group_key, token_counter) as writer:
+        for item in iter_corpus(input_file):
+            writer.write(item)
+    stats = writer.stats()
+    _print_stats(stats, balance)
+    return stats
+
+
+def split_dataset(input_file, output_dir, ratios=DEFAULT_RATIOS, group_key=GROUP_KEY, shards=1, balance='bytes',
+                  fmt='jsonl', compression=None, seed=0, token_counter=None):
+    """
+    按比例把数据集划分为 train/val/test 等部分，每部分再切成 shards 个均衡的分片，只读一遍输入；
+    同一组（默认同一仓库）的记录总在同一部分，没有分组字段的记录按自身内容哈希；seed 相同时划分结果确定。
+    返回 {名称: [(路径, 条数, 负载)]}
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    ratios = tuple(ratios.items()) if isinstance(ratios, dict) else tuple(ratios)
+    if not ratios or any(ratio < 0 for _, ratio in ratios) or sum(ratio for _, ratio in ratios) <= 0:
+        raise ValueError(f'划分比例无效：{ratios}')
+    writers = {}
+    try:
+        for name, _ in ratios:
+            names = [name] if shards == 1 else [f'{name}_{i + 1}' for i in range(shards)]
+            writers[name] = ShardedWriter([shard_path(output_dir, shard, fmt, compression) for shard in names],
+                                          balance, group_key, token_counter)
+        fractions = {}
+        for item in iter_corpus(input_file):
+            line = json.dumps(item, ensure_ascii=False)
+            group = item.get(group_key) if group_key else None
+            if group is None:
+                name = choose_split(stable_fraction(line, seed), ratios)
+            else:
+                if group not in fractions:
+                    fractions[group] = stable_fraction(group, seed)
+                name = choose_split(fractions[group], ratios)
+            writers[name].write(item, line)
+    except BaseException:
+        for writer in writers.values():
+            writer.abort()
+        raise
+    stats = {}
+    for name, writer in writers.items():
+        writer.close()
+        stats[name] = writer.stats()
+        _print_stats(stats[name], balance)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='流式切分数据集')
+    parser.add_argument('input_file', nargs='?', default='split_1.json', help='输入的 JSON / JSON Lines 文件或语料（.sqlite / .parquet）')
+    parser.add_argument('output_dir', nargs='?', default='splits', help='分割后的文件保存目录')
+    parser.add_argument('-n', type=int, default=5, help='分片数；指定 --ratios 时为每个部分的分片数')
+    parser.add_argument('--balance', choices=BALANCE_MODES, default='bytes', help='按字节数、词元数或条数均衡')
+    parser.add_argument('--group-by', default=None, help='同一分组的记录放在同一分片，如 repository')
+    parser.add_argument('--ratios', nargs='+', default=None, metavar='名称=比例',
+                        help='按比例划分，如 train=0.8 val=0.1 test=0.1；默认按 repository 分组')
+    parser.add_argument('--format', choices=FORMATS, default='jsonl', help='分片格式')
+    parser.add_argument('--compression', choices=['gzip', 'zstd'], default=None, help='压缩分片')
+    parser.add_argument('--seed', type=int, default=0, help='划分的哈希种子')
+    args = parser.parse_args()
+    if args.compression == 'zstd' and not ZSTD_AVAILABLE:
+        print('zstd 压缩需要安装 zstandard')
+        sys.exit(1)
+    if args.ratios:
+        ratios = []
+        for entry in args.ratios:
+            name, _, ratio = entry.partition('=')
+            ratios.append((name, float(ratio)))
+        split_dataset(args.input_file, args.output_dir, ratios, args.group_by or GROUP_KEY, args.n, args.balance,
+                      args.format, args.compression, args.seed)
+    else:
+        split_json(args.input_file, args.output_dir, args.n, args.balance, args.group_by, args.format,
+                   args.compression)
@@ -0,0 +1,186 @@
+import os
+import json
+import time
+import io
+import base64
+import hashlib
+import tarfile
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# 本地模拟 GitHub contents API，用于在不消耗真实配额的情况下验证下载引擎：
+#   GET /repos/{owner}/{repo}/contents/{path}
+#   GET /{owner}/{repo}/tar.gz/{sha}    （模拟 codeload 的仓库归档，不计配额）
+# 每个令牌有独立的配额，响应带 X-RateLimit-Limit / Remaining / Reset，
+# 配额用尽后返回 403，与真实接口的限速行为一致；
+# contents 响应带 ETag，If-None-Match 匹配时返回 304 且不扣减配额。
+
+
+class FakeGithubState:
+    def __init__(self, root, limit=5000, window=3600, abuse_every=0, latency=0.0):
+        self.root = root
+        self.limit = limit
+        self.window = window
+        self.abuse_every = abuse_every
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.budgets = {}
+        self.total_requests = 0
+
+    def take(self, token):
+        """
+        扣减令牌配额，返回 (剩余次数, 重置时间, 是否允许)
+        """
+        now = int(time.time())
+        with self.lock:
+            self.total_requests += 1
+            remaining, reset_time = self.budgets.get(token, (self.limit, now + self.window))
+            if reset_time <= now:
+                remaining, reset_time = self.limit, now + self.window
+            allowed = remaining > 0
+            if allowed:
+                remaining -= 1
+            self.budgets[token] = (remaining, reset_time)
+            return remaining, reset_time, allowed
+
+
+def generated_source(name):
+    name = name.replace('-', '_')
+    return f'def {name}(x):\n    return x\n\n\ndef test_{name}():\n    assert {name}(1) == 1\n'.encode('utf-8')
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body, headers=None):
+            data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, str(value))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _read_file(self, parts):
+            if state.root is None:
+                # 没有提供目录时按路径生成一个小文件
+                return generated_source(os.path.splitext(parts[-1])[0])
+            local_path = os.path.join(state.root, parts[2], parts[3], *parts[5:])
+            if not os.path.isfile(local_path):
+                return None
+            with open(local_path, 'rb') as f:
+                return f.read()
+
+        def _etag(self, parts):
+            if len(parts) < 6 or parts[1] != 'repos' or parts[4] != 'contents':
+                return None
+            raw = self._read_file(parts)
+            return None if raw is None else '"' + hashlib.sha1(raw).hexdigest() + '"'
+
+        def _send_archive(self, owner, repo, sha):
+            buffer = io.BytesIO()
+            prefix = f'{repo}-{sha}'
+            with tarfile.open(fileobj=buffer, mode='w:gz') as tar:
+                if state.root is None:
+                    for name in ['util', 'model']:
+                        raw = generated_source(name)
+                        info = tarfile.TarInfo(f'{prefix}/pkg/{name}.py')
+                        info.size = len(raw)
+                        tar.addfile(info, io.BytesIO(raw))
+                else:
+                    repo_dir = os.path.join(state.root, owner, repo)
+                    if os.path.isdir(repo_dir):
+                        tar.add(repo_dir, arcname=prefix)
+            data = buffer.getvalue()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-gzip')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            parts = self.path.split('?')[0].split('/')
+            if len(parts) == 5 and parts[3] == 'tar.gz':
+                self._send_archive(parts[1], parts[2], parts[4])
+                return
+            etag = self._etag(parts)
+            if etag is not None and self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+            token = self.headers.get('Authorization', '').replace('token ', '')
+            remaining, reset_time, allowed = state.take(token)
+            headers = {
+                'X-RateLimit-Limit': state.limit,
+                'X-RateLimit-Remaining': remaining,
+                'X-RateLimit-Reset': reset_time
+            }
+            if state.latency:
+                time.sleep(state.latency)
+            if not allowed:
+                self._send(403, {'message': 'API rate limit exceeded'}, headers)
+                return
+            if state.abuse_every and state.total_requests % state.abuse_every == 0:
+                self._send(403, {'message': 'You have triggered an abuse detection mechanism.'}, headers)
+                return
+
+            # ['', 'repos', owner, repo, 'contents', path...]
+            if len(parts) < 6 or parts[1] != 'repos' or parts[4] != 'contents':
+                self._send(404, {'message': 'Not Found'}, headers)
+                return
+            repo_full_name = f'{parts[2]}/{parts[3]}'
+            file_path = '/'.join(parts[5:])
+            raw = self._read_file(parts)
+            if raw is None:
+                self._send(404, {'message': 'Not Found'}, headers)
+                return
+            headers['ETag'] = self._etag(parts)
+            self._send(200, {
+                'type': 'file',
+                'path': file_path,
+                'name': os.path.basename(file_path),
+                'encoding': 'base64',
+                'content': base64.encodebytes(raw).decode('ascii'),
+                'repository': repo_full_name
+            }, headers)
+
+    return Handler
+
+
+def start_server(root=None, port=0, **kwargs):
+    """
+    在后台线程启动模拟服务器，返回 (server, base_url)，port=0 时自动选择空闲端口
+    """
+    state = FakeGithubState(root, **kwargs)
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(state))
+    server.state = state
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='本地模拟 GitHub contents API')
+    parser.add_argument('--root', default=None, help='目录结构为 root/owner/repo/path，不提供时生成示例文件')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--limit', type=int, default=5000, help='每个令牌每个窗口的请求次数')
+    parser.add_argument('--window', type=int, default=3600, help='配额重置窗口（秒）')
+    parser.add_argument('--abuse-every', type=int, default=0, help='每 N 个请求触发一次滥用检测 403')
+    parser.add_argument('--latency', type=float, default=0.0, help='每个请求的模拟延迟（秒）')
+    args = parser.parse_args()
+    server, base_url = start_server(args.root, args.port, limit=args.limit, window=args.window,
+                                    abuse_every=args.abuse_every, latency=args.latency)
+    print(f'模拟服务器已启动：{base_url}')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
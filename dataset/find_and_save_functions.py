@@ -1,117 +1,113 @@
 import requests
-import ast
 import time
-import json
 import logging
 from tqdm import tqdm
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import os
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed, wait, FIRST_COMPLETED
 from datetime import datetime
 import threading
 from collections import defaultdict
-import multiprocessing  # 新增导入
+from output_store import open_store, FileProgressLog
+from async_fetch import AsyncFetcher
+from token_scheduler import TokenScheduler
+from archive_ingest import ingest_repository, parse_commit_sha, CODELOAD_URL
+from http_cache import HttpCache
+from parse_pipeline import ParseStage, split_functions
+from matcher import TestMatcher
+from json_stream import iter_json_array
 
 ACCESS_TOKENS = [2
 ]
 
 
 GITHUB_API_URL = 'https://api.github.com'
-current_token_index = 0
-wait_lock = threading.Lock()
-token_lock = threading.Lock()
-is_waiting = False
-
-def get_headers():
-    token_info = ACCESS_TOKENS[current_token_index]
-    token = token_info['token']
-    headers = {
-        'Authorization': f'token {token}',
-        'Accept': 'application/vnd.github.v3+json'
-    }
-    return headers
+# 由 init_token_scheduler() 创建，所有下载线程和异步引擎共用
+token_scheduler = None
+# 由 init_http_cache() 创建的持久化下载缓存，HTTP_CACHE_FILE 为 None 时不使用缓存
+http_cache = None
+HTTP_CACHE_FILE = 'http_cache.sqlite'
+HTTP_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+# 输出存储：'jsonl' 单文件日志或 'segmented' 分段日志；每 OUTPUT_BATCH_SIZE 个仓库 fsync 一次
+OUTPUT_BACKEND = 'jsonl'
+OUTPUT_BATCH_SIZE = 1
+# 全部仓库处理完后把日志整理成 function_pairs.json 等旧版文件
+COMPACT_ON_FINISH = True
+
+# 单个请求的 (连接, 读取) 超时，代替旧版整进程 300 秒强杀
+REQUEST_TIMEOUT = (10, 60)
+# 超过 STALL_WARN_SECONDS 没有任何文件完成时打印在途文件；
+# 超过 STALL_RESTART_SECONDS 时在进程内重新调度停滞的仓库；主线程每 STALL_POLL_SECONDS 检查一次。
+# 有线程在等待令牌（限流、退避）时不算停滞，重新提交只会多占一个令牌队列的位置并重复下载
+STALL_WARN_SECONDS = 120
+STALL_RESTART_SECONDS = 600
+STALL_POLL_SECONDS = 5
+
+# 下载引擎：'async' 使用共享连接池的 asyncio 引擎，'threads' 为原来的嵌套线程池
+DOWNLOAD_ENGINE = 'async'
+# async 引擎的全局并发上限和每个主机的并发上限
+MAX_CONCURRENCY = 64
+PER_HOST_LIMIT = 32
+# 同时处理的仓库数，threads 引擎下每个仓库再开 FILE_WORKERS 个下载线程
+REPO_WORKERS = 16
+FILE_WORKERS = 5
+
+# 解析阶段：'process' 进程池、'interpreter' 子解释器池（3.14+）或 'inline' 在下载线程中解析；
+# PARSE_QUEUE_SIZE 为在途解析任务上限，超过后下载线程阻塞（背压）
+PARSE_BACKEND = 'process'
+PARSE_WORKERS = None
+PARSE_QUEUE_SIZE = 256
+
+# 获取方式：'archive' 按 download_url 中的提交 SHA 整仓库下载一个归档（失败时退回逐文件），只解析文件列表中的文件，
+# 'contents' 为逐文件调用 contents API
+INGEST_MODE = 'archive'
+ARCHIVE_BASE_URL = CODELOAD_URL
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def switch_token():
-    global current_token_index
-    start_index = current_token_index
+def init_token_scheduler():
+    """
+    创建全局令牌调度器，并启动每 60 秒输出一次调度指标的后台线程
+    """
+    global token_scheduler
+    if token_scheduler is None:
+        token_scheduler = TokenScheduler(ACCESS_TOKENS)
+        threading.Thread(target=token_scheduler.log_metrics, daemon=True).start()
+    return token_scheduler
+
+def init_http_cache():
+    global http_cache
+    if http_cache is None and HTTP_CACHE_FILE:
+        http_cache = HttpCache(HTTP_CACHE_FILE, HTTP_CACHE_MAX_BYTES)
+    return http_cache
+
+def send_request(url, etag=None):
     while True:
-        current_token_index = (current_token_index + 1) % len(ACCESS_TOKENS)
-        with token_lock:
-            token_info = ACCESS_TOKENS[current_token_index]
-            if token_info['available']:
-                logging.info(f'切换到下一个令牌，索引为 {current_token_index}')
-                return True
-        if current_token_index == start_index:
-            return False
-
-def check_token_status():
-    while True:
-        time.sleep(60)
-        logging.info("=== 令牌状态 ===")
-        for i, token_info in enumerate(ACCESS_TOKENS):
-            if token_info['available']:
-                remaining = token_info['rate_limit_remaining']
-                logging.info(f'令牌 {i} 可用，剩余查询次数: {remaining if remaining is not None else "未知"}')
-            else:
-                reset_time = token_info['reset_time']
-                countdown = max(reset_time - int(time.time()), 0)
-                logging.info(f'令牌 {i} 已限速，剩余等待时间: {countdown} 秒')
-        logging.info("================")
-
-def send_request(url):
-    global current_token_index, is_waiting
-    while True:
-        headers = get_headers()
-        response = requests.get(url, headers=headers)
+        token_index = token_scheduler.acquire()
+        headers = token_scheduler.headers(token_index)
+        if etag:
+            # 304 不计入速率配额
+            headers['If-None-Match'] = etag
+        try:
+            response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+        except Exception:
+            token_scheduler.update(token_index)
+            raise
+        token_scheduler.update(token_index, response.status_code, response.headers)
 
-        if response.status_code == 200:
+        if response.status_code in (200, 304):
             return response
 
         elif response.status_code == 403:
-            # 获取速率限制相关信息
             rate_limit_remaining = response.headers.get('X-RateLimit-Remaining')
-            rate_limit_reset = response.headers.get('X-RateLimit-Reset')
-
             if rate_limit_remaining is not None and int(rate_limit_remaining) == 0:
-                with token_lock:
-                    # 标记当前令牌不可用并记录重置时间
-                    token_info = ACCESS_TOKENS[current_token_index]
-                    reset_time = int(rate_limit_reset)
-                    token_info['available'] = False
-                    token_info['reset_time'] = reset_time
-                    token_info['rate_limit_remaining'] = 0
-
-                # 切换到下一个可用令牌
-                if not switch_token():
-                    # 如果所有令牌都已用完，等待最早的重置时间
-                    with wait_lock:
-                        if not is_waiting:
-                            is_waiting = True
-                            earliest_reset = min([t['reset_time'] for t in ACCESS_TOKENS if t['reset_time'] > 0])
-                            sleep_time = max(earliest_reset - int(time.time()), 0) + 10
-                            logging.warning(f'所有令牌的 API 速率限制已用完，将等待 {sleep_time} 秒')
-                            time.sleep(sleep_time)
-
-                            # 重置所有可用令牌状态
-                            with token_lock:
-                                for t in ACCESS_TOKENS:
-                                    if t['reset_time'] <= int(time.time()):
-                                        t['available'] = True
-                            current_token_index = 0
-                            is_waiting = False
-                        else:
-                            # 等待其他线程完成等待
-                            while is_waiting:
-                                time.sleep(1)
-                else:
-                    continue  # 切换令牌后重试
+                # 调度器已记录该令牌的重置时间，重试时会换用其他令牌或等待重置
+                continue
 
             elif 'abuse' in response.text.lower():
-                # 处理滥用检测
+                # 处理滥用检测：只暂停当前令牌
                 logging.error(f'滥用检测机制触发：{response.text}')
-                time.sleep(60)
-                continue  # 等待一段时间后重试
+                token_scheduler.backoff(token_index, int(response.headers.get('Retry-After', 60)))
+                continue
 
             else:
                 # 处理其他 403 错误
@@ -125,40 +121,53 @@ def send_request(url):
             time.sleep(10)
             return response
 
-def extract_functions_from_code(code_content):
-    functions = {}
-    try:
-        tree = ast.parse(code_content)
-        for node in ast.walk(tree):
-            if isinstance(node, ast.FunctionDef):
-                func_name = node.name
-                func_code = ast.get_source_segment(code_content, node)
-                functions[func_name] = func_code
-    except SyntaxError:
-        pass
-    return functions
-
 def download_file(args):
-    repo_full_name, file_path = args
+    # args 为 (仓库, 路径) 或 (仓库, 路径, 提交 SHA)；有 SHA 时按该提交获取，内容固定可永久缓存
+    repo_full_name, file_path = args[:2]
+    sha = args[2] if len(args) > 2 else None
     url = f'{GITHUB_API_URL}/repos/{repo_full_name}/contents/{file_path}'
+    if sha:
+        url += f'?ref={sha}'
+    etag, cached = None, None
+    if http_cache is not None:
+        if sha:
+            cached = http_cache.get_pinned(repo_full_name, sha, file_path)
+            if cached is not None:
+                return cached.decode('utf-8', errors='ignore'), file_path
+        else:
+            etag, cached = http_cache.get_conditional(url)
     max_retries = 10
     retries = 0
 
     while retries < max_retries:
         try:
-            response = send_request(url)
+            response = send_request(url, etag)
+            if response.status_code == 304:
+                http_cache.mark_revalidated()
+                return cached.decode('utf-8', errors='ignore'), file_path
             if response.status_code != 200:
                 logging.error(f'无法下载文件 {file_path}，仓库 {repo_full_name}：{response.status_code}')
                 return '', file_path
-            content = response.json().get('content', '')
+            payload = response.json()
+            content = payload.get('content', '')
             if content:
                 import base64
-                code_content = base64.b64decode(content).decode('utf-8', errors='ignore')
+                raw = base64.b64decode(content)
+                if http_cache is not None:
+                    if not sha:
+                        http_cache.mark_miss()
+                    http_cache.store_contents(url, repo_full_name, sha, file_path, raw,
+                                              payload.get('sha'), response.headers.get('ETag'))
+                code_content = raw.decode('utf-8', errors='ignore')
                 return code_content, file_path
         except requests.exceptions.SSLError as e:
             logging.error(f'SSL 错误，下载 {file_path} 时出错：{e}')
             retries += 1
             time.sleep(5)  # 等待 5 秒后重试
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+            logging.error(f'请求超时或连接中断，下载 {file_path} 时出错：{e}')
+            retries += 1
+            time.sleep(5)
         except Exception as e:
             logging.error(f'下载文件 {file_path} 时发生未知错误：{e}')
             return '', file_path
@@ -166,97 +175,279 @@ def download_file(args):
     logging.error(f'下载文件 {file_path} 失败，超过最大重试次数 {max_retries}')
     return '', file_path
 
-def download_and_extract_functions(file_item):
+def download_and_extract_functions(file_item, state=None):
     repository_full_name = file_item['repository_full_name']
     file_path = file_item['file_path']
-    code_content, _ = download_file((repository_full_name, file_path))
+    if state is not None:
+        cached = state.file_progress.get(repository_full_name, file_path)
+        if cached is not None:
+            return cached
+        state.stall_detector.begin(repository_full_name, file_path)
+    start_time = time.time()
+    try:
+        code_content, _ = download_file((repository_full_name, file_path, parse_commit_sha(file_item.get('download_url'))))
+    finally:
+        if state is not None:
+            state.stall_detector.end(repository_full_name, file_path)
     if code_content:
-        functions = extract_functions_from_code(code_content)
-        function_map = {}
-        test_function_map = {}
-        for func_name, func_code in functions.items():
-            if func_name.startswith('test_'):
-                test_function_map[func_name] = {
-                    'code': func_code,
-                    'file': file_path
-                }
-            else:
-                function_map[func_name] = {
-                    'code': func_code,
-                    'file': file_path
-                }
+        # 解析在进程池中进行，下载线程只等待结果，不与其他下载线程争抢 GIL
+        function_map, test_function_map = submit_parse(state, code_content, file_path, time.time() - start_time).result()
+        if state is not None:
+            state.file_progress.record(repository_full_name, file_path, function_map, test_function_map)
         return function_map, test_function_map
     else:
         return {}, {}
 
-def process_repository_files(repo_full_name, files):
+def submit_parse(state, code_content, file_path, io_seconds=0.0):
+    """
+    把源码交给解析阶段，返回结果为 (函数表, 测试函数表) 的 Future；没有运行状态时在当前线程解析
+    """
+    if state is None or state.parser is None:
+        future = Future()
+        future.set_result(split_functions(code_content, file_path))
+        return future
+    return state.parser.submit(code_content, file_path, io_seconds)
+
+def download_and_extract_async(repo_full_name, files, state):
+    """
+    异步引擎：仓库内未完成的文件一次性交给事件循环，并发由引擎的全局和每主机上限控制
+    """
+    results = []
+    pending_paths = []
+    for item in files:
+        cached = state.file_progress.get(repo_full_name, item['file_path'])
+        if cached is not None:
+            results.append(cached)
+        else:
+            pending_paths.append(item['file_path'])
+    for path in pending_paths:
+        state.stall_detector.begin(repo_full_name, path)
+    try:
+        downloaded = state.fetcher.download_many_sync(repo_full_name, pending_paths,
+                                                      parse_commit_sha(files[0].get('download_url')), timed=True)
+    finally:
+        for path in pending_paths:
+            state.stall_detector.end(repo_full_name, path)
+    # 每个文件的下载耗时计入下载阶段的统计
+    futures = [(file_path, submit_parse(state, code_content, file_path, io_seconds))
+               for code_content, file_path, io_seconds in downloaded if code_content]
+    for file_path, future in futures:
+        function_map, test_function_map = future.result()
+        state.file_progress.record(repo_full_name, file_path, function_map, test_function_map)
+        results.append((function_map, test_function_map))
+    return results
+
+def download_and_extract_archive(repo_full_name, files, state=None):
+    """
+    整仓库归档模式：一个请求取回仓库归档，只解析 files 中列出的文件，与逐文件下载得到的数据集一致；失败时返回 None。
+    每个文件解析完即写入进度日志，崩溃重启后已完成的文件直接复用，全部完成时不再下载归档
+    """
+    wanted = {item['file_path'] for item in files}
+    results = []
+    if state is not None:
+        for file_path in sorted(wanted):
+            cached = state.file_progress.get(repo_full_name, file_path)
+            if cached is not None:
+                results.append(cached)
+                wanted.discard(file_path)
+        if not wanted:
+            return results
+    futures = []
+    # 在途记录指向最近解压出的成员，停滞时能看出归档流卡在哪个文件之后
+    current = ['<archive>']
+    last_member = [time.perf_counter()]
+
+    def handle_file(file_path, code_content):
+        io_seconds = time.perf_counter() - last_member[0]
+        if state is not None:
+            state.stall_detector.end(repo_full_name, current[0])
+            current[0] = f'<archive> {file_path}'
+            state.stall_detector.begin(repo_full_name, current[0])
+        if file_path not in wanted:
+            return
+        wanted.discard(file_path)
+        # 解析队列满时这里阻塞，归档流的解压随之放慢
+        future = submit_parse(state, code_content, file_path, io_seconds)
+        if state is not None:
+            future = track_progress(state, repo_full_name, file_path, future)
+        futures.append(future)
+        last_member[0] = time.perf_counter()
+
+    if state is not None:
+        state.stall_detector.begin(repo_full_name, current[0])
+    try:
+        ok = ingest_repository(repo_full_name, files[0].get('download_url'), handle_file,
+                               cache=http_cache, timeout=REQUEST_TIMEOUT, base_url=ARCHIVE_BASE_URL)
+    finally:
+        if state is not None:
+            state.stall_detector.end(repo_full_name, current[0])
+    # 失败时已解析的文件也已写入进度日志，退回逐文件下载时直接复用
+    results.extend(future.result() for future in futures)
+    if ok and wanted:
+        logging.info(f'仓库 {repo_full_name} 的归档中缺少 {len(wanted)} 个列出的文件（非 .py 或过大）')
+    return results if ok else None
+
+def track_progress(state, repo_full_name, file_path, future):
+    """
+    解析完成时把结果写入进度日志；返回的 Future 在写入之后才完成，等待它的调用方看到的进度日志一定已更新
+    """
+    tracked = Future()
+
+    def done(parse_future):
+        try:
+            function_map, test_function_map = parse_future.result()
+            state.file_progress.record(repo_full_name, file_path, function_map, test_function_map)
+        except Exception as e:
+            tracked.set_exception(e)
+            return
+        tracked.set_result((function_map, test_function_map))
+
+    future.add_done_callback(done)
+    return tracked
+
+def process_repository_files(repo_full_name, files, state=None):
     logging.info(f'处理仓库：{repo_full_name}')
     function_map = {}
     test_function_map = {}
     all_function_pairs = []
 
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        futures = [executor.submit(download_and_extract_functions, item) for item in files]
-        for future in tqdm(as_completed(futures), desc=f'处理 {repo_full_name} 的文件', total=len(futures), leave=False):
-            functions, test_functions = future.result()
+    archive_results = None
+    if INGEST_MODE == 'archive':
+        archive_results = download_and_extract_archive(repo_full_name, files, state)
+
+    if archive_results is not None:
+        for functions, test_functions in archive_results:
+            function_map.update(functions)
+            test_function_map.update(test_functions)
+    elif state is not None and state.fetcher is not None:
+        for functions, test_functions in download_and_extract_async(repo_full_name, files, state):
             function_map.update(functions)
             test_function_map.update(test_functions)
-
-    # 生成函数对
-    for test_func_name, test_func_info in test_function_map.items():
-        original_func_name = test_func_name[5:]
-        if original_func_name in function_map:
-            all_function_pairs.append({
-                'function_name': original_func_name,
-                'function_code': function_map[original_func_name]['code'],
-                'function_file': function_map[original_func_name]['file'],
-                'test_function_name': test_func_name,
-                'test_function_code': test_func_info['code'],
-                'test_function_file': test_func_info['file'],
-                'repository': repo_full_name
-            })
-
-    return all_function_pairs, repo_full_name
-
-def main():
-    threading.Thread(target=check_token_status, daemon=True).start()
-
-    processed_repos_file = 'processed_repos.json'
-    if os.path.exists(processed_repos_file):
-        with open(processed_repos_file, 'r', encoding='utf-8') as f:
-            processed_repos = set(json.load(f))
-    else:
-        processed_repos = set()
-
-    function_pairs_file = 'function_pairs.json'
-    if os.path.exists(function_pairs_file):
-        with open(function_pairs_file, 'r', encoding='utf-8') as f:
-            all_function_pairs = json.load(f)
-    else:
-        all_function_pairs = []
-
-    repository_stats_file = 'repository_stats.json'
-    if os.path.exists(repository_stats_file):
-        with open(repository_stats_file, 'r', encoding='utf-8') as f:
-            repository_stats = json.load(f)
     else:
-        repository_stats = {}
+        with ThreadPoolExecutor(max_workers=FILE_WORKERS) as executor:
+            futures = [executor.submit(download_and_extract_functions, item, state) for item in files]
+            for future in tqdm(as_completed(futures), desc=f'处理 {repo_full_name} 的文件', total=len(futures), leave=False):
+                functions, test_functions = future.result()
+                function_map.update(functions)
+                test_function_map.update(test_functions)
+
+    # 生成函数对：对全仓库的函数建一次倒排索引，每个测试函数按 TestMatcher 的策略依次查找
+    matcher = TestMatcher(function_map.values())
+    for test_func_info, function_info, strategy in matcher.match_all(test_function_map.values()):
+        all_function_pairs.append({
+            'function_name': function_info['name'],
+            'function_code': function_info['code'],
+            'function_file': function_info['file'],
+            'test_function_name': test_func_info['name'],
+            'test_function_code': test_func_info['code'],
+            'test_function_file': test_func_info['file'],
+            'repository': repo_full_name,
+            'function_qualname': function_info['qualname'],
+            'test_function_qualname': test_func_info['qualname'],
+            'match_strategy': strategy
+        })
 
-    # 读取提供的 JSON 文件
-    with open('deduplicated_output.json', 'r', encoding='utf-8') as f:
-        file_list = json.load(f)
-
-    # 检查 file_list 是否为空
-    if not file_list:
-        logging.error('The file_list.json is empty.')
-        return
-
-    # 输出第一个项目的键，供调试
-    print('Keys in the first item:', file_list[0].keys())
+    return all_function_pairs, repo_full_name
 
-    # 根据仓库名称对文件进行分组
+class StallDetector:
+    """
+    停滞检测：记录在途文件和最近一次完成文件的时间，
+    长时间无进展时先告警，再设置 stalled 事件；由 main() 的调度循环在主线程中重新提交停滞的仓库，
+    不向主线程注入异常，输出存储不会在写到一半时被打断。
+    waiting 返回正在等待令牌的线程数，等待令牌的时间不计入停滞时间
+    """
+
+    def __init__(self, warn_seconds=STALL_WARN_SECONDS, restart_seconds=STALL_RESTART_SECONDS, waiting=None):
+        self.warn_seconds = warn_seconds
+        self.restart_seconds = restart_seconds
+        self.waiting = waiting or (lambda: 0)
+        self.in_flight = {}
+        self.lock = threading.Lock()
+        self.last_progress = time.time()
+        # 最近一次看到有线程等待令牌的时间，在途时间从它和开始时间中较晚的一个算起
+        self.last_token_wait = 0.0
+        self.stalled = threading.Event()
+
+    def begin(self, repo_full_name, file_path):
+        with self.lock:
+            self.in_flight[(repo_full_name, file_path)] = time.time()
+
+    def end(self, repo_full_name, file_path):
+        with self.lock:
+            self.in_flight.pop((repo_full_name, file_path), None)
+            self.last_progress = time.time()
+
+    def reset(self):
+        with self.lock:
+            self.last_progress = time.time()
+            self.stalled.clear()
+
+    def stalled_repos(self):
+        """
+        有文件在途超过 restart_seconds 的仓库
+        """
+        now = time.time()
+        with self.lock:
+            return {repo_full_name for (repo_full_name, _), started in self.in_flight.items()
+                    if now - max(started, self.last_token_wait) >= self.restart_seconds}
+
+    def watch(self):
+        warned = False
+        while True:
+            time.sleep(10)
+            with self.lock:
+                if self.waiting() > 0:
+                    # 等待令牌不是停滞：这段时间既不告警也不累计
+                    self.last_progress = self.last_token_wait = time.time()
+                idle = time.time() - self.last_progress
+                oldest = sorted(self.in_flight.items(), key=lambda item: item[1])[:5]
+            if idle < self.warn_seconds:
+                warned = False
+                continue
+            if not warned:
+                logging.warning(f'已有 {int(idle)} 秒没有文件完成，在途文件 {len(self.in_flight)} 个')
+                for (repo_full_name, file_path), started in oldest:
+                    logging.warning(f'  {repo_full_name}/{file_path} 已等待 {int(time.time() - started)} 秒')
+                warned = True
+            if idle >= self.restart_seconds and not self.stalled.is_set():
+                logging.warning('停滞时间过长，通知调度循环重新提交停滞的仓库')
+                self.stalled.set()
+
+
+class RunState:
+    """
+    常驻内存的运行状态：文件列表、分组结果、输出存储和进度日志只在预热时加载一次
+    """
+
+    def __init__(self):
+        self.store = None
+        self.file_progress = None
+        self.files_by_repo = {}
+        self.stall_detector = StallDetector(waiting=lambda: token_scheduler.waiting if token_scheduler is not None else 0)
+        self.fetcher = None
+        self.parser = None
+        self.warmup_seconds = 0.0
+
+def warm_up():
+    start_time = time.time()
+    state = RunState()
+
+    # 结果只追加写入日志，启动时扫描日志重建已处理仓库集合
+    state.store = open_store(OUTPUT_BACKEND, batch_size=OUTPUT_BATCH_SIZE)
+    state.store.migrate_legacy('function_pairs.json', 'repository_stats.json', 'processed_repos.json')
+    processed_repos = state.store.open()
+
+    # 未完成仓库中已处理的文件直接复用
+    state.file_progress = FileProgressLog()
+    reused_files = state.file_progress.load(processed_repos)
+
+    # 流式读取提供的 JSON 文件，边读边按仓库名称对文件进行分组
     files_by_repo = defaultdict(list)
-    for idx, item in enumerate(file_list):
+    idx = -1
+    for idx, item in enumerate(iter_json_array('deduplicated_output.json')):
+        if idx == 0 and isinstance(item, dict):
+            # 输出第一个项目的键，供调试
+            print('Keys in the first item:', item.keys())
         if not isinstance(item, dict):
             logging.error(f'Item at index {idx} is not a dictionary: {item}')
             continue
@@ -265,57 +456,153 @@ def main():
             logging.error(f"Missing 'repository_full_name' in item at index {idx}: {item}")
             continue
         files_by_repo[repo_full_name].append(item)
+    state.files_by_repo = files_by_repo
+
+    # 检查 file_list 是否为空
+    if idx < 0:
+        logging.error('The file_list.json is empty.')
+        return state
+
+    state.parser = ParseStage(PARSE_WORKERS, PARSE_QUEUE_SIZE, PARSE_BACKEND)
+
+    if DOWNLOAD_ENGINE == 'async':
+        state.fetcher = AsyncFetcher(token_scheduler, base_url=GITHUB_API_URL, max_concurrency=MAX_CONCURRENCY,
+                                     per_host_limit=PER_HOST_LIMIT, timeout=REQUEST_TIMEOUT,
+                                     cache=http_cache).start_background()
+
+    state.warmup_seconds = time.time() - start_time
+    logging.info(f'预热耗时 {state.warmup_seconds:.2f} 秒：已处理仓库 {len(processed_repos)} 个，可复用文件 {reused_files} 个')
+    return state
+
+def main(state=None):
+    owns_state = state is None
+    if owns_state:
+        init_token_scheduler()
+        init_http_cache()
+        state = warm_up()
+    store = state.store
+    processed_repos = store.processed_repos
+    files_by_repo = state.files_by_repo
+    if not files_by_repo:
+        if owns_state:
+            close_state(state)
+        return
 
     total_repos = len(files_by_repo)
     repos_processed = len(processed_repos)
 
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        futures = {}
+    executor = ThreadPoolExecutor(max_workers=REPO_WORKERS)
+    # 停滞时被替换下来的线程池：卡住的线程仍占着它们的工作线程，结果到达后直接丢弃
+    retired_executors = []
+    # {仓库名: 被放弃但仍在运行的上一次尝试}，它结束前不再重新提交该仓库
+    abandoned = {}
+    try:
+        pending = {}
         for repo_full_name, files in files_by_repo.items():
             if repo_full_name in processed_repos:
-                logging.info(f'仓库 {repo_full_name} 已处理，跳过')
-                continue
-            future = executor.submit(process_repository_files, repo_full_name, files)
-            futures[future] = repo_full_name
-
-        for future in tqdm(as_completed(futures), desc='处理仓库', total=len(futures)):
-            repo_full_name = futures[future]
-            try:
-                function_pairs, repo_name = future.result()
-                all_function_pairs.extend(function_pairs)
-                with open('function_pairs.json', 'w', encoding='utf-8') as f:
-                    json.dump(all_function_pairs, f, ensure_ascii=False, indent=4)
-
-                num_pairs = len(function_pairs)
-                repos_processed += 1
-                repository_stats[repo_name] = num_pairs
-                with open(repository_stats_file, 'w', encoding='utf-8') as f:
-                    json.dump(repository_stats, f, ensure_ascii=False, indent=4)
-                logging.info(f'仓库 {repo_name} 收集了 {num_pairs} 个函数对，总共已保存 {len(all_function_pairs)} 个函数对')
-                logging.info(f'已处理 {repos_processed} 个仓库')
-                processed_repos.add(repo_name)
-                with open(processed_repos_file, 'w', encoding='utf-8') as f:
-                    json.dump(list(processed_repos), f, ensure_ascii=False, indent=4)
-            except Exception as e:
-                logging.error(f'处理仓库 {repo_full_name} 时出错：{e}')
                 continue
+            future = executor.submit(process_repository_files, repo_full_name, files, state)
+            pending[future] = repo_full_name
+
+        progress = tqdm(desc='处理仓库', total=len(pending))
+        while pending:
+            # 带超时等待，主线程每轮都能检查停滞事件；结果只在主线程中写入输出存储
+            done, _ = wait(pending, timeout=STALL_POLL_SECONDS, return_when=FIRST_COMPLETED)
+            for future in done:
+                repo_full_name = pending.pop(future)
+                progress.update(1)
+                try:
+                    function_pairs, repo_name = future.result()
+                    store.append_repo(repo_name, function_pairs)
+                    state.file_progress.discard_repo(repo_name)
+
+                    num_pairs = len(function_pairs)
+                    repos_processed += 1
+                    logging.info(f'仓库 {repo_name} 收集了 {num_pairs} 个函数对，总共已保存 {store.total_pairs} 个函数对')
+                    logging.info(f'已处理 {repos_processed} 个仓库')
+                except Exception as e:
+                    logging.error(f'处理仓库 {repo_full_name} 时出错：{e}')
+                    continue
+            if pending and state.stall_detector.stalled.is_set():
+                new_executor = resubmit_stalled(executor, pending, state, abandoned)
+                if new_executor is not executor:
+                    retired_executors.append(executor)
+                    executor = new_executor
+        progress.close()
+    finally:
+        # 不等待卡住的线程，已完成的文件已写入进度日志
+        for old_executor in retired_executors + [executor]:
+            old_executor.shutdown(wait=False, cancel_futures=True)
+        store.flush()
+
+    store.close()
+    if COMPACT_ON_FINISH:
+        store.compact('function_pairs.json', 'repository_stats.json', 'processed_repos.json')
 
     logging.info(f'总共处理了 {repos_processed} 个仓库')
-    logging.info(f'总共保存了 {len(all_function_pairs)} 个函数对到 function_pairs.json')
+    logging.info(f'总共保存了 {store.total_pairs} 个函数对到 function_pairs.json')
     logging.info(f'各仓库收集的函数对数量已保存到 repository_stats.json')
+    logging.info(f'预热耗时 {state.warmup_seconds:.2f} 秒')
+    if http_cache is not None:
+        http_cache.log_stats()
+    if state.parser is not None:
+        state.parser.log_metrics()
+    if owns_state:
+        close_state(state)
+
+def resubmit_stalled(executor, pending, state, abandoned):
+    """
+    在主线程中重新调度：有文件在途超过 STALL_RESTART_SECONDS 的仓库和旧线程池中还在排队的仓库提交到新线程池，
+    其余仓库继续在旧线程池中运行；没有可以重新提交的仓库时返回原线程池。
+    pending 为 {Future: 仓库名}，abandoned 为 {仓库名: 被放弃的尝试}，都原地更新
+    """
+    for repo_full_name, future in list(abandoned.items()):
+        if future.done():
+            del abandoned[repo_full_name]
+    # 上一次被放弃的尝试仍在运行的仓库不再重新提交，每个仓库最多多占一个线程
+    stalled = state.stall_detector.stalled_repos() - set(abandoned)
+    state.stall_detector.reset()
+    if not stalled:
+        logging.warning('没有可以重新提交的停滞仓库，继续等待')
+        return executor
+    # 取消旧线程池中排队的任务；正在运行的线程不受影响，卡住的线程结束后结果被丢弃
+    executor.shutdown(wait=False, cancel_futures=True)
+    new_executor = ThreadPoolExecutor(max_workers=REPO_WORKERS)
+    resubmitted = 0
+    for future, repo_full_name in list(pending.items()):
+        if future.done() and not future.cancelled():
+            # 刚好完成的仓库留给调度循环的下一轮写入
+            continue
+        if future.cancelled() or repo_full_name in stalled:
+            del pending[future]
+            if not future.cancelled():
+                abandoned[repo_full_name] = future
+            files = state.files_by_repo[repo_full_name]
+            pending[new_executor.submit(process_repository_files, repo_full_name, files, state)] = repo_full_name
+            resubmitted += 1
+    logging.warning(f'已重新提交 {resubmitted} 个仓库，其中停滞的 {len(stalled)} 个：{", ".join(sorted(stalled)[:5])}')
+    return new_executor
+
+def close_state(state):
+    state.file_progress.close()
+    if state.parser is not None:
+        state.parser.shutdown()
+    if state.fetcher is not None:
+        state.fetcher.stop_background()
+
+def run_supervised():
+    """
+    常驻运行模式：预热一次，停滞检测线程只设置事件，由 main() 的调度循环在进程内重新提交停滞的仓库，状态不丢失
+    """
+    init_token_scheduler()
+    init_http_cache()
+    state = warm_up()
+    threading.Thread(target=state.stall_detector.watch, daemon=True).start()
+    try:
+        main(state)
+        logging.info('主函数已完成，退出')
+    finally:
+        close_state(state)
 
 if __name__ == '__main__':
-    while True:
-        start_time = time.time()
-        p = multiprocessing.Process(target=main)
-        p.start()
-        p.join(timeout=300)  # 等待 2 分钟
-        if p.is_alive():
-            logging.info('已运行两分钟，重新启动脚本')
-            p.terminate()
-            p.join()
-        else:
-            logging.info('主函数已完成，退出循环')
-            break
-        # 您可以根据需要添加等待时间
-        time.sleep(20)
+    run_supervised()
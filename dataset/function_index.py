@@ -0,0 +1,156 @@
+import ast
+import time
+import argparse
+from collections import namedtuple
+
+# 单个函数定义的紧凑记录：
+#   qualname    限定名，如 Foo.bar、outer.<locals>.inner
+#   class_name  最近的外层类名，不在类中时为 None
+#   start, end  函数定义在 UTF-8 源码中的字节区间（不含装饰器，与 ast.get_source_segment 一致）
+#   decorators  装饰器源码列表
+FunctionRecord = namedtuple('FunctionRecord', [
+    'name', 'qualname', 'class_name', 'lineno', 'end_lineno',
+    'start', 'end', 'decorators', 'is_async', 'code'
+])
+
+FUNCTION_TYPES = (ast.FunctionDef, ast.AsyncFunctionDef)
+# 只有这些字段里会出现语句列表，表达式节点不会包含函数定义，无需遍历
+STATEMENT_FIELDS = ('body', 'orelse', 'finalbody', 'handlers', 'cases')
+
+
+def line_offsets(source_bytes):
+    """
+    每一行起始位置的字节偏移表，只计算一次
+    """
+    offsets = [0]
+    find = source_bytes.find
+    position = find(b'\n')
+    while position != -1:
+        offsets.append(position + 1)
+        position = find(b'\n', position + 1)
+    return offsets
+
+
+def index_functions(source, with_code=True):
+    """
+    一次遍历语句树，返回源码中所有函数（含方法、嵌套函数和 async def）的 FunctionRecord 列表；
+    语法错误时返回空列表
+    """
+    return index_module(source, with_code)[0]
+
+
+def import_names(node):
+    """
+    import 语句引入的模块名；from a.b import c 同时记 a.b 和 a.b.c，因为 c 可能是子模块
+    """
+    if isinstance(node, ast.Import):
+        return [alias.name for alias in node.names]
+    prefix = '.' * node.level + (node.module or '')
+    names = [prefix] if node.module else []
+    separator = '.' if node.module else ''
+    names.extend(prefix + separator + alias.name for alias in node.names if alias.name != '*')
+    return names
+
+
+def index_module(source, with_code=True):
+    """
+    与 index_functions 相同的一次遍历，额外返回文件中所有 import 的模块名列表（按出现顺序去重）
+    """
+    source_bytes = source.encode('utf-8') if isinstance(source, str) else source
+    try:
+        tree = ast.parse(source_bytes)
+    except (SyntaxError, ValueError):
+        return [], []
+    offsets = line_offsets(source_bytes)
+
+    def span(node):
+        return (offsets[node.lineno - 1] + node.col_offset,
+                offsets[node.end_lineno - 1] + node.end_col_offset)
+
+    records = []
+    imports = {}
+    # 栈元素：(语句节点, 限定名前缀, 外层类名)
+    stack = [(node, '', None) for node in reversed(tree.body)]
+    while stack:
+        node, prefix, class_name = stack.pop()
+        if isinstance(node, FUNCTION_TYPES):
+            start, end = span(node)
+            decorators = []
+            for decorator in node.decorator_list:
+                decorator_start, decorator_end = span(decorator)
+                decorators.append(source_bytes[decorator_start:decorator_end].decode('utf-8', errors='ignore'))
+            qualname = prefix + node.name
+            records.append(FunctionRecord(
+                node.name, qualname, class_name, node.lineno, node.end_lineno, start, end, decorators,
+                isinstance(node, ast.AsyncFunctionDef),
+                source_bytes[start:end].decode('utf-8', errors='ignore') if with_code else None
+            ))
+            child_prefix, child_class = qualname + '.<locals>.', class_name
+        elif isinstance(node, ast.ClassDef):
+            child_prefix, child_class = prefix + node.name + '.', node.name
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            imports.update(dict.fromkeys(import_names(node)))
+            continue
+        else:
+            child_prefix, child_class = prefix, class_name
+        children = []
+        for field in STATEMENT_FIELDS:
+            value = getattr(node, field, None)
+            if value:
+                children.extend(value)
+        for child in reversed(children):
+            if isinstance(child, (ast.ExceptHandler, ast.match_case)):
+                # except 子句和 match 分支本身不是语句，展开它们的 body
+                stack.extend((statement, child_prefix, child_class) for statement in reversed(child.body))
+            else:
+                stack.append((child, child_prefix, child_class))
+    return records, list(imports)
+
+
+def slice_source(source_bytes, record):
+    """
+    按字节区间取出函数源码，不需要重新扫描整个文件
+    """
+    return source_bytes[record.start:record.end].decode('utf-8', errors='ignore')
+
+
+def legacy_extract(code_content):
+    # 旧实现：ast.walk 全树遍历，只认 FunctionDef，按裸函数名做键
+    functions = {}
+    try:
+        tree = ast.parse(code_content)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.FunctionDef):
+                functions[node.name] = ast.get_source_segment(code_content, node)
+    except SyntaxError:
+        pass
+    return functions
+
+
+def benchmark(paths):
+    """
+    对比旧实现与单遍索引在给定 .py 文件上的耗时和提取到的函数数量
+    """
+    sources = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+            sources.append(f.read())
+
+    start = time.perf_counter()
+    legacy_count = sum(len(legacy_extract(source)) for source in sources)
+    legacy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index_count = sum(len(index_functions(source)) for source in sources)
+    index_seconds = time.perf_counter() - start
+
+    print(f'文件数 {len(sources)}，总大小 {sum(len(source) for source in sources)} 字符')
+    print(f'旧实现：{legacy_seconds:.2f} 秒，{legacy_count} 个函数')
+    print(f'单遍索引：{index_seconds:.2f} 秒，{index_count} 个函数')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='函数索引基准测试')
+    parser.add_argument('paths', nargs='+', help='.py 文件路径')
+    args = parser.parse_args()
+    benchmark(args.paths)
@@ -0,0 +1,192 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+# 本地持久化缓存，内容按 sha256 去重存放，索引键有三种：
+#   pin:{repo}@{sha}:{path}    固定在某个提交上的文件，内容永远不变，命中后无需联网
+#   blob:{git blob sha}         contents API 返回的 blob SHA，不同仓库 / 分叉中的同一文件共用
+#   url:{url}                   未固定版本的 API 地址，保存 ETag，用 If-None-Match 做条件请求
+# 总大小超过 max_bytes 时按最近访问时间淘汰（LRU）。
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS keys (
+    key TEXT PRIMARY KEY,
+    digest TEXT NOT NULL,
+    etag TEXT
+);
+CREATE INDEX IF NOT EXISTS keys_digest ON keys (digest);
+CREATE INDEX IF NOT EXISTS blobs_last_access ON blobs (last_access);
+'''
+
+
+class HttpCache:
+    def __init__(self, path='http_cache.sqlite', max_bytes=2 * 1024 * 1024 * 1024):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self.total_bytes = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM blobs').fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+
+    @staticmethod
+    def pinned_key(repo_full_name, sha, file_path):
+        return f'pin:{repo_full_name}@{sha}:{file_path}'
+
+    @staticmethod
+    def blob_key(blob_sha):
+        return f'blob:{blob_sha}'
+
+    @staticmethod
+    def url_key(url):
+        return f'url:{url}'
+
+    def _lookup(self, key):
+        row = self.conn.execute(
+            'SELECT blobs.data, keys.etag, blobs.digest FROM keys JOIN blobs ON keys.digest = blobs.digest WHERE keys.key = ?',
+            (key,)).fetchone()
+        if row is None:
+            return None
+        self.conn.execute('UPDATE blobs SET last_access = ? WHERE digest = ?', (time.time(), row[2]))
+        return bytes(row[0]), row[1]
+
+    def get(self, key):
+        """
+        返回缓存的内容（bytes），不存在时返回 None，并计入命中率
+        """
+        with self.lock:
+            found = self._lookup(key)
+            if found is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return found[0]
+
+    def get_conditional(self, url):
+        """
+        返回 (ETag, 内容)，供条件请求使用；不计入命中率，由 mark_revalidated / mark_miss 另行统计
+        """
+        with self.lock:
+            found = self._lookup(self.url_key(url))
+        if found is None:
+            return None, None
+        return found[1], found[0]
+
+    def mark_revalidated(self):
+        with self.lock:
+            self.revalidated += 1
+            self.hits += 1
+
+    def mark_miss(self):
+        with self.lock:
+            self.misses += 1
+
+    def put(self, keys, data, etag=None):
+        """
+        以内容的 sha256 存一份数据，并把 keys 中的每个键指向它
+        """
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        with self.lock:
+            self.conn.execute('BEGIN')
+            try:
+                inserted = self.conn.execute(
+                    'INSERT OR IGNORE INTO blobs (digest, data, size, last_access) VALUES (?, ?, ?, ?)',
+                    (digest, data, len(data), time.time())).rowcount
+                for key in keys:
+                    self.conn.execute('INSERT OR REPLACE INTO keys (key, digest, etag) VALUES (?, ?, ?)',
+                                      (key, digest, etag))
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+            if inserted:
+                self.total_bytes += len(data)
+                if self.total_bytes > self.max_bytes:
+                    self._evict()
+        return digest
+
+    def _evict(self):
+        # 淘汰到上限的 90%，避免每次写入都触发淘汰
+        target = self.max_bytes * 0.9
+        self.conn.execute('BEGIN')
+        evicted = 0
+        for digest, size in self.conn.execute('SELECT digest, size FROM blobs ORDER BY last_access').fetchall():
+            if self.total_bytes <= target:
+                break
+            self.conn.execute('DELETE FROM blobs WHERE digest = ?', (digest,))
+            self.conn.execute('DELETE FROM keys WHERE digest = ?', (digest,))
+            self.total_bytes -= size
+            evicted += 1
+        self.conn.execute('COMMIT')
+        logging.info(f'HTTP 缓存淘汰了 {evicted} 个条目，当前 {self.total_bytes} 字节')
+
+    def get_pinned(self, repo_full_name, sha, file_path):
+        if not sha:
+            return None
+        return self.get(self.pinned_key(repo_full_name, sha, file_path))
+
+    def put_pinned(self, repo_full_name, sha, file_path, data):
+        return self.put([self.pinned_key(repo_full_name, sha, file_path)], data)
+
+    def store_contents(self, url, repo_full_name, sha, file_path, data, blob_sha=None, etag=None):
+        """
+        保存一次 contents API 下载的结果：固定版本时按 (仓库, 提交, 路径) 保存，
+        否则按 URL 连同 ETag 保存，两种情况都额外按 blob SHA 建索引
+        """
+        keys = []
+        if blob_sha:
+            keys.append(self.blob_key(blob_sha))
+        if sha:
+            keys.append(self.pinned_key(repo_full_name, sha, file_path))
+        else:
+            keys.append(self.url_key(url))
+        return self.put(keys, data, etag)
+
+    def get_json(self, key):
+        data = self.get(key)
+        return None if data is None else json.loads(data)
+
+    def put_json(self, keys, value):
+        return self.put(keys, json.dumps(value, ensure_ascii=False))
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'revalidated': self.revalidated,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'bytes': self.total_bytes
+            }
+
+    def format_stats(self):
+        stats = self.stats()
+        return (f'HTTP 缓存命中率 {stats["hit_rate"]:.2%}：命中 {stats["hits"]} 次'
+                f'（其中 304 重新验证 {stats["revalidated"]} 次），未命中 {stats["misses"]} 次，'
+                f'占用 {stats["bytes"]} 字节')
+
+    def log_stats(self):
+        logging.info(self.format_stats())
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
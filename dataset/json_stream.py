@@ -0,0 +1,299 @@
+import os
+import gzip
+import json
+
+try:
+    import ijson  # 安装了 ijson 时用它的 C 解析器逐项读取
+    IJSON_AVAILABLE = True
+except ImportError:
+    IJSON_AVAILABLE = False
+
+try:
+    import zstandard  # 读写 .zst 压缩文件时才需要
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# 流式读写 JSON 数组和 JSON Lines：读时逐项产出顶层数组的元素，写时边生成边落盘，
+# 内存占用只与单个元素的大小有关，与文件大小无关。
+# 写出的 JSON 数组与 json.dump(data, f, ensure_ascii=False, indent=4) 的结果逐字节一致。
+# 文件名以 .gz / .zst 结尾时透明地压缩和解压，如 data.jsonl.gz 按 gzip 压缩的 JSON Lines 读写。
+
+CHUNK_SIZE = 1024 * 1024
+WHITESPACE = ' \t\n\r'
+COMPRESSION_SUFFIXES = {'.gz': 'gzip', '.zst': 'zstd'}
+
+
+def compression_of(path):
+    """
+    按扩展名判断压缩格式：'gzip'、'zstd' 或 None
+    """
+    return COMPRESSION_SUFFIXES.get(os.path.splitext(path)[1])
+
+
+def strip_compression(path):
+    """
+    去掉压缩扩展名：data.jsonl.gz -> data.jsonl
+    """
+    return os.path.splitext(path)[0] if compression_of(path) else path
+
+
+def open_text(path, mode='r', compression=None):
+    """
+    以 UTF-8 文本方式打开文件；compression 为 None 时按 path 的扩展名决定是否压缩
+    """
+    compression = compression or compression_of(path)
+    if compression == 'gzip':
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    if compression == 'zstd':
+        if not ZSTD_AVAILABLE:
+            raise ImportError('读写 .zst 文件需要安装 zstandard')
+        return zstandard.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def _iter_array_builtin(f, chunk_size=CHUNK_SIZE):
+    # 手写的增量解析：缓冲区里用 raw_decode 逐个解码元素，解码不完整时再读一块
+    decoder = json.JSONDecoder()
+    buffer = f.read(chunk_size)
+    eof = not buffer
+    position = 0
+
+    def skip(chars):
+        nonlocal position
+        while position < len(buffer) and buffer[position] in chars:
+            position += 1
+
+    def fill(min_size=chunk_size):
+        # 丢掉已消费的部分，再追加一块；返回 False 表示已到文件末尾
+        nonlocal buffer, position, eof
+        if eof:
+            return False
+        more = f.read(max(min_size, chunk_size))
+        buffer = buffer[position:] + more
+        position = 0
+        eof = not more
+        return not eof
+
+    skip(WHITESPACE)
+    while position >= len(buffer) and fill():
+        skip(WHITESPACE)
+    if position >= len(buffer):
+        return
+    if buffer[position] != '[':
+        raise ValueError('JSON 文件的顶层不是数组')
+    position += 1
+
+    expect_value = True
+    while True:
+        skip(WHITESPACE + ',' if not expect_value else WHITESPACE)
+        if position >= len(buffer):
+            if not fill():
+                raise ValueError('JSON 数组不完整：缺少结尾的 ]')
+            continue
+        if buffer[position] == ']':
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            # 元素跨越了缓冲区边界，读入至少与当前缓冲区等长的数据，避免大元素反复重试
+            if not fill(len(buffer)):
+                raise
+            continue
+        # 元素后面必须紧跟 , 或 ]；否则可能是数字被缓冲区截断（如 2.5 只读到 2.），补读后重新解码
+        following = end
+        while following < len(buffer) and buffer[following] in WHITESPACE:
+            following += 1
+        if following >= len(buffer) or buffer[following] not in ',]':
+            if fill():
+                continue
+            raise ValueError(f'JSON 数组格式错误，位置附近内容：{buffer[position:position + 40]!r}')
+        position = end
+        expect_value = False
+        yield item
+
+
+def iter_json_array(path, chunk_size=CHUNK_SIZE):
+    """
+    逐项读取顶层为数组的 JSON 文件
+    """
+    if IJSON_AVAILABLE and compression_of(path) is None:
+        with open(path, 'rb') as f:
+            yield from ijson.items(f, 'item', use_float=True)
+        return
+    with open_text(path) as f:
+        yield from _iter_array_builtin(f, chunk_size)
+
+
+def iter_jsonl(path):
+    """
+    逐行读取 JSON Lines 文件，跳过空行
+    """
+    with open_text(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_records(path):
+    """
+    按扩展名选择读取方式：.jsonl 按行，其余按 JSON 数组；先去掉 .gz / .zst
+    """
+    if strip_compression(path).endswith('.jsonl'):
+        return iter_jsonl(path)
+    return iter_json_array(path)
+
+
+def count_records(path):
+    count = 0
+    for _ in iter_records(path):
+        count += 1
+    return count
+
+
+def format_array_item(item, indent=4):
+    # 与 json.dump(indent=4) 中数组元素的缩进一致；字符串里的换行已被转义，按行加缩进是安全的
+    text = json.dumps(item, ensure_ascii=False, indent=indent)
+    if indent is None:
+        return text
+    return ' ' * indent + text.replace('\n', '\n' + ' ' * indent)
+
+
+class JsonArrayWriter:
+    """
+    逐项写出 JSON 数组；atomic 为 True 时先写临时文件，close() 时原子替换
+    """
+
+    def __init__(self, path, indent=4, atomic=True):
+        self.indent = indent
+        self._open(path, atomic)
+        self.f.write('[')
+
+    def _open(self, path, atomic):
+        self.path = path
+        self.atomic = atomic
+        self.tmp_path = path + '.tmp' if atomic else path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.f = open_text(self.tmp_path, 'w', compression_of(path))
+        self.count = 0
+
+    def write(self, item):
+        if self.indent is None:
+            self.f.write(', ' if self.count else '')
+        else:
+            self.f.write(',\n' if self.count else '\n')
+        self.f.write(format_array_item(item, self.indent))
+        self.count += 1
+
+    def write_all(self, items):
+        for item in items:
+            self.write(item)
+        return self.count
+
+    def close(self):
+        if self.f is None:
+            return
+        self.f.write('\n]' if self.count and self.indent is not None else ']')
+        self.f.close()
+        self.f = None
+        if self.atomic:
+            os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        # 出错时丢弃临时文件，保留原来的输出
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+            if self.atomic and os.path.exists(self.tmp_path):
+                os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class JsonlWriter(JsonArrayWriter):
+    """
+    逐行写出 JSON Lines，接口与 JsonArrayWriter 相同
+    """
+
+    def __init__(self, path, atomic=True):
+        self.indent = None
+        self._open(path, atomic)
+
+    def write(self, item):
+        self.write_line(json.dumps(item, ensure_ascii=False))
+
+    def write_line(self, line):
+        # 已经序列化好的一行（不含换行符），调用方需要先知道行的长度时避免重复序列化
+        self.f.write(line + '\n')
+        self.count += 1
+
+    def close(self):
+        if self.f is None:
+            return
+        self.f.close()
+        self.f = None
+        if self.atomic:
+            os.replace(self.tmp_path, self.path)
+
+
+def open_writer(path, **kw):
+    """
+    按扩展名返回 JsonlWriter 或 JsonArrayWriter；先去掉 .gz / .zst
+    """
+    if strip_compression(path).endswith('.jsonl'):
+        return JsonlWriter(path, **kw)
+    return JsonArrayWriter(path, **kw)
+
+
+def write_records(path, items, **kw):
+    """
+    把可迭代对象流式写入文件，返回写出的条数
+    """
+    with open_writer(path, **kw) as writer:
+        return writer.write_all(items)
+
+
+def append_to_json_array(path, item, indent=4):
+    """
+    向已有的 JSON 数组文件末尾追加一项，只改写结尾的 ]，不重新读写整个文件；文件不存在时新建
+    """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        write_records(path, [item], indent=indent, atomic=False)
+        return
+    with open(path, 'r+b') as f:
+        # 从末尾向前找到 ]，再看它前面是不是 [，判断数组是否为空；从前一个字符之后开始改写
+        end = f.seek(0, os.SEEK_END)
+        closing = _scan_back(f, end)
+        previous = _scan_back(f, closing[0]) if closing is not None else None
+        if closing is None or closing[1] != b']' or previous is None:
+            raise ValueError(f'{path} 不是 JSON 数组')
+        empty = previous[1] == b'['
+        f.seek(previous[0] + 1)
+        f.truncate()
+        text = ('\n' if empty else ',\n') + format_array_item(item, indent) + '\n]'
+        if indent is None:
+            text = ('' if empty else ', ') + format_array_item(item, indent) + ']'
+        f.write(text.encode('utf-8'))
+
+
+def _scan_back(f, end, block=4096):
+    # 返回 end 之前最后一个非空白字节的 (位置, 字节)
+    while end > 0:
+        start = max(end - block, 0)
+        f.seek(start)
+        data = f.read(end - start)
+        stripped = data.rstrip(WHITESPACE.encode())
+        if stripped:
+            position = start + len(stripped) - 1
+            return position, stripped[-1:]
+        end = start
+    return None
@@ -0,0 +1,203 @@
+import os
+import ast
+from collections import defaultdict
+
+# 测试函数到被测函数的匹配引擎。
+# 先对仓库中可作为被测函数的定义建一次倒排索引（函数名 -> 定义列表），之后每个测试函数依次尝试各匹配策略，
+# 每个策略只做常数次哈希查找，总耗时与测试函数数量成线性关系。
+# 函数信息为 split_functions 产出的字典，至少包含 name、qualname、class、file、code；
+# 测试函数信息可以额外带 imports（测试文件 import 的模块名列表），用于给同名候选排序。
+
+
+def is_test_function(name):
+    """
+    按命名约定判断是否为测试函数：test_X 或 X_test
+    """
+    return name.startswith('test_') or (name.endswith('_test') and len(name) > 5)
+
+
+def is_candidate_function(name):
+    """
+    能否作为被测函数：X_test 也可能是普通函数（如 trainer_test 被 test_trainer_test 测试），只排除 test_X
+    """
+    return not name.startswith('test_')
+
+
+def module_name(file_path):
+    """
+    文件路径转成点分模块名，如 pkg/sub/foo.py -> pkg.sub.foo
+    """
+    module = os.path.splitext(file_path.replace('\\', '/'))[0].strip('/')
+    if module.endswith('/__init__'):
+        module = module[:-len('/__init__')]
+    return module.replace('/', '.')
+
+
+def tested_module_stem(file_path):
+    """
+    测试文件名对应的被测模块名：test_foo.py / foo_test.py / tests.py -> foo / foo / None
+    """
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    if stem.startswith('test_'):
+        return stem[5:]
+    if stem.endswith('_test'):
+        return stem[:-5]
+    return None
+
+
+def called_names(code):
+    """
+    按出现顺序返回函数体中被调用的名字：foo(...) 记 foo，obj.foo(...) 记 foo
+    """
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return []
+    names = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call):
+            func = node.func
+            if isinstance(func, ast.Name):
+                names.setdefault(func.id)
+            elif isinstance(func, ast.Attribute):
+                names.setdefault(func.attr)
+    return list(names)
+
+
+class FunctionIndex:
+    """
+    仓库内候选被测函数的倒排索引
+    """
+
+    def __init__(self, functions):
+        self.by_name = defaultdict(list)
+        self.by_method = defaultdict(list)
+        for info in functions:
+            if not is_candidate_function(info['name']):
+                continue
+            self.by_name[info['name']].append(info)
+            if info.get('class'):
+                self.by_method[(info['class'].lower(), info['name'])].append(info)
+        # 模块名的每个后缀都指向该模块，import 写法不同（绝对 / 相对 / 带包前缀）也能对上
+        self.module_suffixes = defaultdict(set)
+        for infos in self.by_name.values():
+            for info in infos:
+                parts = module_name(info['file']).split('.')
+                for i in range(len(parts)):
+                    self.module_suffixes['.'.join(parts[i:])].add(info['file'])
+
+    def imported_files(self, imports):
+        files = set()
+        for name in imports or ():
+            name = name.lstrip('.')
+            if name:
+                files.update(self.module_suffixes.get(name, ()))
+        return files
+
+
+def proximity(test_info, candidate, imported_files):
+    """
+    候选与测试的 "距离"，越小越近：同文件 < 被测试文件 import < 文件名对应（test_foo.py 与 foo.py）
+    < 目录越接近越好；最后按文件和行号保证结果稳定
+    """
+    test_file = test_info['file']
+    candidate_file = candidate['file']
+    if candidate_file == test_file:
+        tier = 0
+    elif candidate_file in imported_files:
+        tier = 1
+    elif tested_module_stem(test_file) == os.path.splitext(os.path.basename(candidate_file))[0]:
+        tier = 2
+    else:
+        tier = 3
+    test_dirs = os.path.dirname(test_file).split('/')
+    candidate_dirs = os.path.dirname(candidate_file).split('/')
+    common = 0
+    for a, b in zip(test_dirs, candidate_dirs):
+        if a != b:
+            break
+        common += 1
+    return tier, -common, candidate_file, candidate.get('lineno') or 0
+
+
+def strategy_class(test_info, index):
+    # TestFoo.test_bar -> Foo.bar
+    class_name = test_info.get('class') or ''
+    if not class_name.startswith('Test') or not test_info['name'].startswith('test_'):
+        return []
+    target_class = class_name[4:].lstrip('_').lower()
+    return index.by_method.get((target_class, test_info['name'][5:]), [])
+
+
+def strategy_prefix(test_info, index):
+    # test_foo -> foo
+    name = test_info['name']
+    return index.by_name.get(name[5:], []) if name.startswith('test_') else []
+
+
+def strategy_suffix(test_info, index):
+    # foo_test -> foo
+    name = test_info['name']
+    return index.by_name.get(name[:-5], []) if name.endswith('_test') else []
+
+
+def strategy_calls(test_info, index):
+    # 测试函数体中调用了仓库里定义的函数；名字出现在测试名里的调用优先，其次按调用顺序
+    test_name = test_info['name']
+    called = [name for name in called_names(test_info['code'])
+              if name in index.by_name and name != test_name]
+    mentioned = [name for name in called if name in test_name]
+    for name in mentioned or called[:1]:
+        return index.by_name[name]
+    return []
+
+
+STRATEGIES = {
+    'class': strategy_class,
+    'prefix': strategy_prefix,
+    'suffix': strategy_suffix,
+    'calls': strategy_calls
+}
+
+# 按可信度从高到低依次尝试，命中即停
+DEFAULT_STRATEGIES = ('class', 'prefix', 'suffix', 'calls')
+
+
+class TestMatcher:
+    """
+    用法：matcher = TestMatcher(仓库中的函数信息)；matcher.match(测试函数信息) -> (被测函数信息, 策略名) 或 None
+    """
+
+    def __init__(self, functions, strategies=DEFAULT_STRATEGIES):
+        self.index = FunctionIndex(functions)
+        self.strategies = [(name, STRATEGIES[name]) for name in strategies]
+        self.imported_cache = {}
+
+    def _imported_files(self, test_info):
+        # 同一测试文件的 imports 只解析一次
+        key = test_info['file']
+        if key not in self.imported_cache:
+            self.imported_cache[key] = self.index.imported_files(test_info.get('imports'))
+        return self.imported_cache[key]
+
+    def match(self, test_info):
+        for strategy_name, strategy in self.strategies:
+            candidates = strategy(test_info, self.index)
+            if candidates:
+                if len(candidates) == 1:
+                    return candidates[0], strategy_name
+                imported_files = self._imported_files(test_info)
+                best = min(candidates, key=lambda candidate: proximity(test_info, candidate, imported_files))
+                return best, strategy_name
+        return None
+
+    def match_all(self, test_infos):
+        """
+        返回 [(测试函数信息, 被测函数信息, 策略名)]，未匹配的测试函数不出现在结果中
+        """
+        matches = []
+        for test_info in test_infos:
+            found = self.match(test_info)
+            if found is not None:
+                matches.append((test_info, found[0], found[1]))
+        return matches
@@ -0,0 +1,294 @@
+import os
+import json
+import logging
+import argparse
+import threading
+from collections import defaultdict
+from json_stream import iter_json_array, JsonArrayWriter
+
+# 每条日志记录对应一个已处理完的仓库：
+# {"repository": 仓库名, "num_pairs": 函数对数量, "function_pairs": [...]}
+# 只追加写入，检查点开销只与本批次大小相关，与累计的语料规模无关。
+
+
+class OutputStore:
+    """
+    函数对输出存储的基类，main() 只依赖这里定义的接口
+    """
+
+    def __init__(self, batch_size=1):
+        self.batch_size = batch_size
+        self.pending = []
+        self.processed_repos = set()
+        self.repository_stats = {}
+        self.total_pairs = 0
+
+    def open(self):
+        """
+        扫描已有日志，重建已处理仓库集合，返回该集合
+        """
+        self.processed_repos = set()
+        self.repository_stats = {}
+        self.total_pairs = 0
+        for record in self.iter_records():
+            self._apply(record)
+        return self.processed_repos
+
+    def _apply(self, record):
+        repo_name = record['repository']
+        self.processed_repos.add(repo_name)
+        self.repository_stats[repo_name] = record['num_pairs']
+        self.total_pairs += record['num_pairs']
+
+    def append_repo(self, repo_name, function_pairs, num_pairs=None):
+        """
+        记录一个仓库的处理结果，攒够 batch_size 个仓库后落盘
+        """
+        record = {
+            'repository': repo_name,
+            'num_pairs': len(function_pairs) if num_pairs is None else num_pairs,
+            'function_pairs': function_pairs
+        }
+        self.pending.append(record)
+        self._apply(record)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        lines = ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in self.pending)
+        self._write(lines.encode('utf-8'))
+        self.pending = []
+
+    def close(self):
+        self.flush()
+
+    def iter_records(self):
+        raise NotImplementedError
+
+    def _write(self, data):
+        raise NotImplementedError
+
+    def is_empty(self):
+        return next(iter(self.iter_records()), None) is None
+
+    def migrate_legacy(self, function_pairs_file, repository_stats_file, processed_repos_file):
+        """
+        首次启用日志存储时，把旧版三个 JSON 文件导入日志，之后以日志为准
+        """
+        if not self.is_empty() or not os.path.exists(processed_repos_file):
+            return 0
+        with open(processed_repos_file, 'r', encoding='utf-8') as f:
+            processed_repos = json.load(f)
+        repository_stats = {}
+        if os.path.exists(repository_stats_file):
+            with open(repository_stats_file, 'r', encoding='utf-8') as f:
+                repository_stats = json.load(f)
+        pairs_by_repo = defaultdict(list)
+        if os.path.exists(function_pairs_file):
+            for pair in iter_json_array(function_pairs_file):
+                pairs_by_repo[pair['repository']].append(pair)
+
+        batch_size, self.batch_size = self.batch_size, 1000
+        for repo_name in processed_repos:
+            pairs = pairs_by_repo.get(repo_name, [])
+            # 旧版统计中的数量以 repository_stats.json 为准
+            self.append_repo(repo_name, pairs, repository_stats.get(repo_name))
+        self.flush()
+        self.batch_size = batch_size
+        logging.info(f'已将旧版 JSON 结果导入日志，共 {len(processed_repos)} 个仓库')
+        return len(processed_repos)
+
+    def compact(self, function_pairs_file='function_pairs.json',
+                repository_stats_file='repository_stats.json',
+                processed_repos_file='processed_repos.json'):
+        """
+        把日志整理成原来的三个 JSON 文件，写临时文件后原子替换
+        """
+        self.flush()
+        processed_repos = []
+        repository_stats = {}
+        with JsonArrayWriter(function_pairs_file) as writer:
+            for record in self.iter_records():
+                processed_repos.append(record['repository'])
+                repository_stats[record['repository']] = record['num_pairs']
+                writer.write_all(record['function_pairs'])
+            num_pairs = writer.count
+        _dump_atomic(repository_stats, repository_stats_file)
+        _dump_atomic(processed_repos, processed_repos_file)
+        logging.info(f'整理完成：{len(processed_repos)} 个仓库，{num_pairs} 个函数对')
+        return num_pairs
+
+
+class JsonlOutputStore(OutputStore):
+    """
+    单文件追加日志，每批次写完后 fsync
+    """
+
+    def __init__(self, path='function_pairs.log.jsonl', batch_size=1):
+        super().__init__(batch_size)
+        self.path = path
+
+    def iter_records(self):
+        if not os.path.exists(self.path):
+            return
+        yield from _read_log(self.path)
+
+    def _write(self, data):
+        _append_fsync(self.path, data)
+
+
+class SegmentedOutputStore(OutputStore):
+    """
+    分段日志，单个段超过 segment_bytes 后切换到新段，便于按段备份和清理
+    """
+
+    def __init__(self, directory='function_pairs_segments', batch_size=1, segment_bytes=64 * 1024 * 1024):
+        super().__init__(batch_size)
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _segments(self):
+        names = sorted(name for name in os.listdir(self.directory) if name.startswith('segment_') and name.endswith('.jsonl'))
+        return [os.path.join(self.directory, name) for name in names]
+
+    def iter_records(self):
+        for segment in self._segments():
+            yield from _read_log(segment)
+
+    def _write(self, data):
+        segments = self._segments()
+        if not segments or os.path.getsize(segments[-1]) >= self.segment_bytes:
+            segments.append(os.path.join(self.directory, f'segment_{len(segments) + 1:06d}.jsonl'))
+        _append_fsync(segments[-1], data)
+
+
+class FileProgressLog:
+    """
+    文件粒度的进度日志：每个下载并解析完的文件追加一条记录，
+    崩溃重启后未完成仓库中已处理的文件直接复用，不再重新下载
+    """
+
+    def __init__(self, path='file_progress.jsonl', sync_every=20):
+        self.path = path
+        self.sync_every = sync_every
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.unsynced = 0
+        self.file = None
+
+    def load(self, processed_repos):
+        """
+        读取进度日志，丢弃已整体完成的仓库的记录并重写日志，返回复用的文件数
+        """
+        self.entries = {}
+        if os.path.exists(self.path):
+            for record in _read_log(self.path):
+                if record['repository'] not in processed_repos:
+                    self.entries.setdefault(record['repository'], {})[record['file_path']] = record
+            tmp_file = self.path + '.tmp'
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                for records in self.entries.values():
+                    for record in records.values():
+                        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            os.replace(tmp_file, self.path)
+        self.file = open(self.path, 'a', encoding='utf-8')
+        return sum(len(records) for records in self.entries.values())
+
+    def get(self, repo_name, file_path):
+        record = self.entries.get(repo_name, {}).get(file_path)
+        if record is None:
+            return None
+        return record['functions'], record['test_functions']
+
+    def record(self, repo_name, file_path, functions, test_functions):
+        record = {
+            'repository': repo_name,
+            'file_path': file_path,
+            'functions': functions,
+            'test_functions': test_functions
+        }
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self.lock:
+            self.entries.setdefault(repo_name, {})[file_path] = record
+            self.file.write(line)
+            self.file.flush()
+            self.unsynced += 1
+            if self.unsynced >= self.sync_every:
+                os.fsync(self.file.fileno())
+                self.unsynced = 0
+
+    def discard_repo(self, repo_name):
+        """
+        仓库整体写入输出存储后释放它的文件记录，磁盘上的记录在下次启动时清理
+        """
+        with self.lock:
+            self.entries.pop(repo_name, None)
+
+    def close(self):
+        if self.file is not None:
+            with self.lock:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                self.file.close()
+                self.file = None
+
+
+def _append_fsync(path, data):
+    with open(path, 'ab') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _read_log(path):
+    """
+    逐行读取日志；只有末尾没有换行符的残缺行（中断的写入）会被截掉，保证后续追加从完整记录之后开始。
+    中间无法解析的行记录警告后跳过，字节原样留在磁盘上，不影响其后的记录
+    """
+    good_offset = 0
+    with open(path, 'rb') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.endswith(b'\n'):
+                break
+            good_offset += len(line)
+            try:
+                record = json.loads(line)
+            except ValueError:
+                logging.warning(f'日志 {path} 第 {line_number} 行无法解析，已跳过')
+                continue
+            yield record
+    if good_offset < os.path.getsize(path):
+        logging.warning(f'日志 {path} 末尾存在残缺记录，已截断到 {good_offset} 字节')
+        with open(path, 'r+b') as f:
+            f.truncate(good_offset)
+
+
+def _dump_atomic(data, path):
+    tmp_file = path + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=4)
+    os.replace(tmp_file, path)
+
+
+def open_store(backend='jsonl', batch_size=1, **kwargs):
+    """
+    根据后端名称创建输出存储
+    """
+    if backend == 'jsonl':
+        return JsonlOutputStore(batch_size=batch_size, **kwargs)
+    if backend == 'segmented':
+        return SegmentedOutputStore(batch_size=batch_size, **kwargs)
+    raise ValueError(f'未知的输出存储后端：{backend}')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='整理函数对日志为 JSON 文件')
+    parser.add_argument('command', choices=['compact'])
+    parser.add_argument('--backend', default='jsonl', choices=['jsonl', 'segmented'])
+    args = parser.parse_args()
+    store = open_store(args.backend)
+    store.compact()
@@ -0,0 +1,167 @@
+import os
+import time
+import logging
+import threading
+import multiprocessing
+import concurrent.futures
+from concurrent.futures import ProcessPoolExecutor, Future
+
+from function_index import index_module
+from matcher import is_test_function, is_candidate_function
+
+
+def split_functions(code_content, file_path):
+    """
+    解析一个源文件，按测试命名约定拆成 (函数表, 测试函数表)，X_test 形式的函数两张表都放；
+    键为 "文件路径::限定名"，不同类中的同名方法、不同文件中的同名函数互不覆盖。
+    测试函数额外记录所在文件 import 的模块，供匹配时按模块远近排序
+    """
+    function_map = {}
+    test_function_map = {}
+    records, imports = index_module(code_content)
+    for record in records:
+        info = {
+            'code': record.code,
+            'file': file_path,
+            'name': record.name,
+            'qualname': record.qualname,
+            'class': record.class_name,
+            'lineno': record.lineno,
+            'end_lineno': record.end_lineno,
+            'decorators': record.decorators,
+            'is_async': record.is_async
+        }
+        if is_candidate_function(record.name):
+            function_map[f'{file_path}::{record.qualname}'] = info
+        if is_test_function(record.name):
+            test_function_map[f'{file_path}::{record.qualname}'] = dict(info, imports=imports)
+    return function_map, test_function_map
+
+
+def _parse_in_worker(code_content, file_path):
+    # 在工作进程中执行，额外返回解析耗时供统计
+    start = time.perf_counter()
+    result = split_functions(code_content, file_path)
+    return result, time.perf_counter() - start
+
+
+class StageMetrics:
+    """
+    单个流水线阶段的吞吐统计
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.items = 0
+        self.bytes = 0
+        self.busy_seconds = 0.0
+        self.blocked_seconds = 0.0
+
+    def add(self, items=1, size=0, busy_seconds=0.0):
+        with self.lock:
+            self.items += items
+            self.bytes += size
+            self.busy_seconds += busy_seconds
+
+    def add_blocked(self, seconds):
+        with self.lock:
+            self.blocked_seconds += seconds
+
+    def snapshot(self):
+        with self.lock:
+            elapsed = max(time.time() - self.started, 1e-9)
+            return {
+                'items': self.items,
+                'bytes': self.bytes,
+                'items_per_second': round(self.items / elapsed, 2),
+                'mb_per_second': round(self.bytes / elapsed / 1024 / 1024, 3),
+                'busy_seconds': round(self.busy_seconds, 2),
+                'blocked_seconds': round(self.blocked_seconds, 2)
+            }
+
+    def format(self):
+        snapshot = self.snapshot()
+        return (f'{self.name}：{snapshot["items"]} 个文件，{snapshot["items_per_second"]} 个/秒，'
+                f'{snapshot["mb_per_second"]} MB/秒，工作 {snapshot["busy_seconds"]} 秒，'
+                f'因背压阻塞 {snapshot["blocked_seconds"]} 秒')
+
+
+class ParseStage:
+    """
+    CPU 密集的解析阶段：I/O 线程把源码交给 submit()，由进程池解析后返回 Future。
+    在途任务数超过 max_pending 时 submit() 阻塞，形成对下载阶段的背压。
+    backend 为 'process'（默认）、'interpreter'（Python 3.14+ 的子解释器池）或 'inline'（当前线程直接解析）
+    """
+
+    def __init__(self, max_workers=None, max_pending=256, backend='process'):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.backend = backend
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.io_metrics = StageMetrics('下载阶段')
+        self.parse_metrics = StageMetrics('解析阶段')
+        if backend == 'process':
+            # 下载线程和事件循环线程已在运行，用 forkserver 避免 fork 时复制持有中的锁
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver') if 'forkserver' in methods else None
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+        elif backend == 'interpreter':
+            executor_class = getattr(concurrent.futures, 'InterpreterPoolExecutor', None)
+            if executor_class is None:
+                logging.warning('当前 Python 不支持子解释器池，改用进程池')
+                self.backend = 'process'
+                executor_class = ProcessPoolExecutor
+            self.executor = executor_class(max_workers=self.max_workers)
+        elif backend == 'inline':
+            self.executor = None
+        else:
+            raise ValueError(f'未知的解析后端：{backend}')
+
+    def submit(self, code_content, file_path, io_seconds=0.0):
+        """
+        提交一个已下载的源文件，返回结果为 (函数表, 测试函数表) 的 Future
+        """
+        size = len(code_content)
+        self.io_metrics.add(1, size, io_seconds)
+        if self.executor is None:
+            start = time.perf_counter()
+            future = Future()
+            future.set_result(split_functions(code_content, file_path))
+            self.parse_metrics.add(1, size, time.perf_counter() - start)
+            return future
+
+        start = time.perf_counter()
+        self.slots.acquire()
+        self.io_metrics.add_blocked(time.perf_counter() - start)
+
+        result = Future()
+        inner = self.executor.submit(_parse_in_worker, code_content, file_path)
+
+        def done(inner_future):
+            self.slots.release()
+            try:
+                value, parse_seconds = inner_future.result()
+            except Exception as e:
+                logging.error(f'解析文件 {file_path} 时出错：{e}')
+                value, parse_seconds = ({}, {}), 0.0
+            self.parse_metrics.add(1, size, parse_seconds)
+            result.set_result(value)
+
+        inner.add_done_callback(done)
+        return result
+
+    def parse(self, code_content, file_path, io_seconds=0.0):
+        """
+        同步解析：提交后等待结果
+        """
+        return self.submit(code_content, file_path, io_seconds).result()
+
+    def log_metrics(self):
+        logging.info(self.io_metrics.format())
+        logging.info(self.parse_metrics.format())
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
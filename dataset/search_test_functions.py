@@ -1,10 +1,12 @@
 from github import Github
 import requests
-import json
-import ast
 import os
-import time
 from tqdm import tqdm
+from archive_ingest import ingest_repository, parse_commit_sha
+from http_cache import HttpCache
+from function_index import index_functions, index_module
+from matcher import TestMatcher, is_test_function
+from json_stream import iter_json_array, append_to_json_array
 
 # 多个 GitHub 访问令牌
 ACCESS_TOKENS = [3
@@ -27,27 +29,22 @@ g = switch_token()
 
 PROCESSED_LOG = 'processed_files.log'
 DATA_PAIRS_FILE = 'data_pairs.json'
+# 为 True 时按 download_url 中的提交 SHA 下载整个仓库归档，代替逐目录、逐文件的 API 调用
+USE_ARCHIVE = True
+# 持久化下载缓存，设为 None 时不使用缓存
+HTTP_CACHE_FILE = 'http_cache.sqlite'
+http_cache = None
 
 def extract_functions_from_content(file_content):
     """
-    从代码内容中提取所有函数定义，忽略非 Python 3 语法的错误
+    从代码内容中单遍提取所有函数定义（含方法和 async def），返回 {限定名: 源码}，
+    忽略非 Python 3 语法的错误
     """
-    try:
-        tree = ast.parse(file_content)
-    except SyntaxError as e:
-        print(f"解析代码文件失败，错误：{e}")
-        return {}
-    functions = {}
-    for node in ast.walk(tree):
-        if isinstance(node, ast.FunctionDef):
-            func_name = node.name
-            func_code = ast.get_source_segment(file_content, node)
-            functions[func_name] = func_code
-    return functions
-
-def get_python_files_in_repo(repo):
-    """
-    获取仓库中所有的Python文件路径列表
+    return {record.qualname: record.code for record in index_functions(file_content)}
+
+def get_python_files_in_repo(repo, blob_shas=None):
+    """
+    获取仓库中所有的Python文件路径列表；提供 blob_shas 字典时顺便记录每个文件的 blob SHA
     """
     python_files = []
     contents = repo.get_contents("")
@@ -62,6 +59,8 @@ def get_python_files_in_repo(repo):
         elif file_content.type == "file" and file_content.path.endswith('.py'):
             if 'test' not in file_content.path.lower():
                 python_files.append(file_content.path)
+                if blob_shas is not None:
+                    blob_shas[file_content.path] = file_content.sha
     return python_files
 
 def load_processed_log():
@@ -81,57 +80,38 @@ def save_processed_log(processed_files):
         for file_info in processed_files:
             f.write(f"{file_info}\n")
 
-def load_existing_data_pairs():
-    """
-    加载已保存的数据对
-    """
-    if os.path.exists(DATA_PAIRS_FILE):
-        with open(DATA_PAIRS_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return []
-
 def save_single_data_pair(data_pair):
     """
-    保存单个数据对到文件（及时保存）
+    保存单个数据对到文件（及时保存）：只在数组末尾追加，不重新读写整个文件
     """
-    existing_data = load_existing_data_pairs()
-    existing_data.append(data_pair)
-    
-    with open(DATA_PAIRS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(existing_data, f, ensure_ascii=False, indent=4)
+    append_to_json_array(DATA_PAIRS_FILE, data_pair)
 
-def process_single_repo(github_obj, file_info, processed_log):
+_archive_cache = {}
+
+def get_repo_functions_via_archive(repo_name, download_url):
     """
-    处理单个仓库，提取函数对
+    下载一次仓库归档提取全部非测试文件中的函数，只缓存最近一个仓库的结果
     """
-    global g
-    repo_name = file_info['repository_full_name']
-    test_file_path = file_info['file_path']
-    download_url = file_info['download_url']
-    unique_file_identifier = f"{repo_name}:{test_file_path}"
-
-    # 如果该文件已经处理过，则跳过
-    if unique_file_identifier in processed_log:
-        print(f"跳过已处理的文件：{repo_name}, {test_file_path}")
-        return None
-
-    print(f"\n处理仓库：{repo_name}, 测试文件：{test_file_path}")
-
-    # 下载测试文件内容
-    response = requests.get(download_url)
-    if response.status_code != 200:
-        print(f"无法下载文件：{download_url}")
-        return None
-    test_file_content = response.text
+    sha = parse_commit_sha(download_url)
+    if (repo_name, sha) in _archive_cache:
+        return _archive_cache[(repo_name, sha)]
+    repo_functions = {}
 
-    # 提取测试函数，捕获并忽略解析失败的文件
-    test_functions = extract_functions_from_content(test_file_content)
-    test_functions = {name: code for name, code in test_functions.items() if name.startswith('test_')}
+    def handle_file(py_file, code_content):
+        if 'test' not in py_file.lower():
+            repo_functions[py_file] = extract_functions_from_content(code_content)
 
-    if not test_functions:
-        print(f"测试文件 {test_file_path} 中未找到测试函数")
+    if not ingest_repository(repo_name, download_url, handle_file, cache=http_cache):
         return None
+    _archive_cache.clear()
+    _archive_cache[(repo_name, sha)] = repo_functions
+    return repo_functions
 
+def get_repo_functions_via_api(github_obj, repo_name):
+    """
+    逐目录、逐文件通过 API 获取仓库中的函数，归档下载不可用时使用
+    """
+    global g
     # 获取仓库对象
     try:
         repo = github_obj.get_repo(repo_name)
@@ -146,47 +126,133 @@ def process_single_repo(github_obj, file_info, processed_log):
         g = switch_token()
 
     # 获取仓库中的Python文件
-    python_files = get_python_files_in_repo(repo)
+    blob_shas = {}
+    python_files = get_python_files_in_repo(repo, blob_shas)
 
-    # 提取仓库中所有的函数
+    # 提取仓库中所有的函数；blob SHA 已缓存的文件不再请求内容
     repo_functions = {}
     for py_file in python_files:
         try:
-            file_contents = repo.get_contents(py_file)
-            code_content = file_contents.decoded_content.decode('utf-8', errors='ignore')
+            blob_sha = blob_shas.get(py_file)
+            use_cache = http_cache is not None and blob_sha
+            raw = http_cache.get(HttpCache.blob_key(blob_sha)) if use_cache else None
+            if raw is None:
+                raw = repo.get_contents(py_file).decoded_content
+                if use_cache:
+                    http_cache.put([HttpCache.blob_key(blob_sha)], raw)
+            code_content = raw.decode('utf-8', errors='ignore')
             funcs = extract_functions_from_content(code_content)
             repo_functions[py_file] = funcs
         except Exception as e:
             print(f"无法处理文件：{py_file}, 错误：{e}")
             continue
 
-    # 对于每个测试函数，查找对应的原始函数
-    for test_func_name, test_func_code in test_functions.items():
-        original_func_name = test_func_name[5:]  # 去除 test_ 前缀
-        found = False
-        for code_file, funcs in repo_functions.items():
-            if original_func_name in funcs:
-                original_func_code = funcs[original_func_name]
-                data_pair = {
-                    'input_code': original_func_code,
-                    'test_code': test_func_code,
-                    'repo_name': repo_name,
-                    'code_file': code_file,
-                    'test_file': test_file_path
-                }
-                save_single_data_pair(data_pair)  # 及时保存找到的函数对
-                print(f"匹配成功：{original_func_name} 在文件 {code_file} 中找到")
-                found = True
-                break  # 假设一个函数只在一个文件中定义
-        if not found:
-            print(f"在仓库 {repo_name} 中未找到函数 {original_func_name}")
+    return repo_functions
+
+def function_infos(file_path, functions, imports=None):
+    """
+    把 {限定名: 源码} 转成 TestMatcher 使用的函数信息字典
+    """
+    infos = []
+    for qualname, code in functions.items():
+        parts = qualname.split('.')
+        infos.append({
+            'name': parts[-1],
+            'qualname': qualname,
+            'class': parts[-2] if len(parts) > 1 and parts[-2] != '<locals>' else None,
+            'file': file_path,
+            'code': code,
+            'imports': imports
+        })
+    return infos
+
+# 仓库函数的索引只保留最近一个仓库的，同一仓库的测试文件相邻，复用同一个索引
+_matcher_cache = {}
+
+def get_repo_matcher(repo_name, repo_functions):
+    cached = _matcher_cache.get(repo_name)
+    if cached is not None and cached[0] is repo_functions:
+        return cached[1]
+    matcher = TestMatcher(info for code_file, funcs in repo_functions.items()
+                          for info in function_infos(code_file, funcs))
+    _matcher_cache.clear()
+    _matcher_cache[repo_name] = (repo_functions, matcher)
+    return matcher
+
+def process_single_repo(github_obj, file_info, processed_log):
+    """
+    处理单个仓库，提取函数对
+    """
+    repo_name = file_info['repository_full_name']
+    test_file_path = file_info['file_path']
+    download_url = file_info['download_url']
+    unique_file_identifier = f"{repo_name}:{test_file_path}"
+
+    # 如果该文件已经处理过，则跳过
+    if unique_file_identifier in processed_log:
+        print(f"跳过已处理的文件：{repo_name}, {test_file_path}")
+        return None
+
+    print(f"\n处理仓库：{repo_name}, 测试文件：{test_file_path}")
+
+    # 下载测试文件内容，download_url 固定在提交上，缓存命中时不联网
+    sha = parse_commit_sha(download_url)
+    cached = http_cache.get_pinned(repo_name, sha, test_file_path) if http_cache is not None else None
+    if cached is not None:
+        test_file_content = cached.decode('utf-8', errors='ignore')
+    else:
+        response = requests.get(download_url)
+        if response.status_code != 200:
+            print(f"无法下载文件：{download_url}")
+            return None
+        test_file_content = response.text
+        if http_cache is not None and sha:
+            http_cache.put_pinned(repo_name, sha, test_file_path, response.content)
+
+    # 提取测试函数，捕获并忽略解析失败的文件
+    records, imports = index_module(test_file_content)
+    test_functions = {record.qualname: record.code for record in records if is_test_function(record.name)}
+
+    if not test_functions:
+        print(f"测试文件 {test_file_path} 中未找到测试函数")
+        return None
+
+    # 提取仓库中所有的函数；同一仓库的测试文件相邻，归档结果复用给后续测试文件
+    repo_functions = None
+    if USE_ARCHIVE:
+        repo_functions = get_repo_functions_via_archive(repo_name, download_url)
+    if repo_functions is None:
+        repo_functions = get_repo_functions_via_api(github_obj, repo_name)
+        if repo_functions is None:
+            return None
+
+    # 对于每个测试函数，在仓库函数的倒排索引中查找对应的原始函数
+    matcher = get_repo_matcher(repo_name, repo_functions)
+    for test_info in function_infos(test_file_path, test_functions, imports):
+        found = matcher.match(test_info)
+        if found is None:
+            print(f"在仓库 {repo_name} 中未找到测试函数 {test_info['qualname']} 对应的函数")
+            continue
+        function_info, strategy = found
+        data_pair = {
+            'input_code': function_info['code'],
+            'test_code': test_info['code'],
+            'repo_name': repo_name,
+            'code_file': function_info['file'],
+            'test_file': test_file_path
+        }
+        save_single_data_pair(data_pair)  # 及时保存找到的函数对
+        print(f"匹配成功（{strategy}）：{function_info['qualname']} 在文件 {function_info['file']} 中找到")
 
     return unique_file_identifier
 
 def find_and_save_functions():
+    global http_cache
+    if HTTP_CACHE_FILE and http_cache is None:
+        http_cache = HttpCache(HTTP_CACHE_FILE)
+
     # 从 deduplicated_output.json 中读取测试文件的信息
-    with open('deduplicated_output.json', 'r', encoding='utf-8') as f:
-        test_code_files = json.load(f)
+    test_code_files = iter_json_array('deduplicated_output.json')
 
     processed_log = load_processed_log()
     processed_files = set()
@@ -198,5 +264,8 @@ def find_and_save_functions():
             processed_files.add(result)
             save_processed_log([result])  # 及时保存处理日志
 
+    if http_cache is not None:
+        print(http_cache.format_stats())
+
 if __name__ == "__main__":
     find_and_save_functions()
@@ -0,0 +1,176 @@
+import time
+import logging
+import threading
+
+# GitHub REST API 每个令牌每小时 5000 次
+DEFAULT_LIMIT = 5000
+DEFAULT_WINDOW = 3600
+
+
+class TokenScheduler:
+    """
+    多令牌调度器：从每个响应的 X-RateLimit-Remaining / Reset 更新各令牌的剩余预算，
+    每次请求分配预算最多的令牌，并按 "剩余预算 / 距重置时间" 匀速发出请求，避免触发 403。
+    没有可用令牌时调用方阻塞在条件变量上，而不是轮询。
+    """
+
+    def __init__(self, tokens, pace=True, burst=50, limit=DEFAULT_LIMIT):
+        # tokens 可以是令牌字符串列表，也可以是 ACCESS_TOKENS 那样带 'token' 键的字典列表
+        self.tokens = [token if isinstance(token, str) else token['token'] for token in tokens]
+        if not self.tokens:
+            raise ValueError('没有配置任何访问令牌')
+        self.pace = pace
+        self.burst = burst
+        now = time.time()
+        self.states = [{
+            'remaining': limit,
+            'limit': limit,
+            'reset_time': now + DEFAULT_WINDOW,
+            'in_flight': 0,
+            'next_allowed': now,
+            'credit': burst,
+            'last_refill': now,
+            'known': False,
+            'requests': 0
+        } for _ in self.tokens]
+        self.condition = threading.Condition()
+        self.started = now
+        self.total_requests = 0
+        self.total_wait = 0.0
+        self.waiting = 0
+
+    def _budget(self, state, now):
+        if state['reset_time'] <= now:
+            # 已过重置时间但还没有新响应，按满额估计，收到响应前不做匀速限制
+            state['remaining'] = state['limit']
+            state['reset_time'] = now + DEFAULT_WINDOW
+            state['known'] = False
+        return state['remaining'] - state['in_flight']
+
+    def _refill(self, state, budget, now):
+        # 令牌桶：按 "剩余预算 / 距重置时间" 的速率补充 credit，最多积攒 burst 个
+        rate = budget / max(state['reset_time'] - now, 1.0) if budget > 0 else 0.0
+        state['credit'] = min(self.burst, state['credit'] + (now - state['last_refill']) * rate)
+        state['last_refill'] = now
+        return rate
+
+    def _ready_at(self, state, budget, now):
+        """
+        返回该令牌最早可以发请求的时间，预算耗尽时为重置时间
+        """
+        if budget <= 0:
+            return state['reset_time']
+        ready_at = state['next_allowed']
+        if self.pace and state['known']:
+            rate = self._refill(state, budget, now)
+            if state['credit'] < 1:
+                ready_at = max(ready_at, now + (1 - state['credit']) / rate)
+        return ready_at
+
+    def acquire(self):
+        """
+        阻塞直到有令牌可用，返回令牌下标
+        """
+        start = time.time()
+        with self.condition:
+            self.waiting += 1
+            try:
+                while True:
+                    now = time.time()
+                    best_index = None
+                    best_budget = 0
+                    earliest = None
+                    for index, state in enumerate(self.states):
+                        budget = self._budget(state, now)
+                        ready_at = self._ready_at(state, budget, now)
+                        if ready_at <= now:
+                            if budget > best_budget:
+                                best_index, best_budget = index, budget
+                        elif earliest is None or ready_at < earliest:
+                            earliest = ready_at
+                    if best_index is not None:
+                        break
+                    self.condition.wait(timeout=max(earliest - now, 0.01))
+            finally:
+                self.waiting -= 1
+
+            state = self.states[best_index]
+            if self.pace and state['known']:
+                state['credit'] -= 1
+            state['in_flight'] += 1
+            state['requests'] += 1
+            self.total_requests += 1
+            self.total_wait += now - start
+            return best_index
+
+    def headers(self, index):
+        return {
+            'Authorization': f'token {self.tokens[index]}',
+            'Accept': 'application/vnd.github.v3+json'
+        }
+
+    def update(self, index, status_code=None, headers=None):
+        """
+        请求结束后调用，用响应头更新该令牌的预算；请求失败没有响应时 headers 传 None
+        """
+        with self.condition:
+            state = self.states[index]
+            state['in_flight'] = max(state['in_flight'] - 1, 0)
+            if headers is not None:
+                remaining = headers.get('X-RateLimit-Remaining')
+                reset_time = headers.get('X-RateLimit-Reset')
+                limit = headers.get('X-RateLimit-Limit')
+                if remaining is not None:
+                    state['remaining'] = int(remaining)
+                if reset_time is not None:
+                    state['reset_time'] = int(reset_time)
+                if limit is not None:
+                    state['limit'] = int(limit)
+                if remaining is not None and reset_time is not None:
+                    if not state['known']:
+                        state['credit'] = self.burst
+                        state['last_refill'] = time.time()
+                    state['known'] = True
+                if status_code == 403 and remaining is not None and int(remaining) == 0:
+                    logging.warning(f'令牌 {index} 已限速，{max(int(state["reset_time"] - time.time()), 0)} 秒后重置')
+            self.condition.notify_all()
+
+    def backoff(self, index, seconds):
+        """
+        滥用检测等二级限速：暂停该令牌一段时间，其他令牌不受影响
+        """
+        with self.condition:
+            state = self.states[index]
+            state['next_allowed'] = max(state['next_allowed'], time.time() + seconds)
+            state['credit'] = 0
+            self.condition.notify_all()
+
+    def metrics(self):
+        with self.condition:
+            now = time.time()
+            elapsed = max(now - self.started, 1e-9)
+            return {
+                'tokens': [{
+                    'remaining': state['remaining'],
+                    'in_flight': state['in_flight'],
+                    'reset_in': max(int(state['reset_time'] - now), 0),
+                    'requests': state['requests']
+                } for state in self.states],
+                'waiting_threads': self.waiting,
+                'total_requests': self.total_requests,
+                'total_wait_seconds': round(self.total_wait, 2),
+                'requests_per_second': round(self.total_requests / elapsed, 2)
+            }
+
+    def log_metrics(self, interval=60):
+        """
+        后台线程定期输出调度器指标
+        """
+        while True:
+            time.sleep(interval)
+            metrics = self.metrics()
+            logging.info(f'令牌调度：{metrics["requests_per_second"]} 次/秒，累计 {metrics["total_requests"]} 次请求，'
+                         f'累计等待 {metrics["total_wait_seconds"]} 秒，等待中线程 {metrics["waiting_threads"]} 个')
+            for index, token in enumerate(metrics['tokens']):
+                logging.info(f'  令牌 {index}：剩余 {token["remaining"]}，在途 {token["in_flight"]}，'
+                             f'{token["reset_in"]} 秒后重置，已用 {token["requests"]} 次')
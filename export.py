@@ -0,0 +1,270 @@
+import os
+import sys
+import argparse
+
+from dataset.json_stream import open_writer, ZSTD_AVAILABLE
+from dataset.corpus_store import iter_corpus
+from lengths import TokenCounter, LengthStage, TOKENIZERS_AVAILABLE, WINDOW
+
+try:
+    import pyarrow  # 输出 Parquet / Arrow 时才需要
+    import pyarrow.ipc
+    import pyarrow.parquet
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# 导出函数对数据集：只读一遍输入，每条函数对经各个模板转换后同时写入多个输出。
+# 模板把函数对转换成一条训练样本，返回 None 表示跳过；输出格式按扩展名决定：
+#   .jsonl / .json              JSON Lines / JSON 数组，再加 .gz / .zst 后缀时压缩
+#   .parquet / .arrow           列式存储（需要 pyarrow），训练端可以按列、按批直接读取
+# 指定 max_tokens 等长度选项时，样本先按窗口经过 lengths.LengthStage 过滤、截断或装箱再写出，结束时打印长度直方图。
+# 用法：python export.py merged_output.json -o chatglm=train.jsonl.gz -o chat=train.parquet --max-tokens 2048 --pack
+
+INSTRUCTION = "为以下 Python 函数编写对应的单元测试代码。"
+ARROW_ROWS = 10000
+
+TEMPLATES = {}
+
+
+# 注册模板：fields 为模板需要的字段，缺少时跳过该函数对
+def register_template(name, fields=('function_code', 'test_function_code')):
+    def decorator(function):
+        TEMPLATES[name] = (function, fields)
+        return function
+    return decorator
+
+
+@register_template('plain')
+def plain_template(item):
+    return {
+        "input": item["function_code"],
+        "output": item["test_function_code"]
+    }
+
+
+@register_template('chatglm')
+def chatglm_template(item):
+    return {
+        "instruction": INSTRUCTION,
+        "input": item["function_code"],
+        "output": item["test_function_code"]
+    }
+
+
+@register_template('chat')
+def chat_template(item):
+    return {
+        "messages": [
+            {"role": "user", "content": f"{INSTRUCTION}\n\n```python\n{item['function_code']}\n```"},
+            {"role": "assistant", "content": f"```python\n{item['test_function_code']}\n```"}
+        ]
+    }
+
+
+def module_name(path, default='source'):
+    """
+    源文件路径对应的模块名：repo/pkg/utils.py -> utils
+    """
+    if not path:
+        return default
+    name = os.path.splitext(os.path.basename(path.replace('\\', '/')))[0]
+    return name if name.isidentifier() else default
+
+
+@register_template('pynguin')
+def pynguin_template(item):
+    # 与 pynguin_gen 的布局一致：被测模块一个文件，测试模块 test_<模块>.py 从被测模块导入函数（方法则导入其所在的类）
+    name = module_name(item.get('function_file'))
+    qualname = item.get('function_qualname') or item.get('function_name') or ''
+    imported = qualname.split('.')[0]
+    header = "import pytest\n"
+    if imported.isidentifier():
+        header += f"from {name} import {imported}\n"
+    return {
+        "module_name": name,
+        "module_code": item["function_code"],
+        "test_module_name": f"test_{name}",
+        "test_code": header + "\n\n" + item["test_function_code"]
+    }
+
+
+def apply_template(item, template):
+    """
+    用模板转换一条函数对，缺少必要字段时返回 None
+    """
+    function, fields = TEMPLATES[template]
+    if any(field not in item for field in fields):
+        return None
+    return function(item)
+
+
+def transform(items, template):
+    """
+    逐项转换的生成器，跳过缺少字段的函数对
+    """
+    for item in items:
+        record = apply_template(item, template)
+        if record is not None:
+            yield record
+
+
+class ArrowRecordWriter:
+    """
+    分批写出 Parquet 或 Arrow IPC 文件，接口与 JsonlWriter 相同；列类型由第一批记录推断
+    """
+
+    def __init__(self, path, rows_per_group=ARROW_ROWS):
+        if not PYARROW_AVAILABLE:
+            raise ImportError('输出 Parquet / Arrow 需要安装 pyarrow')
+        self.path = path
+        self.rows_per_group = rows_per_group
+        self.writer = None
+        self.schema = None
+        self.rows = []
+        self.count = 0
+
+    def write(self, record):
+        self.rows.append(record)
+        self.count += 1
+        if len(self.rows) >= self.rows_per_group:
+            self._flush()
+
+    def _flush(self):
+        if not self.rows:
+            return
+        table = pyarrow.Table.from_pylist(self.rows, schema=self.schema)
+        if self.writer is None:
+            self.schema = table.schema
+            if self.path.endswith('.parquet'):
+                self.writer = pyarrow.parquet.ParquetWriter(self.path, self.schema)
+            else:
+                self.writer = pyarrow.ipc.new_file(self.path, self.schema)
+        self.writer.write_table(table)
+        self.rows = []
+
+    def close(self):
+        self._flush()
+        if self.writer is not None:
+            self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def open_sink(path):
+    """
+    按扩展名打开输出：.parquet / .arrow 为列式，其余交给 json_stream
+    """
+    if path.endswith(('.parquet', '.arrow')):
+        return ArrowRecordWriter(path)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return open_writer(path)
+
+
+def export(input_files, outputs, quiet=False, length_options=None):
+    """
+    outputs 为 [(模板名, 输出路径)]；只读一遍输入，同时写出全部输出，返回 {输出路径: 条数}；
+    length_options 传给长度处理：tokenizer_path、workers、max_tokens、truncate、pack、window
+    """
+    for template, _ in outputs:
+        if template not in TEMPLATES:
+            raise ValueError(f'未知的模板：{template}，可选：{", ".join(TEMPLATES)}')
+    if isinstance(input_files, str):
+        input_files = [input_files]
+    options = dict(length_options or {})
+    window = options.pop('window', WINDOW)
+    counter = None
+    sinks = []
+    try:
+        if length_options is not None:
+            counter = TokenCounter(options.pop('tokenizer_path', None), options.pop('workers', None))
+        for template, path in outputs:
+            stage = LengthStage(counter, **options) if counter is not None else None
+            sinks.append((template, path, open_sink(path), stage, []))
+
+        def flush(writer, stage, buffer):
+            for record in stage.process(buffer):
+                writer.write(record)
+            buffer.clear()
+
+        for input_file in input_files:
+            for item in iter_corpus(input_file):
+                skipped = False
+                for template, path, writer, stage, buffer in sinks:
+                    record = apply_template(item, template)
+                    if record is None:
+                        skipped = True
+                    elif stage is None:
+                        writer.write(record)
+                    else:
+                        buffer.append(record)
+                        if len(buffer) >= window:
+                            flush(writer, stage, buffer)
+                if skipped and not quiet:
+                    print(f"数据项缺少必要的字段，已跳过：{item.get('function_name', '未知函数')}")
+        for _, _, writer, stage, buffer in sinks:
+            if buffer:
+                flush(writer, stage, buffer)
+    except BaseException:
+        for _, _, writer, _, _ in sinks:
+            if hasattr(writer, 'abort'):
+                writer.abort()
+            else:
+                writer.close()
+        raise
+    finally:
+        if counter is not None:
+            counter.close()
+    counts = {}
+    for _, path, writer, stage, _ in sinks:
+        writer.close()
+        counts[path] = writer.count
+        if stage is not None:
+            stage.report(path)
+    return counts
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='导出训练数据')
+    parser.add_argument('inputs', nargs='+', help='函数对文件，.json 或 .jsonl（可带 .gz / .zst），或语料（.sqlite / .parquet）')
+    parser.add_argument('-o', '--output', action='append', required=True, metavar='模板=路径',
+                        help=f'输出，可重复指定；模板：{", ".join(TEMPLATES)}；路径扩展名决定格式和压缩')
+    parser.add_argument('--quiet', action='store_true', help='不打印跳过的数据项')
+    parser.add_argument('--tokenizer', default=None, help='本地 tokenizer.json，默认按标识符和标点粗略计数')
+    parser.add_argument('--max-tokens', type=int, default=None, help='样本的最大词元数，超长的样本默认丢弃')
+    parser.add_argument('--truncate', action='store_true', help='超长的样本截断输入而不是丢弃，目标完整保留')
+    parser.add_argument('--pack', action='store_true', help='把短样本装箱拼成不超过 --max-tokens 的序列')
+    parser.add_argument('--workers', type=int, default=None, help='计数的进程数，默认为 CPU 核数，0 表示不用多进程')
+    parser.add_argument('--stats', action='store_true', help='不过滤，只统计长度直方图')
+    args = parser.parse_args()
+    if (args.truncate or args.pack) and not args.max_tokens:
+        print('--truncate 和 --pack 需要指定 --max-tokens')
+        sys.exit(1)
+    if args.tokenizer and not TOKENIZERS_AVAILABLE:
+        print('按分词器计数需要安装 tokenizers')
+        sys.exit(1)
+    outputs = []
+    for entry in args.output:
+        template, _, path = entry.partition('=')
+        if template not in TEMPLATES or not path:
+            print(f'输出格式错误：{entry}，应为 模板=路径，模板：{", ".join(TEMPLATES)}')
+            sys.exit(1)
+        if path.endswith(('.parquet', '.arrow')) and not PYARROW_AVAILABLE:
+            print('输出 Parquet / Arrow 需要安装 pyarrow')
+            sys.exit(1)
+        if path.endswith('.zst') and not ZSTD_AVAILABLE:
+            print('zstd 压缩需要安装 zstandard')
+            sys.exit(1)
+        outputs.append((template, path))
+    length_options = None
+    if args.max_tokens or args.tokenizer or args.stats:
+        length_options = {'tokenizer_path': args.tokenizer, 'workers': args.workers, 'max_tokens': args.max_tokens,
+                          'truncate': args.truncate, 'pack': args.pack}
+    for path, count in export(args.inputs, outputs, args.quiet, length_options).items():
+        print(f"数据转换完成，结果保存在 {path}，共转换了 {count} 条数据。")
@@ -0,0 +1,223 @@
+import os
+import re
+import multiprocessing
+from bisect import bisect_left
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import tokenizers  # 按模型的分词器计数时才需要；只从本地 tokenizer.json 加载，不访问网络
+    TOKENIZERS_AVAILABLE = True
+except ImportError:
+    TOKENIZERS_AVAILABLE = False
+
+# 导出训练样本前的长度处理：按词元数过滤或截断超长样本，可选地把短样本装箱拼成一条序列，减少训练时的填充。
+#   计数   有 tokenizer.json 时用 tokenizers 批量编码，否则按标识符、数字和单个标点粗略切分；分块在进程池中并行
+#   超长   默认丢弃；truncate 时目标字段（output、test_code、assistant 消息）完整保留，只从输入字段的末尾截断，
+#          目标本身放不下或输入会被截空时仍然丢弃，不产生目标为空或残缺的训练样本
+#   装箱   首次适应递减（FFD）：按长度从大到小，每个样本放进第一个放得下的箱子；在 WINDOW 条样本的窗口内进行，内存有界
+#   报告   按 2 的幂分桶的长度直方图，以及填充到上限时的有效词元占比
+
+TOKEN_PATTERN = re.compile(r'\w+|[^\w\s]')
+TARGET_FIELDS = ('output', 'test_code')
+TARGET_ROLES = ('assistant',)
+CHUNK_SIZE = 256
+WINDOW = 10000
+HISTOGRAM_BUCKETS = (32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+# 工作进程中的分词器，由 _init_worker 加载
+_tokenizer = None
+
+
+def load_tokenizer(path):
+    """
+    从本地文件加载分词器；path 为 None 时返回 None，使用粗略切分
+    """
+    if path is None:
+        return None
+    if not TOKENIZERS_AVAILABLE:
+        raise ImportError('按分词器计数需要安装 tokenizers')
+    return tokenizers.Tokenizer.from_file(path)
+
+
+def _init_worker(path):
+    global _tokenizer
+    _tokenizer = load_tokenizer(path)
+
+
+def _count_chunk(texts, tokenizer=None):
+    tokenizer = tokenizer or _tokenizer
+    if tokenizer is None:
+        return [len(TOKEN_PATTERN.findall(text)) for text in texts]
+    return [len(encoding.ids) for encoding in tokenizer.encode_batch(texts, add_special_tokens=False)]
+
+
+class TokenCounter:
+    """
+    批量计数；workers 为 0 或只有一个 CPU 时在当前进程中计数，否则分块交给进程池
+    """
+
+    def __init__(self, tokenizer_path=None, workers=None):
+        self.tokenizer_path = tokenizer_path
+        self.tokenizer = load_tokenizer(tokenizer_path)
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.executor = None
+
+    def count(self, texts):
+        chunks = [texts[start:start + CHUNK_SIZE] for start in range(0, len(texts), CHUNK_SIZE)]
+        if self.workers <= 1 or len(chunks) <= 1:
+            return [count for chunk in chunks for count in _count_chunk(chunk, self.tokenizer)]
+        if self.executor is None:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                                initializer=_init_worker, initargs=(self.tokenizer_path,))
+        return [count for counts in self.executor.map(_count_chunk, chunks) for count in counts]
+
+    def offsets(self, text):
+        """
+        每个词元在 text 中的字符区间 [(起, 止)]
+        """
+        if self.tokenizer is None:
+            return [match.span() for match in TOKEN_PATTERN.finditer(text)]
+        return self.tokenizer.encode(text, add_special_tokens=False).offsets
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+
+def text_slots(record):
+    """
+    记录中参与计数的文本位置 [(容器, 键)]：顶层的字符串字段，以及 messages 中每条消息的 content
+    """
+    slots = []
+    for key, value in record.items():
+        if isinstance(value, str):
+            slots.append((record, key))
+        elif key == 'messages' and isinstance(value, list):
+            slots.extend((message, 'content') for message in value if isinstance(message.get('content'), str))
+    return slots
+
+
+def is_target(record, container, key):
+    """
+    文本位置是否属于训练目标：顶层的 output / test_code 字段，或 assistant 消息的内容
+    """
+    if container is record:
+        return key in TARGET_FIELDS
+    return container.get('role') in TARGET_ROLES
+
+
+def truncate_record(record, limit, counter):
+    """
+    截断到最多 limit 个词元，返回 (新记录, 词元数)；目标字段完整保留，输入字段前面的优先保留，超出部分从后面删去。
+    没有可识别的目标字段时把最后一个文本字段当作目标；目标放不下或某个输入字段会被截空时返回 None，由调用方丢弃
+    """
+    record = dict(record)
+    if isinstance(record.get('messages'), list):
+        record['messages'] = [dict(message) for message in record['messages']]
+    slots = text_slots(record)
+    targets = [is_target(record, container, key) for container, key in slots]
+    if slots and not any(targets):
+        targets[-1] = True
+    target_tokens = sum(len(counter.offsets(container[key]))
+                        for (container, key), target in zip(slots, targets) if target)
+    remaining = limit - target_tokens
+    if remaining < 0:
+        return None
+    total = target_tokens
+    for (container, key), target in zip(slots, targets):
+        if target or not container[key]:
+            continue
+        offsets = counter.offsets(container[key])
+        if len(offsets) > remaining:
+            if not remaining:
+                return None
+            container[key] = container[key][:offsets[remaining - 1][1]]
+            offsets = offsets[:remaining]
+        remaining -= len(offsets)
+        total += len(offsets)
+    return record, total
+
+
+def pack_ffd(items, capacity):
+    """
+    首次适应递减装箱：items 为 [(长度, 记录)]，返回箱子列表，每个箱子是 [(长度, 记录)]；长度相同时保持输入顺序
+    """
+    bins = []
+    remaining = []
+    for length, record in sorted(items, key=lambda item: -item[0]):
+        for index, free in enumerate(remaining):
+            if length <= free:
+                bins[index].append((length, record))
+                remaining[index] -= length
+                break
+        else:
+            bins.append([(length, record)])
+            remaining.append(capacity - length)
+    return bins
+
+
+def bucket_label(index):
+    if index < len(HISTOGRAM_BUCKETS):
+        return f'≤{HISTOGRAM_BUCKETS[index]}'
+    return f'>{HISTOGRAM_BUCKETS[-1]}'
+
+
+class LengthStage:
+    """
+    一个输出的长度处理：process(一窗口的记录) 产出过滤、截断或装箱后的记录，同时累计统计
+    """
+
+    def __init__(self, counter, max_tokens=None, truncate=False, pack=False):
+        if (truncate or pack) and not max_tokens:
+            raise ValueError('截断和装箱需要指定 max_tokens')
+        self.counter = counter
+        self.max_tokens = max_tokens
+        self.truncate = truncate
+        self.pack = pack
+        self.histogram = Counter()
+        self.kept = self.dropped = self.truncated = 0
+        self.sequences = self.tokens = 0
+
+    def process(self, records):
+        slots = [text_slots(record) for record in records]
+        counts = iter(self.counter.count([container[key] for record_slots in slots for container, key in record_slots]))
+        kept = []
+        for record, record_slots in zip(records, slots):
+            length = sum(next(counts) for _ in record_slots)
+            self.histogram[bisect_left(HISTOGRAM_BUCKETS, length)] += 1
+            if self.max_tokens and length > self.max_tokens:
+                if not self.truncate:
+                    self.dropped += 1
+                    continue
+                truncated = truncate_record(record, self.max_tokens, self.counter)
+                if truncated is None:
+                    self.dropped += 1
+                    continue
+                record, length = truncated
+                self.truncated += 1
+            kept.append((length, record))
+            self.kept += 1
+            self.tokens += length
+        if not self.pack:
+            self.sequences += len(kept)
+            for _, record in kept:
+                yield record
+            return
+        for packed in pack_ffd(kept, self.max_tokens):
+            self.sequences += 1
+            yield {'samples': [record for _, record in packed], 'num_tokens': sum(length for length, _ in packed)}
+
+    def report(self, name):
+        total = sum(self.histogram.values())
+        print(f'{name}：{total} 条样本，保留 {self.kept}，截断 {self.truncated}，丢弃 {self.dropped}，'
+              f'输出 {self.sequences} 条序列')
+        for index in sorted(self.histogram):
+            count = self.histogram[index]
+            print(f'  {bucket_label(index):>8} {count:>8} {count / total:6.1%} {"#" * round(40 * count / total)}')
+        if self.max_tokens and self.sequences:
+            # 每条序列都填充到 max_tokens 时，真实词元所占的比例
+            print(f'  填充到 {self.max_tokens} 个词元时的有效占比：{self.tokens / (self.sequences * self.max_tokens):.1%}')
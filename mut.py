@@ -2,204 +2,726 @@ import ast
 import inspect
 import astor
 import copy
+import random
+import itertools
+from collections import deque, namedtuple
+from dataset.function_index import line_offsets
 
-# 为每个节点分配唯一的 ID
-def assign_node_ids(tree):
-    node_id = 0
-    for node in ast.walk(tree):
-        node.node_id = node_id
-        node_id += 1
-
-# 在 AST 中根据节点 ID 查找节点
-def find_node_by_id(tree, node_id):
-    for node in ast.walk(tree):
-        if getattr(node, 'node_id', None) == node_id:
-            return node
+# 变异补丁：path 为从根节点到被替换节点的路径，每一步是 (字段名, 列表下标)，非列表字段的下标为 None；
+# replacement 为替换后的节点；operator 为产生补丁的变异算子名。补丁只记录差异，需要源码时再生成，不复制整棵树
+Mutation = namedtuple('Mutation', ['path', 'replacement', 'operator'], defaults=(None,))
+
+# 按 ast.walk 的广度优先顺序遍历，同时给出每个节点的路径
+def iter_nodes_with_paths(tree):
+    queue = deque([(tree, ())])
+    while queue:
+        node, path = queue.popleft()
+        yield node, path
+        for field, value in ast.iter_fields(node):
+            if isinstance(value, list):
+                for index, item in enumerate(value):
+                    if isinstance(item, ast.AST):
+                        queue.append((item, path + ((field, index),)))
+            elif isinstance(value, ast.AST):
+                queue.append((value, path + ((field, None),)))
+
+# 沿路径找到节点
+def resolve_path(tree, path):
+    node = tree
+    for field, index in path:
+        node = getattr(node, field) if index is None else getattr(node, field)[index]
+    return node
+
+# 原地应用补丁，返回被替换下来的原节点；根节点无法原地替换，由调用方处理
+def apply_mutation(tree, mutation):
+    *parent_path, (field, index) = mutation.path
+    parent = resolve_path(tree, parent_path)
+    if index is None:
+        original = getattr(parent, field)
+        setattr(parent, field, mutation.replacement)
+    else:
+        original = getattr(parent, field)[index]
+        getattr(parent, field)[index] = mutation.replacement
+    return original
+
+# 撤销 apply_mutation，放回原节点
+def revert_mutation(tree, mutation, original):
+    *parent_path, (field, index) = mutation.path
+    parent = resolve_path(tree, parent_path)
+    if index is None:
+        setattr(parent, field, original)
+    else:
+        getattr(parent, field)[index] = original
+
+# 只复制根节点到目标节点路径上的节点，其余子树与原树共享，得到一棵独立的变异树
+def copy_with_mutation(tree, mutation):
+    if not mutation.path:
+        return mutation.replacement
+    root = copy.copy(tree)
+    node = root
+    for position, (field, index) in enumerate(mutation.path):
+        last = position == len(mutation.path) - 1
+        if index is None:
+            child = mutation.replacement if last else copy.copy(getattr(node, field))
+            setattr(node, field, child)
+        else:
+            children = list(getattr(node, field))
+            children[index] = mutation.replacement if last else copy.copy(children[index])
+            setattr(node, field, children)
+            child = children[index]
+        node = child
+    return root
+
+# 高阶变异：把多个互不重叠的一阶补丁组合成一个变异体。一个补丁的路径是另一个的前缀（或两者相同）时视为重叠，不能同时应用
+HIGHER_ORDER_STRATEGIES = ('random', 'closest', 'different_operator')
+DEFAULT_HIGHER_ORDER_LIMIT = 1000
+# random 策略连续这么多次抽到重复或重叠的组合时停止，保证可组合的补丁很少时也能结束
+RANDOM_MAX_MISSES = 1000
+# closest、different_operator 策略连续这么多个组合都有重叠时停止，补丁几乎两两重叠时不会扫描全部组合
+HIGHER_ORDER_MAX_MISSES = 10000
+
+def mutations_overlap(first, second):
+    a, b = sorted((first.path, second.path), key=len)
+    return b[:len(a)] == a
+
+# 依次做路径复制，得到同时应用多个互不重叠补丁的独立变异树
+def copy_with_mutations(tree, mutations):
+    for mutation in mutations:
+        tree = copy_with_mutation(tree, mutation)
+    return tree
+
+# 补丁在源码中的位置 (行号, 列号)，节点本身没有位置信息时取最近的祖先；用于按距离组合补丁
+def mutation_position(tree, mutation):
+    for depth in range(len(mutation.path), -1, -1):
+        node = resolve_path(tree, mutation.path[:depth])
+        if getattr(node, 'lineno', None) is not None:
+            return node.lineno, node.col_offset
+    return 0, 0
+
+# 补丁所替换节点在源码中的行号范围 (起始行, 结束行)；节点本身没有行号（如运算符）时取最近的有行号的祖先。
+# 根节点以及函数体之外的节点（装饰器、参数默认值、返回注解）在定义函数时就会执行，返回 None 表示总是被覆盖
+def mutation_lines(tree, mutation):
+    if not mutation.path or mutation.path[0][0] != 'body':
+        return None
+    for depth in range(len(mutation.path), 0, -1):
+        node = resolve_path(tree, mutation.path[:depth])
+        if getattr(node, 'lineno', None) is not None:
+            return node.lineno, node.end_lineno or node.lineno
     return None
 
+# 变异体模式（mutant schemata）：把函数的所有变异点改写成按全局变量 __mut_id__ 选择的分支，
+# 如 a + b 改写为 (a - b) if __mut_id__ == 7 else (a + b)；整个函数只编译一次，切换整数即可运行任一变异体
+SCHEMA_SELECTOR = '__mut_id__'
+TRY_TYPES = (ast.Try, ast.TryStar) if hasattr(ast, 'TryStar') else (ast.Try,)
+
+# 补丁能否放进变异体模式：只支持函数体内、整段替换表达式或语句列表中语句的补丁。
+# 函数体外的节点（参数默认值、装饰器）在定义时求值，切换整数不起作用；赋值目标、f-string 内部的表达式不能改写成条件表达式
+def schema_supported(tree, mutation):
+    if not mutation.path or mutation.path[0][0] != 'body' or not block_complete(mutation.replacement):
+        return False
+    original = resolve_path(tree, mutation.path)
+    parent = resolve_path(tree, mutation.path[:-1])
+    if isinstance(original, ast.expr):
+        return isinstance(mutation.replacement, ast.expr) \
+            and isinstance(getattr(original, 'ctx', ast.Load()), ast.Load) \
+            and not isinstance(parent, (ast.JoinedStr, ast.FormattedValue, ast.pattern))
+    if isinstance(original, ast.stmt):
+        return isinstance(mutation.replacement, ast.stmt) and mutation.path[-1][1] is not None
+    return False
+
+# 删掉子句后留下不完整语句块的补丁无法编译，不放进模式：try 没有 except 时必须有 finally 且不能有 else，except 体不能为空
+def block_complete(node):
+    if isinstance(node, TRY_TYPES):
+        return bool(node.body) and (bool(node.handlers) or (bool(node.finalbody) and not node.orelse))
+    if isinstance(node, ast.ExceptHandler):
+        return bool(node.body)
+    return True
+
+# 生成变异体模式的函数定义，mutations 为 [(变异体编号, 补丁)]；返回 (新的函数定义, 放进模式的编号列表)。
+# 只重建根到变异点路径上的节点，其余子树与原树共享；同一位置的多个补丁依次嵌套
+def build_schema(tree, mutations, selector=SCHEMA_SELECTOR):
+    sites = {}
+    for mutant_id, mutation in mutations:
+        if schema_supported(tree, mutation):
+            sites.setdefault(mutation.path, []).append((mutant_id, mutation.replacement))
+    prefixes = {path[:depth] for path in sites for depth in range(len(path) + 1)}
+
+    def selected(mutant_id, location):
+        test = ast.Compare(left=ast.Name(id=selector, ctx=ast.Load()), ops=[ast.Eq()],
+                           comparators=[ast.Constant(value=mutant_id)])
+        return ast.copy_location(test, location)
+
+    def build(node, path):
+        if path not in prefixes:
+            return node
+        new_node = copy.copy(node)
+        for field, value in ast.iter_fields(node):
+            if isinstance(value, list):
+                setattr(new_node, field, [build(item, path + ((field, index),)) if isinstance(item, ast.AST) else item
+                                          for index, item in enumerate(value)])
+            elif isinstance(value, ast.AST):
+                setattr(new_node, field, build(value, path + ((field, None),)))
+        for mutant_id, replacement in sites.get(path, ()):
+            # 被替换节点的子节点在 replacement 中保持原样：选中某个变异体时其余分支都走原代码
+            if isinstance(node, ast.expr):
+                new_node = ast.IfExp(test=selected(mutant_id, node), body=replacement, orelse=new_node)
+            else:
+                new_node = ast.If(test=selected(mutant_id, node), body=[replacement], orelse=[new_node])
+            ast.copy_location(new_node, node)
+        return new_node
+
+    schema = ast.fix_missing_locations(build(tree, ()))
+    return schema, [mutant_id for entries in sites.values() for mutant_id, _ in entries]
+
+# 模式转成源代码并检查能否编译，不能时返回 None
+def compile_schema(schema):
+    try:
+        code = ast.unparse(schema)
+        compile(code, '<schema>', 'exec')
+    except (SyntaxError, ValueError, RecursionError):
+        return None
+    return code
+
+# 函数定义节点转成源代码
+def to_source(node):
+    return astor.to_source(ast.Module(body=[node], type_ignores=[]))
+
+# 表达式优先级，数值越大结合越紧，顺序与 ast.unparse 内部使用的一致
+PRECEDENCE_NAMED_EXPR, PRECEDENCE_TUPLE, PRECEDENCE_YIELD, PRECEDENCE_TEST = 0, 1, 2, 3
+PRECEDENCE_OR, PRECEDENCE_AND, PRECEDENCE_NOT, PRECEDENCE_CMP, PRECEDENCE_EXPR = 4, 5, 6, 7, 8
+PRECEDENCE_FACTOR, PRECEDENCE_POWER, PRECEDENCE_AWAIT, PRECEDENCE_ATOM = 15, 16, 17, 18
+BINOP_PRECEDENCE = {
+    ast.BitOr: 9, ast.BitXor: 10, ast.BitAnd: 11, ast.LShift: 12, ast.RShift: 12,
+    ast.Add: 13, ast.Sub: 13, ast.Mult: 14, ast.MatMult: 14, ast.Div: 14, ast.FloorDiv: 14, ast.Mod: 14,
+    ast.Pow: PRECEDENCE_POWER
+}
+
+def expression_precedence(node):
+    if isinstance(node, ast.NamedExpr):
+        return PRECEDENCE_NAMED_EXPR
+    if isinstance(node, ast.Tuple):
+        return PRECEDENCE_TUPLE
+    if isinstance(node, (ast.Yield, ast.YieldFrom)):
+        return PRECEDENCE_YIELD
+    if isinstance(node, (ast.Lambda, ast.IfExp)):
+        return PRECEDENCE_TEST
+    if isinstance(node, ast.BoolOp):
+        return PRECEDENCE_OR if isinstance(node.op, ast.Or) else PRECEDENCE_AND
+    if isinstance(node, ast.UnaryOp):
+        return PRECEDENCE_NOT if isinstance(node.op, ast.Not) else PRECEDENCE_FACTOR
+    if isinstance(node, ast.Compare):
+        return PRECEDENCE_CMP
+    if isinstance(node, ast.Starred):
+        return PRECEDENCE_EXPR
+    if isinstance(node, ast.BinOp):
+        return BINOP_PRECEDENCE[type(node.op)]
+    if isinstance(node, ast.Await):
+        return PRECEDENCE_AWAIT
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool) \
+            and node.value < 0:
+        # 负数常量输出为 -1，相当于一元负号
+        return PRECEDENCE_FACTOR
+    return PRECEDENCE_ATOM
+
+# 按源码位置拼接变异体：只输出被替换的子节点，拼回原源码，
+# 除变异片段外与原文逐字节一致（保留注释和格式），单个变异体的代价与片段长度成正比
+class SourcePatcher:
+    def __init__(self, source, tree):
+        self.source_bytes = source.encode('utf-8') if isinstance(source, str) else source
+        self.offsets = line_offsets(self.source_bytes)
+        self.tree = tree
+
+    def span(self, node):
+        start = self.offsets[node.lineno - 1] + node.col_offset
+        end = self.offsets[node.end_lineno - 1] + node.end_col_offset
+        decorators = getattr(node, 'decorator_list', None)
+        if decorators:
+            # 装饰器不在函数定义的区间内，向前扩展到第一个装饰器的 @
+            first = decorators[0]
+            line_start = self.offsets[first.lineno - 1]
+            start = self.source_bytes.rfind(b'@', line_start, line_start + first.col_offset)
+        return start, end
+
+    def _original_node(self, path):
+        # 沿路径找到原节点；f-string 内部节点的位置信息不可靠，返回 None
+        node = self.tree
+        for field, index in path:
+            if isinstance(node, (ast.JoinedStr, ast.FormattedValue)):
+                return None
+            node = getattr(node, field) if index is None else getattr(node, field)[index]
+        return node
+
+    def patch(self, mutation):
+        """
+        返回 (起始字节, 结束字节, 替换文本)；无法安全拼接时返回 None
+        """
+        if not mutation.path:
+            return None
+        node = self._original_node(mutation.path)
+        if node is None or getattr(node, 'end_col_offset', None) is None:
+            return None
+        replacement = mutation.replacement
+        start, end = self.span(node)
+        if isinstance(node, ast.If) and self.source_bytes.startswith(b'elif', start):
+            # elif 分支在语法树中是 orelse 里的 If，文本上不能单独替换
+            return None
+        text = ast.unparse(replacement)
+        if isinstance(node, ast.expr):
+            if not isinstance(replacement, ast.expr):
+                return None
+            # 原来的括号在区间外会保留；替换后结合更松时才需要补括号
+            if expression_precedence(replacement) < expression_precedence(node):
+                text = f'({text})'
+        elif '\n' in text:
+            # 多行语句：后续行按原语句所在列缩进；原语句前有其他代码（如 if x: y）或含多行字符串时不拼接
+            line_start = self.source_bytes.rfind(b'\n', 0, start) + 1
+            prefix = self.source_bytes[line_start:start]
+            if prefix.strip() or '"""' in text or "'''" in text:
+                return None
+            text = text.replace('\n', '\n' + prefix.decode('utf-8'))
+        return start, end, text.encode('utf-8')
+
+    def render(self, mutation):
+        """
+        返回拼接后的源码；无法安全拼接时返回 None，由调用方退回整树输出
+        """
+        return self.render_many([mutation])
+
+    def render_many(self, mutations):
+        """
+        同时拼接多个互不重叠的补丁（高阶变异体）；任一补丁无法拼接或区间重叠时返回 None
+        """
+        patches = []
+        for mutation in mutations:
+            patch = self.patch(mutation)
+            if patch is None:
+                return None
+            patches.append(patch)
+        patches.sort()
+        for (_, previous_end, _), (start, _, _) in zip(patches, patches[1:]):
+            if start < previous_end:
+                return None
+        result = self.source_bytes
+        for start, end, text in reversed(patches):
+            result = result[:start] + text + result[end:]
+        return result.decode('utf-8')
+
+# 变异算子注册表：节点类型 -> [(算子名, 生成函数)]，同一节点类型上的算子按注册顺序执行。
+# 生成函数接收原节点，依次产出替换节点；替换节点与原节点共享子节点，不能原地修改
+OPERATORS_BY_NODE = {}
+OPERATOR_NAMES = []
+
+def register_operator(name, *node_types):
+    def decorator(function):
+        for node_type in node_types:
+            OPERATORS_BY_NODE.setdefault(node_type, []).append((name, function))
+        if name not in OPERATOR_NAMES:
+            OPERATOR_NAMES.append(name)
+        return function
+    return decorator
+
+# 运算符节点没有位置信息，所有变异体共享同一组实例，不必每次调用都重新创建
+ARITHMETIC_OPERATORS = (ast.Add(), ast.Sub(), ast.Mult(), ast.Div(), ast.Mod(), ast.Pow(), ast.FloorDiv())
+COMPARE_OPERATORS = (ast.Eq(), ast.NotEq(), ast.Lt(), ast.LtE(), ast.Gt(), ast.GtE())
+AND, OR, NOT = ast.And(), ast.Or(), ast.Not()
+
+# 替换运算符：与原运算符类型不同的每个运算符各产生一个变异
+def _replace_operator(node, operators):
+    for op in operators:
+        if not isinstance(node.op, type(op)):
+            mutated_node = copy.copy(node)
+            mutated_node.op = op
+            yield mutated_node
+
+# AOR - 算术运算符替换
+@register_operator('AOR', ast.BinOp)
+def arithmetic_operator_replacement(node):
+    yield from _replace_operator(node, ARITHMETIC_OPERATORS)
+
+# AOD - 算术运算符删除
+@register_operator('AOD', ast.BinOp)
+def arithmetic_operator_deletion(node):
+    yield node.left
+    yield node.right
+
+# ASR - 赋值运算符替换
+@register_operator('ASR', ast.AugAssign)
+def assignment_operator_replacement(node):
+    yield from _replace_operator(node, ARITHMETIC_OPERATORS)
+
+# BCR - break continue 替换
+@register_operator('BCR', ast.Break, ast.Continue)
+def break_continue_replacement(node):
+    yield ast.Continue() if isinstance(node, ast.Break) else ast.Break()
+
+# LCR - 逻辑连接符替换
+@register_operator('LCR', ast.BoolOp)
+def logical_connector_replacement(node):
+    mutated_node = copy.copy(node)
+    mutated_node.op = OR if isinstance(node.op, ast.And) else AND
+    yield mutated_node
+
+# LOD - 逻辑运算符删除
+@register_operator('LOD', ast.BoolOp)
+def logical_operator_deletion(node):
+    yield from node.values
+
+# COI - 条件运算符插入
+@register_operator('COI', ast.If)
+def conditional_operator_insertion(node):
+    mutated_node_and = copy.copy(node)
+    mutated_node_and.test = ast.BoolOp(op=AND, values=[node.test, ast.Constant(value=True)])
+    yield mutated_node_and
+    mutated_node_or = copy.copy(node)
+    mutated_node_or.test = ast.BoolOp(op=OR, values=[node.test, ast.Constant(value=False)])
+    yield mutated_node_or
+
+# COD - 条件运算符删除（if 和 return 替换为 pass）
+@register_operator('COD', ast.If, ast.Return)
+def conditional_operator_deletion(node):
+    yield ast.Pass()
+
+# CRP - 常量替换
+@register_operator('CRP', ast.Constant)
+def constant_replacement(node):
+    if isinstance(node.value, (int, float)):
+        constants = [0, 1, -1, node.value + 1, node.value - 1]
+    elif isinstance(node.value, str):
+        constants = ['', 'mutated', node.value + '_mutated']
+    else:
+        return
+    for c in constants:
+        if node.value != c:
+            yield ast.Constant(value=c)
+
+# DDL - 装饰器删除
+@register_operator('DDL', ast.FunctionDef)
+def decorator_deletion(node):
+    if node.decorator_list:
+        mutated_node = copy.copy(node)
+        mutated_node.decorator_list = []
+        yield mutated_node
+
+# SCI - super 调用插入
+@register_operator('SCI', ast.FunctionDef)
+def super_calling_insertion(node):
+    if node.args.args and node.args.args[0].arg == 'self':
+        super_call = ast.Expr(value=ast.Call(
+            func=ast.Attribute(
+                value=ast.Call(func=ast.Name(id='super', ctx=ast.Load()), args=[], keywords=[]),
+                attr=node.name,
+                ctx=ast.Load()
+            ),
+            args=[ast.Name(id=arg.arg, ctx=ast.Load()) for arg in node.args.args[1:]],
+            keywords=[]
+        ))
+        mutated_node = copy.copy(node)
+        mutated_node.body = [super_call] + node.body
+        yield mutated_node
+
+# EHD - 异常处理器删除
+@register_operator('EHD', ast.Try)
+def exception_handler_deletion(node):
+    if node.handlers:
+        mutated_node = copy.copy(node)
+        mutated_node.handlers = []
+        yield mutated_node
+
+# EXS - 异常吞噬
+@register_operator('EXS', ast.ExceptHandler)
+def exception_swallowing(node):
+    mutated_node = copy.copy(node)
+    mutated_node.body = []
+    yield mutated_node
+
+# LOR - 逻辑运算符替换
+@register_operator('LOR', ast.UnaryOp)
+def logical_operator_replacement(node):
+    if isinstance(node.op, ast.Not):
+        yield node.operand
+    else:
+        mutated_node = copy.copy(node)
+        mutated_node.op = NOT
+        yield mutated_node
+
+# ROR - 关系运算符替换
+@register_operator('ROR', ast.Compare)
+def relational_operator_replacement(node):
+    for op in COMPARE_OPERATORS:
+        if not isinstance(node.ops[0], type(op)):
+            mutated_node = copy.copy(node)
+            mutated_node.ops = [op]
+            yield mutated_node
+
+# SCD - super 调用删除
+@register_operator('SCD', ast.Call)
+def super_calling_deletion(node):
+    if isinstance(node.func, ast.Name) and node.func.id == 'super':
+        yield ast.Constant(value=None)
+
+# SIR - 切片索引移除
+@register_operator('SIR', ast.Subscript)
+def slice_index_removal(node):
+    if isinstance(node.slice, ast.Slice):
+        mutated_node = copy.copy(node)
+        mutated_node.slice = ast.Index(value=ast.Constant(value=0))
+        yield mutated_node
+
+# ASR - 赋值替换
+@register_operator('ASR', ast.Assign)
+def assignment_replacement(node):
+    mutated_node = copy.copy(node)
+    mutated_node.value = ast.Constant(value=None)
+    yield mutated_node
+
 # 定义变异器类
 class Mutator:
-    def __init__(self):
+    """
+    operators 为启用的算子名（默认全部）；sample_rates 为 {算子名: 保留概率}；
+    budget 为每个函数最多产生的变异体数，超出时均匀抽样并保持原有顺序；seed 决定抽样结果，同一函数每次结果相同
+    """
+
+    def __init__(self, operators=None, sample_rates=None, budget=None, seed=0):
         self.mutations = []
+        unknown = (set(operators or ()) | set(sample_rates or {})) - set(OPERATOR_NAMES)
+        if unknown:
+            raise ValueError(f"未知的变异算子：{', '.join(sorted(unknown))}")
+        self.enabled = set(OPERATOR_NAMES if operators is None else operators)
+        self.sample_rates = dict(sample_rates or {})
+        self.budget = budget
+        self.seed = seed
+        # 按节点类型预先筛好启用的算子，遍历时只做一次字典查找
+        self.dispatch = {node_type: [(name, generate) for name, generate in entries if name in self.enabled]
+                         for node_type, entries in OPERATORS_BY_NODE.items()}
+
+    def iter_operator_mutations(self, node):
+        # 产出 (算子名, 替换节点)
+        for name, generate in self.dispatch.get(type(node), ()):
+            for replacement in generate(node):
+                yield name, replacement
+
+    def _random(self, tree):
+        # 每个函数单独播种，结果与处理顺序、并行方式无关
+        return random.Random(f"{self.seed}:{getattr(tree, 'name', '')}:{getattr(tree, 'lineno', 0)}")
+
+    def iter_mutations(self, tree):
+        # 一次遍历产出所有补丁，不复制树；设置了抽样率或预算时按 seed 抽样
+        for _, mutation in self.iter_indexed_mutations(tree):
+            yield mutation
+
+    def iter_indexed_mutations(self, tree):
+        # 产出 (编号, 补丁)；编号是不抽样时补丁的顺序号，抽样只会去掉一部分补丁，不会给留下的重新编号
+        rng = self._random(tree) if self.sample_rates or self.budget is not None else None
+        mutations = self._iter_sampled(tree, rng)
+        if self.budget is None:
+            yield from mutations
+            return
+        # 蓄水池抽样：内存只占 budget 个补丁，最后按原顺序输出
+        reservoir = []
+        for count, item in enumerate(mutations):
+            if count < self.budget:
+                reservoir.append(item)
+            else:
+                slot = rng.randrange(count + 1)
+                if slot < self.budget:
+                    reservoir[slot] = item
+        reservoir.sort(key=lambda item: item[0])
+        yield from reservoir
+
+    def _iter_sampled(self, tree, rng):
+        index = 0
+        for node, path in iter_nodes_with_paths(tree):
+            for name, replacement in self.iter_operator_mutations(node):
+                index += 1
+                rate = self.sample_rates.get(name, 1.0)
+                if rate < 1.0 and rng.random() >= rate:
+                    continue
+                yield index - 1, Mutation(path, replacement, name)
 
     def mutate(self, tree):
-        assign_node_ids(tree)
-        for node in ast.walk(tree):
-            original_node_id = node.node_id
-            mutations = self.generate_mutations(node)
-            for mutated_node in mutations:
-                mutated_tree = copy.deepcopy(tree)
-                # 在深拷贝的树中找到对应的节点
-                target_node = find_node_by_id(mutated_tree, original_node_id)
-                if target_node is not None:
-                    # 替换节点
-                    self.replace_node(mutated_tree, target_node, mutated_node)
-                    self.mutations.append(mutated_tree)
+        # 兼容原接口：返回变异后的树，各树之间共享未修改的子树，使用时不要原地修改
+        for mutation in self.iter_mutations(tree):
+            self.mutations.append(copy_with_mutation(tree, mutation))
         return self.mutations
 
-    def replace_node(self, tree, target_node, new_node):
-        class Replacer(ast.NodeTransformer):
-            def visit(self, node):
-                if node is target_node:
-                    return new_node
-                else:
-                    return self.generic_visit(node)
-        replacer = Replacer()
-        replacer.visit(tree)
+    def mutant_source(self, tree, mutation):
+        # 原地应用补丁、生成源码后立即还原，整个过程不产生树的副本
+        if not mutation.path:
+            return to_source(mutation.replacement)
+        original = apply_mutation(tree, mutation)
+        try:
+            return to_source(tree)
+        finally:
+            revert_mutation(tree, mutation, original)
 
-    def generate_mutations(self, node):
-        mutations = []
-        if isinstance(node, ast.BinOp):
-            # AOR - 算术运算符替换
-            operators = [ast.Add(), ast.Sub(), ast.Mult(), ast.Div(), ast.Mod(), ast.Pow(), ast.FloorDiv()]
-            for op in operators:
-                if not isinstance(node.op, type(op)):
-                    mutated_node = copy.deepcopy(node)
-                    mutated_node.op = op
-                    mutations.append(mutated_node)
-            # AOD - 算术运算符删除
-            mutations.append(node.left)
-            mutations.append(node.right)
-        elif isinstance(node, ast.AugAssign):
-            # ASR - 赋值运算符替换
-            operators = [ast.Add(), ast.Sub(), ast.Mult(), ast.Div(), ast.Mod(), ast.Pow(), ast.FloorDiv()]
-            for op in operators:
-                if not isinstance(node.op, type(op)):
-                    mutated_node = copy.deepcopy(node)
-                    mutated_node.op = op
-                    mutations.append(mutated_node)
-        elif isinstance(node, ast.Break):
-            # BCR - break continue 替换
-            mutations.append(ast.Continue())
-        elif isinstance(node, ast.Continue):
-            mutations.append(ast.Break())
-        elif isinstance(node, ast.BoolOp):
-            # LCR - 逻辑连接符替换
-            if isinstance(node.op, ast.And):
-                mutated_node = copy.deepcopy(node)
-                mutated_node.op = ast.Or()
-                mutations.append(mutated_node)
-            elif isinstance(node.op, ast.Or):
-                mutated_node = copy.deepcopy(node)
-                mutated_node.op = ast.And()
-                mutations.append(mutated_node)
-            # LOD - 逻辑运算符删除
-            for value in node.values:
-                mutations.append(value)
-        elif isinstance(node, ast.If):
-            # COI - 条件运算符插入
-            mutated_node_and = copy.deepcopy(node)
-            mutated_node_and.test = ast.BoolOp(op=ast.And(), values=[node.test, ast.Constant(value=True)])
-            mutations.append(mutated_node_and)
-            mutated_node_or = copy.deepcopy(node)
-            mutated_node_or.test = ast.BoolOp(op=ast.Or(), values=[node.test, ast.Constant(value=False)])
-            mutations.append(mutated_node_or)
-            # COD - 条件运算符删除
-            mutations.append(ast.Pass())
-        elif isinstance(node, ast.Constant):
-            # CRP - 常量替换
-            if isinstance(node.value, (int, float)):
-                constants = [0, 1, -1, node.value + 1, node.value - 1]
-                for c in constants:
-                    if node.value != c:
-                        mutations.append(ast.Constant(value=c))
-            elif isinstance(node.value, str):
-                constants = ['', 'mutated', node.value + '_mutated']
-                for c in constants:
-                    if node.value != c:
-                        mutations.append(ast.Constant(value=c))
-        elif isinstance(node, ast.FunctionDef):
-            # DDL - 装饰器删除
-            if node.decorator_list:
-                mutated_node = copy.deepcopy(node)
-                mutated_node.decorator_list = []
-                mutations.append(mutated_node)
-            # SCI - super 调用插入
-            if node.args.args and node.args.args[0].arg == 'self':
-                super_call = ast.Expr(value=ast.Call(
-                    func=ast.Attribute(
-                        value=ast.Call(func=ast.Name(id='super', ctx=ast.Load()), args=[], keywords=[]),
-                        attr=node.name,
-                        ctx=ast.Load()
-                    ),
-                    args=[ast.Name(id=arg.arg, ctx=ast.Load()) for arg in node.args.args[1:]],
-                    keywords=[]
-                ))
-                mutated_node = copy.deepcopy(node)
-                mutated_node.body.insert(0, super_call)
-                mutations.append(mutated_node)
-        elif isinstance(node, ast.Try):
-            # EHD - 异常处理器删除
-            if node.handlers:
-                mutated_node = copy.deepcopy(node)
-                mutated_node.handlers = []
-                mutations.append(mutated_node)
-        elif isinstance(node, ast.ExceptHandler):
-            # EXS - 异常吞噬
-            mutated_node = copy.deepcopy(node)
-            mutated_node.body = []
-            mutations.append(mutated_node)
-        elif isinstance(node, ast.UnaryOp):
-            # LOR - 逻辑运算符替换
-            if isinstance(node.op, ast.Not):
-                mutations.append(node.operand)
+    def render(self, tree, mutation, patcher=None):
+        # 有 SourcePatcher 时按源码位置拼接，无法拼接的补丁退回整树输出
+        code = patcher.render(mutation) if patcher is not None else None
+        return code if code is not None else self.mutant_source(tree, mutation)
+
+    def iter_mutants(self, tree, source=None):
+        # 产出 (补丁, 源码)；先收集补丁再逐个生成源码，遍历过程中树保持不变；
+        # 提供 tree 对应的原始源码时按源码位置拼接
+        patcher = SourcePatcher(source, tree) if source is not None else None
+        for mutation in list(self.iter_mutations(tree)):
+            yield mutation, self.render(tree, mutation, patcher)
+
+    def meta_mutant(self, tree, mutations=None, selector=SCHEMA_SELECTOR):
+        """
+        变异体模式：返回 (元变异体源码, 放进模式的变异体编号列表)；
+        mutations 为 [(编号, 补丁)]，默认取 iter_indexed_mutations 的编号。模式无法编译时返回 (None, [])
+        """
+        if mutations is None:
+            mutations = list(self.iter_indexed_mutations(tree))
+        schema, mutant_ids = build_schema(tree, mutations, selector)
+        if not mutant_ids:
+            return None, []
+        code = compile_schema(schema)
+        if code is None:
+            # 个别补丁本身不合法时整个模式都无法编译：逐个检查，只去掉编译不了的补丁，它们退回逐个编译
+            mutations = [(mutant_id, mutation) for mutant_id, mutation in mutations
+                         if compile_schema(build_schema(tree, [(mutant_id, mutation)], selector)[0]) is not None]
+            schema, mutant_ids = build_schema(tree, mutations, selector)
+            code = compile_schema(schema) if mutant_ids else None
+            if code is None:
+                return None, []
+        return code, mutant_ids
+
+    def iter_mutant_sources(self, tree, source=None):
+        for _, code in self.iter_mutants(tree, source):
+            yield code
+
+    def iter_higher_order(self, tree, max_order=2, limit=DEFAULT_HIGHER_ORDER_LIMIT, strategy='random'):
+        """
+        惰性产出高阶变异（一阶补丁组成的元组），阶数为 2 到 max_order，总数不超过 limit，任何时候都不展开全部组合：
+          random              随机抽取组合，按 seed 可复现，必须指定 limit
+          closest             按源码位置排序，位置跨度小的组合优先，低阶优先
+          different_operator  组合中各补丁来自不同的算子：先选几个算子，再从每个算子的补丁中各取一个
+        """
+        if strategy not in HIGHER_ORDER_STRATEGIES:
+            raise ValueError(f'未知的高阶变异策略：{strategy}')
+        if strategy == 'random' and limit is None:
+            raise ValueError('random 策略必须指定 limit')
+        # 根节点的补丁与所有补丁都重叠，不参与组合
+        mutations = [mutation for mutation in self.iter_mutations(tree) if mutation.path]
+        orders = range(2, min(max_order, len(mutations)) + 1)
+
+        def compatible(combination):
+            return not any(mutations_overlap(mutations[i], mutations[j])
+                           for i, j in itertools.combinations(combination, 2))
+
+        if strategy == 'random':
+            combinations = self._random_combinations(tree, len(mutations), orders, compatible)
+        elif strategy == 'closest':
+            positions = sorted(range(len(mutations)), key=lambda i: mutation_position(tree, mutations[i]))
+            combinations = (tuple(sorted(positions[i] for i in combination))
+                            for combination in self._closest_combinations(len(mutations), orders))
+        else:
+            combinations = self._operator_combinations(mutations, max_order)
+        count = misses = 0
+        for combination in combinations:
+            if limit is not None and count >= limit:
+                return
+            if strategy == 'random' or compatible(combination):
+                yield tuple(mutations[i] for i in combination)
+                count += 1
+                misses = 0
             else:
-                mutated_node = copy.deepcopy(node)
-                mutated_node.op = ast.Not()
-                mutations.append(mutated_node)
-        elif isinstance(node, ast.Compare):
-            # ROR - 关系运算符替换
-            operators = [ast.Eq(), ast.NotEq(), ast.Lt(), ast.LtE(), ast.Gt(), ast.GtE()]
-            for op in operators:
-                if not isinstance(node.ops[0], type(op)):
-                    mutated_node = copy.deepcopy(node)
-                    mutated_node.ops = [op]
-                    mutations.append(mutated_node)
-        elif isinstance(node, ast.Call):
-            # SCD - super 调用删除
-            if isinstance(node.func, ast.Name) and node.func.id == 'super':
-                mutations.append(ast.Constant(value=None))
-        elif isinstance(node, ast.Subscript):
-            # SIR - 切片索引移除
-            if isinstance(node.slice, ast.Slice):
-                mutated_node = copy.deepcopy(node)
-                mutated_node.slice = ast.Index(value=ast.Constant(value=0))
-                mutations.append(mutated_node)
-        elif isinstance(node, ast.Assign):
-            # ASR - 赋值替换
-            mutated_node = copy.deepcopy(node)
-            mutated_node.value = ast.Constant(value=None)
-            mutations.append(mutated_node)
-        elif isinstance(node, ast.Return):
-            # COD - 条件运算符删除（在返回中）
-            mutations.append(ast.Pass())
-        return mutations
-
-# 生成变异函数的源代码
-def generate_mutant_codes(func):
+                misses += 1
+                if misses >= HIGHER_ORDER_MAX_MISSES:
+                    return
+
+    def _random_combinations(self, tree, size, orders, compatible):
+        # 已产出的组合只保存编号元组，数量不超过 limit
+        if not orders:
+            return
+        rng = self._random(tree)
+        seen = set()
+        misses = 0
+        while misses < RANDOM_MAX_MISSES:
+            combination = tuple(sorted(rng.sample(range(size), rng.choice(orders))))
+            if combination in seen or not compatible(combination):
+                misses += 1
+                continue
+            misses = 0
+            seen.add(combination)
+            yield combination
+
+    @staticmethod
+    def _operator_combinations(mutations, max_order):
+        # 按算子分组（组按首次出现的顺序），枚举算子的组合，再从每组中各取一个补丁；产出的组合都满足算子互不相同
+        groups = {}
+        for index, mutation in enumerate(mutations):
+            groups.setdefault(mutation.operator, []).append(index)
+        groups = list(groups.values())
+        for order in range(2, min(max_order, len(groups)) + 1):
+            for chosen in itertools.combinations(groups, order):
+                for combination in itertools.product(*chosen):
+                    yield tuple(sorted(combination))
+
+    @staticmethod
+    def _closest_combinations(size, orders):
+        # 按排序后的下标枚举：先固定首尾两个补丁的跨度，再从中间任选其余补丁，每个组合只出现一次
+        for order in orders:
+            for spread in range(order - 1, size):
+                for first in range(size - spread):
+                    last = first + spread
+                    for middle in itertools.combinations(range(first + 1, last), order - 2):
+                        yield (first,) + middle + (last,)
+
+    def higher_order_source(self, tree, mutations, patcher=None):
+        # 有 SourcePatcher 时一次拼接所有补丁；否则原地应用全部补丁、生成源码后按相反顺序还原
+        code = patcher.render_many(mutations) if patcher is not None else None
+        if code is not None:
+            return code
+        originals = [apply_mutation(tree, mutation) for mutation in mutations]
+        try:
+            return to_source(tree)
+        finally:
+            for mutation, original in reversed(list(zip(mutations, originals))):
+                revert_mutation(tree, mutation, original)
+
+    def iter_higher_order_mutants(self, tree, source=None, **options):
+        # 产出 (补丁元组, 源码)；options 与 iter_higher_order 相同
+        patcher = SourcePatcher(source, tree) if source is not None else None
+        for mutations in self.iter_higher_order(tree, **options):
+            yield mutations, self.higher_order_source(tree, mutations, patcher)
+
+    def generate_mutations(self, node):
+        # 兼容原接口：返回节点的全部变异（只含启用的算子，不抽样）
+        return [replacement for _, replacement in self.iter_operator_mutations(node)]
+
+# 生成变异函数的源代码；mode 为 'ast' 时整树用 astor 输出，为 'span' 时按源码位置拼接，保留原有注释和格式
+def generate_mutant_codes(func, mode='ast'):
     source = inspect.getsource(func)
     tree = ast.parse(source)
     func_def = tree.body[0]
 
     mutator = Mutator()
-    mutations = mutator.mutate(func_def)
+    return list(mutator.iter_mutant_sources(func_def, source if mode == 'span' else None))
+
+# 生成高阶变异函数的源代码，options 见 Mutator.iter_higher_order
+def generate_higher_order_codes(func, mode='ast', **options):
+    source = inspect.getsource(func)
+    func_def = ast.parse(source).body[0]
+    mutants = Mutator().iter_higher_order_mutants(func_def, source if mode == 'span' else None, **options)
+    return [code for _, code in mutants]
 
-    mutant_codes = []
-    for idx, mutated_tree in enumerate(mutations):
-        module = ast.Module(body=[mutated_tree], type_ignores=[])
-        ast.fix_missing_locations(module)
-        code = astor.to_source(module)
-        mutant_codes.append(code)
-    return mutant_codes
+# 生成元变异体：所有变异体编译进同一个函数，设置全局变量 __mut_id__ 为变异体编号即可切换
+def generate_meta_mutant(func):
+    source = inspect.getsource(func)
+    func_def = ast.parse(source).body[0]
+    return Mutator().meta_mutant(func_def)
 
 # 示例函数
 def pre_mutation(context):
     if context.filename == 'foo.py':
         context.skip = True
 
-# 生成变异函数代码列表
-mutated_codes = generate_mutant_codes(pre_mutation)
+if __name__ == '__main__':
+    # 生成变异函数代码列表
+    mutated_codes = generate_mutant_codes(pre_mutation)
 
-# 输出变异函数的源代码
-for i, code in enumerate(mutated_codes):
-    print(f"#变异函数 {i}:\n{code}\n#{'-'*40}")
+    # 输出变异函数的源代码
+    for i, code in enumerate(mutated_codes):
+        print(f"#变异函数 {i}:\n{code}\n#{'-'*40}")
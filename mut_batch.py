@@ -0,0 +1,277 @@
+import os
+import ast
+import sys
+import time
+import argparse
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from mut import Mutator, SourcePatcher, OPERATOR_NAMES, resolve_path
+from mut_dedup import MutantDeduplicator, mutation_operator
+from dataset.function_index import index_functions
+from dataset.json_stream import iter_records, JsonlWriter
+
+try:
+    import pyarrow  # 输出 Parquet 时才需要
+    import pyarrow.parquet
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# 批量变异：直接从源码字符串生成变异体，不需要 import 被测代码（generate_mutant_codes 依赖 inspect.getsource）。
+# 输入可以是 function_pairs.json / .jsonl（每个函数对的 function_code），也可以是 .py 文件或目录（文件中的每个函数和方法）；
+# 多进程并行变异，结果逐条流式写出为 JSONL 或 Parquet，每条记录：
+#   unit       函数对编号或文件路径
+#   function   函数的限定名
+#   mutant_id  函数内的变异体编号，与 mut_runner 中的编号一致
+#   operator   变异算子，如 AOR、CRP
+#   path       被替换节点的路径，如 body[0].test.left
+#   span       被替换节点在函数源码中的字节区间 [起, 止]，节点没有位置信息时取最近的祖先
+#   source     变异后的函数源码
+
+# 每个工作进程一次处理的单元数；窗口内最多同时提交 workers * MAX_PENDING_FACTOR 批
+BATCH_SIZE = 16
+MAX_PENDING_FACTOR = 4
+PARQUET_ROWS = 10000
+
+
+def format_path(path):
+    """
+    补丁路径转成紧凑的字符串：(('body', 0), ('test', None)) -> body[0].test
+    """
+    return '.'.join(field if index is None else f'{field}[{index}]' for field, index in path)
+
+
+def mutation_span(patcher, tree, mutation):
+    # f-string 内部节点的位置不可靠，从第一个 JoinedStr 处截断；没有位置信息的节点（如运算符）取祖先的区间
+    path = mutation.path
+    node = tree
+    for depth, (field, index) in enumerate(path):
+        if isinstance(node, ast.JoinedStr):
+            path = path[:depth]
+            break
+        node = getattr(node, field) if index is None else getattr(node, field)[index]
+    for depth in range(len(path), -1, -1):
+        node = resolve_path(tree, path[:depth])
+        if getattr(node, 'end_col_offset', None) is not None:
+            return list(patcher.span(node))
+    return None
+
+
+def mutate_function(code, mode='span', dedup=False, options=None):
+    """
+    对单个函数的源码生成全部变异体，产出 (编号, 算子, 路径, 区间, 变异体源码)；dedup 为 True 时跳过等价和重复的变异体；
+    options 传给 Mutator（operators、sample_rates、budget、seed）；编号是不抽样时的顺序号，抽样后保持不变
+    """
+    func_def = ast.parse(code).body[0]
+    mutator = Mutator(**(options or {}))
+    patcher = SourcePatcher(code, func_def)
+    deduplicator = MutantDeduplicator(func_def) if dedup else None
+    for index, mutation in list(mutator.iter_indexed_mutations(func_def)):
+        if deduplicator is not None and deduplicator.check(mutation) is not None:
+            continue
+        operator = mutation.operator or mutation_operator(resolve_path(func_def, mutation.path), mutation.replacement)
+        yield (index, operator, format_path(mutation.path),
+               mutation_span(patcher, func_def, mutation),
+               mutator.render(func_def, mutation, patcher if mode == 'span' else None))
+
+
+def unit_functions(source, function_name=None):
+    """
+    源码中要变异的函数 (限定名, 源码)：顶层函数和方法；嵌套函数已包含在外层函数的变异体中，不单独变异
+    """
+    records = index_functions(source)
+    if function_name is not None:
+        # 函数对的 function_code 就是一个函数，外层定义即是它
+        return [(function_name, records[0].code)] if records else []
+    return [(record.qualname, record.code) for record in records if '<locals>' not in record.qualname]
+
+
+def mutate_unit(unit, source, function_name=None, mode='span', dedup=False, options=None):
+    """
+    变异一个单元（函数对或源文件）中的所有函数，返回记录列表；语法错误的函数跳过
+    """
+    records = []
+    for qualname, code in unit_functions(source, function_name):
+        try:
+            mutants = list(mutate_function(code, mode, dedup, options))
+        except (SyntaxError, ValueError, RecursionError):
+            continue
+        for mutant_id, operator, path, span, mutant_source in mutants:
+            records.append({
+                'unit': unit,
+                'function': qualname,
+                'mutant_id': mutant_id,
+                'operator': operator,
+                'path': path,
+                'span': span,
+                'source': mutant_source
+            })
+    return records
+
+
+def _mutate_batch(batch, mode, dedup, options):
+    # 在工作进程中执行：一批单元的记录合并返回，减少进程间通信次数
+    records = []
+    for unit, source, function_name in batch:
+        records.extend(mutate_unit(unit, source, function_name, mode, dedup, options))
+    return records
+
+
+def iter_units(paths):
+    """
+    把输入展开成 (单元, 源码, 函数名或 None)：函数对文件按位置编号，.py 文件和目录按文件路径
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.endswith('.py'):
+                        yield from iter_units([os.path.join(root, name)])
+        elif path.endswith('.py'):
+            with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+                yield path.replace('\\', '/'), f.read(), None
+        else:
+            for pair_id, pair in enumerate(iter_records(path)):
+                yield pair_id, pair['function_code'], pair.get('function_name')
+
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def mutate_sources(units, workers=None, mode='span', dedup=False, batch_size=BATCH_SIZE, options=None):
+    """
+    并行变异 (单元, 源码, 函数名或 None) 的可迭代对象，按输入顺序逐条产出记录；
+    只读入有限个批次，输入再多内存占用也不变。workers 为 0 时在当前进程中执行
+    """
+    if workers == 0:
+        for batch in _batches(units, batch_size):
+            yield from _mutate_batch(batch, mode, dedup, options)
+        return
+    workers = workers or os.cpu_count() or 1
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        for batch in _batches(units, batch_size):
+            pending.append(executor.submit(_mutate_batch, batch, mode, dedup, options))
+            if len(pending) >= workers * MAX_PENDING_FACTOR:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+class ParquetRecordWriter:
+    """
+    分批写出 Parquet，接口与 JsonlWriter 相同；span 拆成 span_start、span_end 两列
+    """
+
+    def __init__(self, path, rows_per_group=PARQUET_ROWS):
+        if not PYARROW_AVAILABLE:
+            raise ImportError('输出 Parquet 需要安装 pyarrow')
+        self.path = path
+        self.rows_per_group = rows_per_group
+        self.schema = pyarrow.schema([
+            ('unit', pyarrow.string()),
+            ('function', pyarrow.string()),
+            ('mutant_id', pyarrow.int32()),
+            ('operator', pyarrow.string()),
+            ('path', pyarrow.string()),
+            ('span_start', pyarrow.int64()),
+            ('span_end', pyarrow.int64()),
+            ('source', pyarrow.string())
+        ])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+        self.rows = []
+        self.count = 0
+
+    def write(self, record):
+        span = record['span'] or (None, None)
+        row = {key: value for key, value in record.items() if key != 'span'}
+        self.rows.append(dict(row, unit=str(record['unit']), span_start=span[0], span_end=span[1]))
+        self.count += 1
+        if len(self.rows) >= self.rows_per_group:
+            self._flush()
+
+    def _flush(self):
+        if self.rows:
+            self.writer.write_table(pyarrow.Table.from_pylist(self.rows, schema=self.schema))
+            self.rows = []
+
+    def close(self):
+        self._flush()
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def open_record_writer(path):
+    if path.endswith('.parquet'):
+        return ParquetRecordWriter(path)
+    return JsonlWriter(path)
+
+
+def run_batch(paths, output_path, workers=None, mode='span', dedup=False, options=None):
+    """
+    变异输入中的所有函数并写出结果，打印吞吐量；返回变异体数量
+    """
+    started = time.time()
+    units = 0
+    functions = set()
+
+    def counted(items):
+        nonlocal units
+        for item in items:
+            units += 1
+            yield item
+
+    with open_record_writer(output_path) as writer:
+        for record in mutate_sources(counted(iter_units(paths)), workers, mode, dedup, options=options):
+            functions.add((record['unit'], record['function']))
+            writer.write(record)
+        count = writer.count
+    elapsed = time.time() - started
+    print(f'{units} 个单元，{len(functions)} 个函数，{count} 个变异体，用时 {elapsed:.2f} 秒，'
+          f'{count / elapsed if elapsed else 0:.0f} 个变异体/秒')
+    return count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='批量生成变异体')
+    parser.add_argument('inputs', nargs='+', help='function_pairs.json / .jsonl，或 .py 文件、目录')
+    parser.add_argument('-o', '--output', default='mutants.jsonl', help='输出文件，.jsonl 或 .parquet')
+    parser.add_argument('--workers', type=int, default=None, help='工作进程数，默认为 CPU 核数，0 表示不用多进程')
+    parser.add_argument('--mode', choices=['span', 'ast'], default='span', help='变异体源码的生成方式')
+    parser.add_argument('--dedup', action='store_true', help='去掉等价和重复的变异体')
+    parser.add_argument('--operators', nargs='+', choices=OPERATOR_NAMES, default=None, help='启用的变异算子，默认全部')
+    parser.add_argument('--sample', nargs='+', default=[], metavar='算子=概率', help='按概率保留某个算子的变异体，如 CRP=0.2')
+    parser.add_argument('--budget', type=int, default=None, help='每个函数最多产生的变异体数')
+    parser.add_argument('--seed', type=int, default=0, help='抽样的随机种子')
+    args = parser.parse_args()
+    if args.output.endswith('.parquet') and not PYARROW_AVAILABLE:
+        print('输出 Parquet 需要安装 pyarrow')
+        sys.exit(1)
+    sample_rates = {}
+    for item in args.sample:
+        name, _, rate = item.partition('=')
+        sample_rates[name] = float(rate)
+    options = {'operators': args.operators, 'sample_rates': sample_rates, 'budget': args.budget, 'seed': args.seed}
+    try:
+        Mutator(**options)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    run_batch(args.inputs, args.output, args.workers, args.mode, args.dedup, options)
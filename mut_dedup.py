@@ -0,0 +1,201 @@
+import ast
+import math
+import operator
+from collections import Counter
+
+from mut import resolve_path, copy_with_mutation
+
+# 等价 / 重复变异体检测：对变异后的函数计算规范化 AST 的指纹，指纹与原函数相同的是等价变异体，
+# 与之前某个变异体相同的是重复变异体，两者都不需要执行测试。
+# 规范化规则都很便宜且保证语义不变：
+#   常量折叠        2 * 3 -> 6，-(1) -> -1（只折叠数值常量，结果过大时不折叠）
+#   布尔恒等式      条件位置上 x and True / x or False -> x（COI 插入的正是这两种）
+#   空语句          语句列表中的 pass 去掉；函数体末尾的 pass、return、return None 去掉
+# 变异树与原树共享未修改的子树，指纹按节点缓存，每个变异体只需重新计算根到变异点路径上的节点。
+
+EQUIVALENT, DUPLICATE = 'equivalent', 'duplicate'
+
+BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow
+}
+
+UNARY_OPERATORS = {
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+    ast.Invert: operator.invert,
+    ast.Not: operator.not_
+}
+
+# 常量折叠的结果超过这个绝对值就放弃折叠，避免 10 ** 10 ** 10 之类的计算
+MAX_FOLDED = 2 ** 64
+
+# 这些字段的值只看真假：其中的 and / or 可以按布尔恒等式化简
+TEST_FIELDS = {
+    (ast.If, 'test'),
+    (ast.While, 'test'),
+    (ast.IfExp, 'test'),
+    (ast.Assert, 'test'),
+    (ast.comprehension, 'ifs')
+}
+
+STATEMENT_LIST_FIELDS = ('body', 'orelse', 'finalbody')
+
+
+def mutation_operator(original, replacement):
+    """
+    根据原节点和替换节点判断补丁来自哪个变异算子；Mutator 产生的补丁自带 operator，只有外部构造的补丁才需要推断
+    """
+    if isinstance(original, ast.BinOp):
+        same_operands = isinstance(replacement, ast.BinOp) and replacement.left is original.left
+        return 'AOR' if same_operands else 'AOD'
+    if isinstance(original, ast.BoolOp):
+        return 'LCR' if isinstance(replacement, ast.BoolOp) and replacement.values is original.values else 'LOD'
+    if isinstance(original, ast.If):
+        return 'COI' if isinstance(replacement, ast.If) else 'COD'
+    if isinstance(original, ast.FunctionDef):
+        return 'SCI' if replacement.body is not original.body else 'DDL'
+    for node_type, name in ((ast.AugAssign, 'ASR'), (ast.Assign, 'ASR'), (ast.Break, 'BCR'), (ast.Continue, 'BCR'),
+                            (ast.Constant, 'CRP'), (ast.Try, 'EHD'), (ast.ExceptHandler, 'EXS'),
+                            (ast.UnaryOp, 'LOR'), (ast.Compare, 'ROR'), (ast.Call, 'SCD'), (ast.Subscript, 'SIR'),
+                            (ast.Return, 'COD')):
+        if isinstance(original, node_type):
+            return name
+    return type(original).__name__
+
+
+def _fold(function, *operands):
+    # 折叠失败（除零、溢出、类型错误）或结果过大时返回 None，保留原表达式
+    try:
+        value = function(*operands)
+    except Exception:
+        return None
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, bool) or (isinstance(value, (int, float)) and abs(value) <= MAX_FOLDED):
+        return 'Constant', type(value).__name__, repr(value)
+    return None
+
+
+def _constant_value(key):
+    # 指纹为数值常量时返回 (True, 值)
+    if isinstance(key, tuple) and len(key) == 3 and key[0] == 'Constant' and key[1] in ('int', 'float', 'bool'):
+        return True, {'int': int, 'float': float, 'bool': lambda text: text == 'True'}[key[1]](key[2])
+    return False, None
+
+
+class Fingerprinter:
+    """
+    计算节点的规范化指纹（可哈希的嵌套元组）；同一个 Fingerprinter 在多个共享子树的变异树之间复用缓存
+    """
+
+    def __init__(self):
+        # id(节点), 是否处于条件位置 -> (节点, 指纹)；保存节点本身，防止节点被回收后 id 被复用
+        self.cache = {}
+
+    def fingerprint(self, node, test=False):
+        if isinstance(node, list):
+            return tuple(self.fingerprint(item, test) for item in node)
+        if not isinstance(node, ast.AST):
+            return type(node).__name__, repr(node)
+        cache_key = (id(node), test)
+        cached = self.cache.get(cache_key)
+        if cached is not None and cached[0] is node:
+            return cached[1]
+        key = self._fingerprint(node, test)
+        self.cache[cache_key] = (node, key)
+        return key
+
+    def _fingerprint(self, node, test):
+        if isinstance(node, ast.Constant):
+            return 'Constant', type(node.value).__name__, repr(node.value)
+        if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+            left_is_number, left = _constant_value(self.fingerprint(node.left))
+            right_is_number, right = _constant_value(self.fingerprint(node.right))
+            if left_is_number and right_is_number and not (isinstance(node.op, ast.Pow) and abs(right) > 64):
+                folded = _fold(BINARY_OPERATORS[type(node.op)], left, right)
+                if folded is not None:
+                    return folded
+        if isinstance(node, ast.UnaryOp):
+            operand = self.fingerprint(node.operand, test=isinstance(node.op, ast.Not))
+            is_number, value = _constant_value(operand)
+            if is_number:
+                folded = _fold(UNARY_OPERATORS[type(node.op)], value)
+                if folded is not None:
+                    return folded
+            return 'UnaryOp', type(node.op).__name__, operand
+        if isinstance(node, ast.BoolOp) and test:
+            return self._boolean_fingerprint(node)
+
+        fields = [type(node).__name__]
+        for field, value in ast.iter_fields(node):
+            if field in STATEMENT_LIST_FIELDS and isinstance(value, list):
+                value = self._statements(node, field, value)
+            fields.append((field, self.fingerprint(value, test=(type(node), field) in TEST_FIELDS)))
+        return tuple(fields)
+
+    def _boolean_fingerprint(self, node):
+        # 只关心真假时：and 中的真值常量、or 中的假值常量可以去掉，只剩一项时就是那一项本身
+        keep_if_truthy = isinstance(node.op, ast.Or)
+        values = []
+        for value in node.values:
+            key = self.fingerprint(value, test=True)
+            if isinstance(value, ast.Constant) and bool(value.value) != keep_if_truthy:
+                continue
+            values.append(key)
+        if len(values) == 1:
+            return values[0]
+        return 'BoolOp', type(node.op).__name__, tuple(values)
+
+    def _statements(self, node, field, statements):
+        # pass 是空操作；函数体末尾不带值的 return 与自然结束等价
+        statements = [statement for statement in statements if not isinstance(statement, ast.Pass)]
+        if field == 'body' and isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            while statements and isinstance(statements[-1], ast.Return) and (
+                    statements[-1].value is None
+                    or (isinstance(statements[-1].value, ast.Constant) and statements[-1].value.value is None)):
+                statements.pop()
+        return statements
+
+
+class MutantDeduplicator:
+    """
+    用法：dedup = MutantDeduplicator(原函数的 FunctionDef)；dedup.check(补丁) -> None / 'equivalent' / 'duplicate'；
+    dedup.removed 按 (算子, 类别) 统计去掉的数量
+    """
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.fingerprinter = Fingerprinter()
+        self.original = self.fingerprinter.fingerprint(tree)
+        self.seen = set()
+        self.removed = Counter()
+
+    def check(self, mutation):
+        key = self.fingerprinter.fingerprint(copy_with_mutation(self.tree, mutation))
+        if key == self.original:
+            kind = EQUIVALENT
+        elif key in self.seen:
+            kind = DUPLICATE
+        else:
+            self.seen.add(key)
+            return None
+        name = mutation.operator
+        if name is None:
+            name = mutation_operator(resolve_path(self.tree, mutation.path), mutation.replacement)
+        self.removed[(name, kind)] += 1
+        return kind
+
+    def report(self):
+        """
+        {算子: {'equivalent': n, 'duplicate': m}}
+        """
+        report = {}
+        for (name, kind), count in sorted(self.removed.items()):
+            report.setdefault(name, {EQUIVALENT: 0, DUPLICATE: 0})[kind] = count
+        return report
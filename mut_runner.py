@@ -0,0 +1,600 @@
+import os
+import ast
+import sys
+import json
+import time
+import signal
+import select
+import argparse
+import importlib
+import tempfile
+import functools
+import multiprocessing
+from collections import deque, namedtuple
+from multiprocessing.connection import wait
+
+from contextlib import contextmanager
+
+from mut import Mutator, SourcePatcher, SCHEMA_SELECTOR, mutation_lines
+from mut_dedup import MutantDeduplicator, EQUIVALENT, DUPLICATE
+from dataset.function_index import index_functions
+from dataset.json_stream import iter_json_array
+
+# 变异测试执行器：对 function_pairs.json 中的每个函数对，先用原函数跑一次配对的测试（基线），
+# 基线通过后为函数生成全部变异体，在多个 fork 出的工作进程中逐个执行测试，结果逐条写入磁盘。
+# 单个变异体的结果：
+#   killed    测试失败（断言失败或抛出异常）
+#   survived  测试通过
+#   timeout   超过时限（BCR / COD 等变异可能造成死循环）
+#   error     变异体无法编译或测试无法加载
+#   not_covered  变异位置不在基线测试执行到的行上，必然存活，不执行（计入分数时按 survived 处理）
+KILLED, SURVIVED, TIMEOUT, ERROR, NOT_COVERED = 'killed', 'survived', 'timeout', 'error', 'not_covered'
+STATUSES = (KILLED, SURVIVED, TIMEOUT, ERROR, NOT_COVERED)
+
+# 被测函数编译时使用的文件名，覆盖率只统计这个文件中的行
+MUTANT_FILENAME = '<mutant>'
+
+# mutant_id 为 -1 的任务是基线：用原函数执行测试
+BASELINE_ID = -1
+
+# 变异体时限 = max(MIN_TIMEOUT, 基线耗时 * TIMEOUT_FACTOR)；工作进程内用 SIGALRM 中断，
+# 超过时限 HARD_TIMEOUT_GRACE 秒仍未返回（如卡在 C 扩展里）时由主进程杀掉工作进程
+MIN_TIMEOUT = 1.0
+TIMEOUT_FACTOR = 10
+HARD_TIMEOUT_GRACE = 2.0
+
+# 工作进程启动时预先导入的模块，测试代码中可以直接使用这些名字
+PRELOAD_MODULES = ('pytest',)
+
+# coverage 为 True 时记录被测函数在测试中执行到的行（只用于基线）；
+# schema_id 不为 None 时 function_code 是元变异体，执行前把 __mut_id__ 设为该编号
+MutantTask = namedtuple('MutantTask', ['pair_id', 'mutant_id', 'function_code', 'test_code', 'test_name', 'timeout',
+                                       'function_name', 'module', 'coverage', 'schema_id'],
+                        defaults=(None, None, False, None))
+
+
+@functools.lru_cache(maxsize=256)
+def compile_cached(source, filename):
+    # 同一函数对的元变异体和测试代码在每个变异体上都相同，只编译一次
+    return compile(source, filename, 'exec')
+
+
+class MutantTimeout(BaseException):
+    # 继承 BaseException，测试代码里的 except Exception 不会吞掉它
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise MutantTimeout()
+
+
+def preload_modules(names):
+    """
+    导入预加载模块，返回 {名字: 模块}；没有安装的模块跳过
+    """
+    modules = {}
+    for name in names:
+        try:
+            modules[name] = importlib.import_module(name)
+        except ImportError:
+            pass
+    return modules
+
+
+def swap_function_code(module, function_name, namespace):
+    # 把被测模块中原函数的 __code__ 换成变异体的，其他模块 import 进来的引用也随之生效；
+    # 闭包变量数量不同时无法替换，仍使用命名空间中的新函数
+    original = getattr(module, function_name, None)
+    mutant = namespace.get(function_name)
+    if original is None or mutant is None or not hasattr(original, '__code__'):
+        return
+    if len(original.__code__.co_freevars) != len(mutant.__code__.co_freevars):
+        return
+    original.__code__ = mutant.__code__
+    namespace[function_name] = original
+
+
+@contextmanager
+def record_coverage(covered):
+    """
+    把 MUTANT_FILENAME 中执行到的行号加入 covered；3.12 及以上用 sys.monitoring，开销远小于 sys.settrace
+    """
+    monitoring = getattr(sys, 'monitoring', None)
+    if monitoring is not None:
+        tool = monitoring.COVERAGE_ID
+
+        def on_line(code, line):
+            if code.co_filename != MUTANT_FILENAME:
+                return monitoring.DISABLE
+            covered.add(line)
+
+        monitoring.use_tool_id(tool, 'mut_runner')
+        monitoring.register_callback(tool, monitoring.events.LINE, on_line)
+        monitoring.set_events(tool, monitoring.events.LINE)
+        try:
+            yield
+        finally:
+            monitoring.set_events(tool, 0)
+            monitoring.register_callback(tool, monitoring.events.LINE, None)
+            monitoring.free_tool_id(tool)
+            monitoring.restart_events()
+        return
+
+    def trace_lines(frame, event, arg):
+        if event == 'line':
+            covered.add(frame.f_lineno)
+        return trace_lines
+
+    def trace_calls(frame, event, arg):
+        # 只对被测函数的栈帧开启逐行跟踪，测试本身和库代码不受影响
+        return trace_lines if frame.f_code.co_filename == MUTANT_FILENAME else None
+
+    previous = sys.gettrace()
+    sys.settrace(trace_calls)
+    try:
+        yield
+    finally:
+        sys.settrace(previous)
+
+
+def run_test(function_code, test_code, test_name, timeout, preloaded=None, target=None, covered=None,
+             schema_id=None):
+    """
+    在全新的命名空间中定义函数和测试并执行测试，返回 (状态, 说明)；
+    timeout 为 None 时不设时限（由 fork 服务进程负责）；target 为 (被测模块, 函数名) 时原地替换函数的代码对象；
+    covered 为集合时记录测试执行到的被测函数行号；schema_id 为元变异体中要启用的变异体编号
+    """
+    namespace = {'__name__': '__mutant__'}
+    namespace.update(preloaded or {})
+    if schema_id is not None:
+        namespace[SCHEMA_SELECTOR] = schema_id
+        if target is not None:
+            # 替换代码对象后函数仍使用被测模块的全局变量
+            setattr(target[0], SCHEMA_SELECTOR, schema_id)
+    try:
+        exec(compile_cached(function_code, MUTANT_FILENAME), namespace)
+        if target is not None:
+            swap_function_code(target[0], target[1], namespace)
+        exec(compile_cached(test_code, '<test>'), namespace)
+        test = namespace[test_name]
+    except BaseException as e:
+        return ERROR, f'{type(e).__name__}: {e}'
+
+    use_alarm = timeout is not None and hasattr(signal, 'setitimer')
+    if use_alarm:
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        if covered is None:
+            test()
+        else:
+            with record_coverage(covered):
+                test()
+        return SURVIVED, ''
+    except MutantTimeout:
+        return TIMEOUT, f'超过 {timeout:.2f} 秒'
+    except (Exception, SystemExit) as e:
+        return KILLED, type(e).__name__
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+def _prepare_worker(quiet):
+    # 工作进程：在临时目录中运行，避免变异体写坏工作目录；屏蔽被测代码的输出
+    os.chdir(tempfile.mkdtemp(prefix='mut_worker_'))
+    if quiet:
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, 1)
+        os.dup2(devnull, 2)
+    if hasattr(signal, 'SIGALRM'):
+        signal.signal(signal.SIGALRM, _on_alarm)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _worker_main(conn, quiet, preload):
+    # 'inprocess' 后端：所有变异体在同一个工作进程里依次执行
+    _prepare_worker(quiet)
+    preloaded = preload_modules(preload)
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        covered = set() if task.coverage else None
+        start = time.perf_counter()
+        status, detail = run_test(task.function_code, task.test_code, task.test_name, task.timeout, preloaded,
+                                  covered=covered, schema_id=task.schema_id)
+        conn.send((task.pair_id, task.mutant_id, status, detail, time.perf_counter() - start,
+                   sorted(covered) if covered is not None else None))
+
+
+def run_forked(task, preloaded, target):
+    """
+    fork 一个写时复制的子进程执行单个变异体，超时直接杀掉子进程；子进程之间互不影响。
+    返回 (状态, 说明, 覆盖的行号列表或 None)
+    """
+    # 在服务进程中编译并缓存，fork 出的子进程直接使用编译好的代码对象
+    for source, filename in ((task.function_code, MUTANT_FILENAME), (task.test_code, '<test>')):
+        try:
+            compile_cached(source, filename)
+        except (SyntaxError, ValueError):
+            pass
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        covered = set() if task.coverage else None
+        try:
+            status, detail = run_test(task.function_code, task.test_code, task.test_name, None, preloaded, target,
+                                      covered, task.schema_id)
+        except BaseException as e:
+            status, detail = ERROR, f'{type(e).__name__}: {e}'
+        covered = sorted(covered) if covered is not None else None
+        os.write(write_fd, json.dumps([status, detail, covered], ensure_ascii=False).encode('utf-8'))
+        os._exit(0)
+
+    os.close(write_fd)
+    try:
+        ready, _, _ = select.select([read_fd], [], [], task.timeout)
+        if not ready:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            return TIMEOUT, f'超过 {task.timeout:.2f} 秒', None
+        chunks = []
+        while True:
+            chunk = os.read(read_fd, 65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        _, wait_status = os.waitpid(pid, 0)
+    finally:
+        os.close(read_fd)
+    if not chunks:
+        # 子进程没有写回结果就退出了（段错误、os._exit 等），视为被杀死
+        return KILLED, f'子进程异常退出，状态 {wait_status}', None
+    status, detail, covered = json.loads(b''.join(chunks))
+    return status, detail, covered
+
+
+def _fork_server_main(conn, quiet, preload):
+    # 'fork' 后端：服务进程只预先导入一次模块（pytest、被测模块），每个变异体 fork 一个子进程执行
+    _prepare_worker(quiet)
+    preloaded = preload_modules(preload)
+    modules = {}
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        target = None
+        if task.module and task.function_name:
+            if task.module not in modules:
+                modules[task.module] = preload_modules([task.module]).get(task.module)
+            if modules[task.module] is not None:
+                target = (modules[task.module], task.function_name)
+        start = time.perf_counter()
+        status, detail, covered = run_forked(task, preloaded, target)
+        conn.send((task.pair_id, task.mutant_id, status, detail, time.perf_counter() - start, covered))
+
+
+WORKER_BACKENDS = {
+    'fork': _fork_server_main,
+    'inprocess': _worker_main
+}
+
+
+class Worker:
+    def __init__(self, context, quiet, backend='inprocess', preload=PRELOAD_MODULES):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=WORKER_BACKENDS[backend], args=(child_conn, quiet, preload), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.task = None
+        self.deadline = None
+
+    def submit(self, task):
+        self.task = task
+        self.deadline = time.time() + task.timeout + HARD_TIMEOUT_GRACE
+        self.conn.send(task)
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+        self.conn.close()
+
+
+def pair_mutants(function_code, mode='span', dedup=True, schemata=True):
+    """
+    生成函数的变异体，返回 ([(编号, 源码, 行号范围或 None)], 按算子统计的去重数量, 元变异体源码或 None)；
+    mode 为 'span' 时按源码位置拼接，'ast' 时整树输出；dedup 为 True 时去掉等价和重复的变异体，编号保持不变；
+    schemata 为 True 时能放进元变异体的变异体不再单独生成源码，其源码位置为 None
+    """
+    tree = ast.parse(function_code)
+    func_def = tree.body[0]
+    mutator = Mutator()
+    deduplicator = MutantDeduplicator(func_def) if dedup else None
+    mutations = []
+    for index, mutation in list(mutator.iter_indexed_mutations(func_def)):
+        if deduplicator is None or deduplicator.check(mutation) is None:
+            mutations.append((index, mutation))
+    removed = deduplicator.report() if deduplicator is not None else {}
+
+    schema_code, schema_ids = mutator.meta_mutant(func_def, mutations) if schemata else (None, [])
+    schema_ids = set(schema_ids)
+    patcher = SourcePatcher(function_code, func_def) if mode == 'span' else None
+    mutants = []
+    for index, mutation in mutations:
+        code = None if index in schema_ids else mutator.render(func_def, mutation, patcher)
+        mutants.append((index, code, mutation_lines(func_def, mutation)))
+    return mutants, removed, schema_code
+
+
+def is_covered(lines, covered):
+    # 行号范围内任意一行被执行过即视为覆盖；没有行号范围的变异总是执行
+    if lines is None:
+        return True
+    return any(line in covered for line in range(lines[0], lines[1] + 1))
+
+
+class MutationRunner:
+    """
+    用法：MutationRunner(workers=8).run(函数对的可迭代对象, 结果文件, 分数文件)
+    结果文件每个变异体一行，分数文件每个函数对一行，均为追加写入；已出现在分数文件中的函数对会被跳过
+    """
+
+    def __init__(self, workers=None, min_timeout=MIN_TIMEOUT, timeout_factor=TIMEOUT_FACTOR,
+                 mode='span', quiet=True, max_pending=None, backend=None, preload=PRELOAD_MODULES, coverage=True,
+                 dedup=True, schemata=True):
+        self.workers_count = workers or os.cpu_count() or 1
+        # 默认使用 fork 服务进程：每个变异体一个写时复制的子进程，隔离干净，启动开销只有一次 fork；
+        # 不支持 os.fork 的平台只能在工作进程里依次执行
+        self.backend = backend or ('fork' if hasattr(os, 'fork') else 'inprocess')
+        self.preload = tuple(preload)
+        # 基线执行时记录覆盖率，测试没有执行到的变异位置直接记为 not_covered，不再执行
+        self.coverage = coverage
+        # 执行前去掉等价变异体（与原函数相同）和重复变异体（与之前的变异体相同）
+        self.dedup = dedup
+        self.removed = dict.fromkeys((EQUIVALENT, DUPLICATE), 0)
+        # 变异体模式：一个函数对的变异体共用一个元变异体，只编译一次，按编号切换
+        self.schemata = schemata
+        self.min_timeout = min_timeout
+        self.timeout_factor = timeout_factor
+        self.mode = mode
+        self.quiet = quiet
+        self.max_pending = max_pending or self.workers_count * 4
+        methods = multiprocessing.get_all_start_methods()
+        # fork 出的工作进程直接继承已导入的模块，启动快；不支持 fork 的平台退回 spawn
+        self.context = multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+        self.pairs = {}
+        self.pending = deque()
+        self.totals = dict.fromkeys(STATUSES, 0)
+
+    def _new_worker(self):
+        return Worker(self.context, self.quiet, self.backend, self.preload)
+
+    def _start_pair(self, pair_id, pair):
+        self.pairs[pair_id] = {
+            'pair': pair,
+            'remaining': None,
+            'counts': dict.fromkeys(STATUSES, 0),
+            'removed': {}
+        }
+        self.pending.append(MutantTask(pair_id, BASELINE_ID, pair['function_code'], pair['test_function_code'],
+                                       pair['test_function_name'], max(self.min_timeout, 10.0),
+                                       pair.get('function_name'), pair.get('function_module'), self.coverage))
+
+    def _on_result(self, result, results_file, scores_file):
+        pair_id, mutant_id, status, detail, seconds, covered = result
+        state = self.pairs[pair_id]
+        pair = state['pair']
+        if mutant_id == BASELINE_ID:
+            if status != SURVIVED:
+                # 原函数上测试就不通过（缺少依赖、需要 fixture 等），这个函数对无法做变异分析
+                self._finish_pair(pair_id, scores_file, baseline=f'{status}: {detail}')
+                return
+            try:
+                mutants, state['removed'], schema_code = pair_mutants(pair['function_code'], self.mode, self.dedup,
+                                                                      self.schemata)
+            except SyntaxError as e:
+                self._finish_pair(pair_id, scores_file, baseline=f'{ERROR}: {e}')
+                return
+            state['remaining'] = len(mutants)
+            state['baseline_seconds'] = seconds
+            timeout = max(self.min_timeout, seconds * self.timeout_factor)
+            covered = set(covered) if self.coverage and covered is not None else None
+            for counts in state['removed'].values():
+                for kind, count in counts.items():
+                    self.removed[kind] += count
+            for index, code, lines in mutants:
+                if covered is not None and not is_covered(lines, covered):
+                    self._record(pair_id, index, NOT_COVERED, f'第 {lines[0]}-{lines[1]} 行未被测试执行', 0.0,
+                                 results_file)
+                    continue
+                self.pending.append(MutantTask(pair_id, index, schema_code if code is None else code,
+                                               pair['test_function_code'], pair['test_function_name'], timeout,
+                                               pair.get('function_name'), pair.get('function_module'),
+                                               schema_id=index if code is None else None))
+            if state['remaining'] == 0:
+                self._finish_pair(pair_id, scores_file)
+            return
+
+        self._record(pair_id, mutant_id, status, detail, seconds, results_file)
+        if state['remaining'] == 0:
+            self._finish_pair(pair_id, scores_file)
+
+    def _record(self, pair_id, mutant_id, status, detail, seconds, results_file):
+        state = self.pairs[pair_id]
+        pair = state['pair']
+        state['counts'][status] += 1
+        self.totals[status] += 1
+        results_file.write(json.dumps({
+            'pair_id': pair_id,
+            'mutant_id': mutant_id,
+            'repository': pair.get('repository'),
+            'function_name': pair.get('function_name'),
+            'test_function_name': pair.get('test_function_name'),
+            'status': status,
+            'seconds': round(seconds, 4),
+            'detail': detail
+        }, ensure_ascii=False) + '\n')
+        state['remaining'] -= 1
+
+    def _finish_pair(self, pair_id, scores_file, baseline='passed'):
+        state = self.pairs.pop(pair_id)
+        pair = state['pair']
+        counts = state['counts']
+        # 变异分数 = (killed + timeout) / (全部变异体 - error)，not_covered 与 survived 一样计入分母
+        total = sum(counts.values())
+        valid = total - counts[ERROR]
+        score = round((counts[KILLED] + counts[TIMEOUT]) / valid, 4) if valid else None
+        scores_file.write(json.dumps({
+            'pair_id': pair_id,
+            'repository': pair.get('repository'),
+            'function_name': pair.get('function_name'),
+            'test_function_name': pair.get('test_function_name'),
+            'baseline': baseline,
+            'mutants': total,
+            **counts,
+            # 因未被覆盖而跳过执行的比例
+            'skip_ratio': round(counts[NOT_COVERED] / total, 4) if total else None,
+            # 执行前去掉的等价 / 重复变异体，按算子统计，不计入 mutants
+            'removed': state['removed'],
+            'score': score
+        }, ensure_ascii=False) + '\n')
+        scores_file.flush()
+
+    def run(self, pairs, results_path='mutation_results.jsonl', scores_path='mutation_scores.jsonl'):
+        """
+        pairs 为 (pair_id, 函数对) 的可迭代对象；返回各状态的变异体数量
+        """
+        done = set()
+        if os.path.exists(scores_path):
+            with open(scores_path, 'r', encoding='utf-8') as f:
+                done = {json.loads(line)['pair_id'] for line in f if line.strip()}
+        pairs = ((pair_id, pair) for pair_id, pair in pairs if pair_id not in done)
+
+        workers = [self._new_worker() for _ in range(self.workers_count)]
+        exhausted = False
+        started = time.time()
+        try:
+            with open(results_path, 'a', encoding='utf-8') as results_file, \
+                    open(scores_path, 'a', encoding='utf-8') as scores_file:
+                while True:
+                    # 待执行任务不足时再读入新的函数对，内存中只保留少量函数对
+                    while not exhausted and len(self.pending) < self.max_pending:
+                        item = next(pairs, None)
+                        if item is None:
+                            exhausted = True
+                        else:
+                            self._start_pair(*item)
+
+                    for worker in workers:
+                        if worker.task is None and self.pending:
+                            worker.submit(self.pending.popleft())
+
+                    busy = [worker for worker in workers if worker.task is not None]
+                    if not busy:
+                        if exhausted and not self.pending:
+                            break
+                        continue
+
+                    now = time.time()
+                    wait_seconds = max(min(worker.deadline for worker in busy) - now, 0)
+                    ready = wait([worker.conn for worker in busy], timeout=wait_seconds)
+                    for worker in busy:
+                        if worker.conn in ready:
+                            try:
+                                result = worker.conn.recv()
+                            except EOFError:
+                                # 工作进程崩溃（如变异体触发段错误），视为被杀死
+                                task = worker.task
+                                result = (task.pair_id, task.mutant_id, KILLED, '工作进程异常退出', 0.0, None)
+                                worker.kill()
+                                workers[workers.index(worker)] = self._new_worker()
+                            else:
+                                worker.task = None
+                            self._on_result(result, results_file, scores_file)
+                        elif time.time() >= worker.deadline:
+                            task = worker.task
+                            worker.kill()
+                            workers[workers.index(worker)] = self._new_worker()
+                            self._on_result((task.pair_id, task.mutant_id, TIMEOUT, '工作进程被强制结束',
+                                             task.timeout, None), results_file, scores_file)
+                    results_file.flush()
+        finally:
+            for worker in workers:
+                if worker.task is None:
+                    worker.stop()
+                else:
+                    worker.kill()
+
+        elapsed = time.time() - started
+        total = sum(self.totals.values())
+        print(f"共 {total} 个变异体，执行 {total - self.totals[NOT_COVERED]} 个，用时 {elapsed:.2f} 秒："
+              + '，'.join(f'{status} {count}' for status, count in self.totals.items())
+              + f"；执行前去掉等价变异体 {self.removed[EQUIVALENT]} 个，重复变异体 {self.removed[DUPLICATE]} 个")
+        return dict(self.totals)
+
+
+def smoke_pair():
+    """
+    用 pynguin_gen 中的示例构造一个函数对：source.add 与 test_source.test_add
+    """
+    root = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(root, 'pynguin_gen', 'source', 'source.py'), 'r', encoding='utf-8') as f:
+        function = next(record for record in index_functions(f.read()) if record.name == 'add')
+    with open(os.path.join(root, 'pynguin_gen', 'target', 'test_source.py'), 'r', encoding='utf-8') as f:
+        test = next(record for record in index_functions(f.read()) if record.name == 'test_add')
+    return {
+        'function_name': function.name,
+        'function_code': function.code,
+        'function_file': 'pynguin_gen/source/source.py',
+        'test_function_name': test.name,
+        'test_function_code': test.code,
+        'test_function_file': 'pynguin_gen/target/test_source.py',
+        'repository': 'pynguin_gen',
+        # 测试文件中 from source.source import add 引用的模块，fork 后端会原地替换其中 add 的代码对象
+        'function_module': 'pynguin_gen.source.source'
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='对函数对执行变异测试')
+    parser.add_argument('input', nargs='?', default='function_pairs.json', help='函数对 JSON 文件')
+    parser.add_argument('--results', default='mutation_results.jsonl', help='逐个变异体的结果')
+    parser.add_argument('--scores', default='mutation_scores.jsonl', help='每个函数对的变异分数')
+    parser.add_argument('--workers', type=int, default=None, help='工作进程数，默认为 CPU 核数')
+    parser.add_argument('--min-timeout', type=float, default=MIN_TIMEOUT, help='单个变异体的最短时限（秒）')
+    parser.add_argument('--mode', choices=['span', 'ast'], default='span', help='变异体源码的生成方式')
+    parser.add_argument('--backend', choices=sorted(WORKER_BACKENDS), default=None,
+                        help='fork：每个变异体 fork 一个子进程；inprocess：在工作进程中依次执行')
+    parser.add_argument('--preload', nargs='*', default=list(PRELOAD_MODULES), help='工作进程预先导入的模块')
+    parser.add_argument('--no-coverage', action='store_true', help='不做覆盖率预分析，所有变异体都执行')
+    parser.add_argument('--no-dedup', action='store_true', help='不去除等价和重复的变异体')
+    parser.add_argument('--no-schemata', action='store_true', help='每个变异体单独编译，不使用元变异体')
+    parser.add_argument('--smoke', action='store_true', help='只运行 pynguin_gen 中的示例函数对')
+    args = parser.parse_args()
+
+    runner = MutationRunner(workers=args.workers, min_timeout=args.min_timeout, mode=args.mode,
+                            backend=args.backend, preload=args.preload, coverage=not args.no_coverage,
+                            dedup=not args.no_dedup, schemata=not args.no_schemata)
+    if args.smoke:
+        totals = runner.run([(0, smoke_pair())], args.results, args.scores)
+        with open(args.scores, 'r', encoding='utf-8') as f:
+            print(f.read().strip().splitlines()[-1])
+        sys.exit(0 if totals[KILLED] and not totals[SURVIVED] else 1)
+    runner.run(enumerate(iter_json_array(args.input)), args.results, args.scores)
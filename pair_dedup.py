@@ -0,0 +1,393 @@
+import os
+import re
+import ast
+import sys
+import time
+import zlib
+import shutil
+import sqlite3
+import hashlib
+import argparse
+import tempfile
+import textwrap
+import multiprocessing
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from dataset.json_stream import JsonlWriter
+from dataset.corpus_store import iter_corpus, open_corpus_writer
+
+# 函数对去重：
+#   exact  规范化 AST（去掉文档字符串、忽略格式和注释）的哈希完全相同
+#   near   MinHash 估计的 Jaccard 相似度不低于阈值，用 LSH 分带找候选，每条记录只与同一个桶里的代表比较，耗时与数据量近似线性
+# 按输入顺序保留每个簇中第一次出现的函数对。索引（精确哈希、分带桶、代表的签名）放在 SQLite 文件中，
+# 内存占用与数据量无关；签名在进程池中计算，主进程只做查找和插入，结果与工作进程数无关。
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS exact (
+    digest BLOB PRIMARY KEY,
+    cluster INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS buckets (
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    cluster INTEGER NOT NULL,
+    PRIMARY KEY (band, bucket, cluster)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS clusters (
+    cluster INTEGER PRIMARY KEY,
+    signature BLOB,
+    repository TEXT,
+    function_name TEXT,
+    size INTEGER NOT NULL
+);
+'''
+
+EXACT, NEAR = 'exact', 'near'
+MODES = ('exact', 'near', 'both')
+DEFAULT_FIELDS = ('function_code', 'test_function_code')
+
+NUM_PERM = 128
+SHINGLE_SIZE = 5
+THRESHOLD = 0.8
+BATCH_SIZE = 256
+MAX_PENDING_FACTOR = 4
+
+# MinHash 的排列：h_i(x) = (a_i * x + b_i) mod p，p 为梅森素数 2^61 - 1；系数由固定种子生成，不同进程、不同次运行一致
+MERSENNE_PRIME = (1 << 61) - 1
+COMMENT_PATTERN = re.compile(r'#[^\n]*')
+TOKEN_PATTERN = re.compile(r'[A-Za-z_][A-Za-z0-9_]*|\d+(?:\.\d+)?|[^\sA-Za-z0-9_]')
+
+
+def permutations(num_perm, seed=1):
+    state = seed
+    coefficients = []
+    for _ in range(num_perm):
+        # 线性同余生成器，不依赖 random 模块的实现细节
+        state = (state * 6364136223846793005 + 1442695040888963407) % (1 << 64)
+        a = state % (MERSENNE_PRIME - 1) + 1
+        state = (state * 6364136223846793005 + 1442695040888963407) % (1 << 64)
+        coefficients.append((a, state % MERSENNE_PRIME))
+    return coefficients
+
+
+def lsh_bands(num_perm, threshold):
+    """
+    选择分带方式 (带数, 每带行数)：b * r = num_perm，取近似阈值 (1/b)^(1/r) 不超过 threshold 的最大者，
+    宁可多给候选（之后用签名估计的相似度过滤），不漏掉相似的函数对
+    """
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        if (1 / bands) ** (1 / rows) <= threshold:
+            best = (bands, rows)
+    return best
+
+
+def tokenize(code):
+    return TOKEN_PATTERN.findall(COMMENT_PATTERN.sub('', code))
+
+
+def shingle_hashes(code, shingle_size=SHINGLE_SIZE):
+    """
+    连续 shingle_size 个词组成的片段，各取 32 位 CRC；词数不足时整段作为一个片段
+    """
+    tokens = tokenize(code)
+    if len(tokens) <= shingle_size:
+        return {zlib.crc32(' '.join(tokens).encode('utf-8'))} if tokens else set()
+    return {zlib.crc32(' '.join(tokens[i:i + shingle_size]).encode('utf-8'))
+            for i in range(len(tokens) - shingle_size + 1)}
+
+
+def minhash(hashes, coefficients):
+    if not hashes:
+        return array('Q', [MERSENNE_PRIME] * len(coefficients))
+    return array('Q', [min((a * x + b) % MERSENNE_PRIME for x in hashes) for a, b in coefficients])
+
+
+def similarity(first, second):
+    """
+    两个 MinHash 签名估计的 Jaccard 相似度
+    """
+    return sum(1 for x, y in zip(first, second) if x == y) / len(first)
+
+
+def _strip_docstrings(tree):
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Module)):
+            body = node.body
+            if body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant) \
+                    and isinstance(body[0].value.value, str):
+                node.body = body[1:] or [ast.Pass()]
+    return tree
+
+
+def normalized_code(code):
+    """
+    规范化的 AST 文本：忽略缩进、空白、注释和文档字符串；无法解析时退回压缩空白后的源码
+    """
+    try:
+        tree = ast.parse(textwrap.dedent(code))
+    except (SyntaxError, ValueError):
+        return ' '.join(code.split())
+    return ast.dump(_strip_docstrings(tree), annotate_fields=False)
+
+
+def exact_digest(texts):
+    digest = hashlib.blake2b(digest_size=16)
+    for text in texts:
+        digest.update(normalized_code(text).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.digest()
+
+
+def _fingerprint_batch(batch, mode, num_perm, shingle_size):
+    # 在工作进程中执行：每个函数对返回 (精确哈希或 None, 签名字节或 None)
+    coefficients = permutations(num_perm)
+    results = []
+    for texts in batch:
+        digest = exact_digest(texts) if mode != 'near' else None
+        signature = None
+        if mode != 'exact':
+            hashes = set()
+            for text in texts:
+                hashes |= shingle_hashes(text, shingle_size)
+            signature = minhash(hashes, coefficients).tobytes()
+        results.append((digest, signature))
+    return results
+
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class PairDeduplicator:
+    """
+    用法：
+        with PairDeduplicator(threshold=0.8) as dedup:
+            for item in dedup.deduplicate(函数对的可迭代对象):
+                ...
+    index_path 为 None 时索引放在临时目录，结束后删除；report_path 给出时每个被去掉的函数对写一行簇报告（JSONL）
+    """
+
+    def __init__(self, threshold=THRESHOLD, num_perm=NUM_PERM, shingle_size=SHINGLE_SIZE, fields=DEFAULT_FIELDS,
+                 mode='both', index_path=None, workers=None, report_path=None, batch_size=BATCH_SIZE):
+        if mode not in MODES:
+            raise ValueError(f'未知的去重方式：{mode}')
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.fields = tuple(fields)
+        self.mode = mode
+        self.workers = workers
+        self.batch_size = batch_size
+        self.bands, self.rows = lsh_bands(num_perm, threshold)
+        self.temp_dir = None
+        if index_path is None:
+            self.temp_dir = tempfile.mkdtemp(prefix='pair_dedup_')
+            index_path = os.path.join(self.temp_dir, 'index.sqlite')
+        self.conn = sqlite3.connect(index_path, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=OFF')
+        self.conn.executescript(SCHEMA)
+        self.report = JsonlWriter(report_path) if report_path else None
+        self.stats = {'total': 0, 'kept': 0, EXACT: 0, NEAR: 0}
+        self.next_id = self.conn.execute('SELECT COALESCE(MAX(cluster) + 1, 0) FROM clusters').fetchone()[0]
+
+    def _texts(self, item):
+        return tuple(item.get(field) or '' for field in self.fields)
+
+    def _fingerprints(self, items):
+        # 按输入顺序产出 (函数对, 精确哈希, 签名)；同时在途的批次有限，内存占用不随数据量增长
+        if self.workers == 0:
+            for batch in _batches(items, self.batch_size):
+                results = _fingerprint_batch([self._texts(item) for item in batch], self.mode, self.num_perm,
+                                             self.shingle_size)
+                for item, (digest, signature) in zip(batch, results):
+                    yield item, digest, signature
+            return
+        workers = self.workers or os.cpu_count() or 1
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            def drain():
+                batch, future = pending.popleft()
+                for item, (digest, signature) in zip(batch, future.result()):
+                    yield item, digest, signature
+
+            for batch in _batches(items, self.batch_size):
+                pending.append((batch, executor.submit(_fingerprint_batch, [self._texts(item) for item in batch],
+                                                       self.mode, self.num_perm, self.shingle_size)))
+                if len(pending) >= workers * MAX_PENDING_FACTOR:
+                    yield from drain()
+            while pending:
+                yield from drain()
+
+    def _band_keys(self, signature):
+        keys = []
+        for band in range(self.bands):
+            chunk = signature[band * self.rows * 8:(band + 1) * self.rows * 8]
+            keys.append(int.from_bytes(hashlib.blake2b(chunk, digest_size=8).digest(), 'big', signed=True))
+        return keys
+
+    def _find_near(self, signature, band_keys):
+        # 同一个桶里的代表都是候选，用签名估计相似度，返回最相似且达到阈值的 (簇, 相似度)
+        candidates = set()
+        for band, key in enumerate(band_keys):
+            candidates.update(row[0] for row in self.conn.execute(
+                'SELECT cluster FROM buckets WHERE band = ? AND bucket = ?', (band, key)))
+        values = array('Q')
+        values.frombytes(signature)
+        best = None
+        for cluster in sorted(candidates):
+            stored = array('Q')
+            stored.frombytes(self.conn.execute('SELECT signature FROM clusters WHERE cluster = ?',
+                                               (cluster,)).fetchone()[0])
+            score = similarity(values, stored)
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (cluster, score)
+        return best
+
+    def _add_cluster(self, item, digest, signature, band_keys):
+        cluster = self.next_id
+        self.next_id += 1
+        self.conn.execute('INSERT INTO clusters VALUES (?, ?, ?, ?, 1)',
+                          (cluster, signature, item.get('repository'), item.get('function_name')))
+        if digest is not None:
+            self.conn.execute('INSERT OR IGNORE INTO exact VALUES (?, ?)', (digest, cluster))
+        for band, key in enumerate(band_keys or ()):
+            self.conn.execute('INSERT OR IGNORE INTO buckets VALUES (?, ?, ?)', (band, key, cluster))
+
+    def _record_duplicate(self, item, index, cluster, kind, score):
+        self.stats[kind] += 1
+        self.conn.execute('UPDATE clusters SET size = size + 1 WHERE cluster = ?', (cluster,))
+        if self.report is not None:
+            repository, function_name = self.conn.execute(
+                'SELECT repository, function_name FROM clusters WHERE cluster = ?', (cluster,)).fetchone()
+            self.report.write({
+                'index': index,
+                'repository': item.get('repository'),
+                'function_name': item.get('function_name'),
+                'cluster': cluster,
+                'cluster_repository': repository,
+                'cluster_function_name': function_name,
+                'kind': kind,
+                'similarity': round(score, 4)
+            })
+
+    def deduplicate(self, items):
+        """
+        逐项产出保留的函数对（每个簇第一次出现的那个）
+        """
+        index = 0
+        in_transaction = False
+        for item, digest, signature in self._fingerprints(items):
+            if not in_transaction:
+                self.conn.execute('BEGIN')
+                in_transaction = True
+            self.stats['total'] += 1
+            found = None
+            if digest is not None:
+                row = self.conn.execute('SELECT cluster FROM exact WHERE digest = ?', (digest,)).fetchone()
+                if row is not None:
+                    found = (row[0], EXACT, 1.0)
+            band_keys = self._band_keys(signature) if signature is not None else None
+            if found is None and band_keys is not None:
+                near = self._find_near(signature, band_keys)
+                if near is not None:
+                    found = (near[0], NEAR, near[1])
+            if found is None:
+                self._add_cluster(item, digest, signature, band_keys)
+                self.stats['kept'] += 1
+            else:
+                self._record_duplicate(item, index, *found)
+            index += 1
+            if index % self.batch_size == 0:
+                self.conn.execute('COMMIT')
+                in_transaction = False
+            if found is None:
+                yield item
+        if in_transaction:
+            self.conn.execute('COMMIT')
+
+    def largest_clusters(self, limit=10):
+        """
+        [(代表的仓库, 代表的函数名, 簇大小)]，按簇大小降序
+        """
+        return self.conn.execute('SELECT repository, function_name, size FROM clusters WHERE size > 1 '
+                                 'ORDER BY size DESC, cluster LIMIT ?', (limit,)).fetchall()
+
+    def summary(self):
+        return dict(self.stats, largest_clusters=self.largest_clusters())
+
+    def close(self):
+        if self.report is not None:
+            self.report.close()
+            self.report = None
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+        if self.temp_dir is not None:
+            shutil.rmtree(self.temp_dir, ignore_errors=True)
+            self.temp_dir = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def deduplicate_files(input_paths, output_path, **options):
+    """
+    合并多个函数对文件（JSON 数组、JSONL 或语料）并去重，流式写出；输出扩展名为 .sqlite 时写成语料；返回统计信息
+    """
+    started = time.time()
+
+    def items():
+        for path in input_paths:
+            yield from iter_corpus(path)
+
+    with PairDeduplicator(**options) as dedup:
+        with open_corpus_writer(output_path) as writer:
+            writer.write_all(dedup.deduplicate(items()))
+        summary = dedup.summary()
+    elapsed = time.time() - started
+    print(f"共 {summary['total']} 个函数对，保留 {summary['kept']} 个，"
+          f"精确重复 {summary[EXACT]} 个，近似重复 {summary[NEAR]} 个，用时 {elapsed:.2f} 秒")
+    for repository, function_name, size in summary['largest_clusters']:
+        print(f'  {size:6d}  {repository} {function_name}')
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='函数对去重（规范化 AST 精确去重 + MinHash/LSH 近似去重）')
+    parser.add_argument('inputs', nargs='+', help='函数对文件，JSON 数组、JSONL 或语料（.sqlite / .parquet）')
+    parser.add_argument('-o', '--output', default='merged_output.json', help='去重后的输出文件，.sqlite 时写成语料')
+    parser.add_argument('--mode', choices=MODES, default='both', help='exact：只做精确去重；near：只做近似去重')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help='近似重复的 Jaccard 相似度阈值')
+    parser.add_argument('--num-perm', type=int, default=NUM_PERM, help='MinHash 签名长度')
+    parser.add_argument('--shingle-size', type=int, default=SHINGLE_SIZE, help='每个片段包含的词数')
+    parser.add_argument('--fields', nargs='+', default=list(DEFAULT_FIELDS), help='参与比较的字段')
+    parser.add_argument('--workers', type=int, default=None, help='计算签名的进程数，0 表示不用多进程')
+    parser.add_argument('--index', default=None, help='索引文件路径，默认使用临时文件')
+    parser.add_argument('--report', default=None, help='簇报告（JSONL），每个被去掉的函数对一行')
+    args = parser.parse_args()
+    try:
+        deduplicate_files(args.inputs, args.output, threshold=args.threshold, num_perm=args.num_perm,
+                          shingle_size=args.shingle_size, fields=args.fields, mode=args.mode,
+                          index_path=args.index, workers=args.workers, report_path=args.report)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
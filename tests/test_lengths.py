@@ -0,0 +1,36 @@
+from export import apply_template
+from lengths import TokenCounter, LengthStage, truncate_record
+
+FUNCTION = 'def add(a, b):\n    total = a + b\n    return total\n' + ''.join(f'\n# 注释 {i}' for i in range(40))
+TEST = 'def test_add():\n    assert add(1, 2) == 3\n'
+PAIR = {'function_code': FUNCTION, 'test_function_code': TEST}
+
+
+def counter():
+    return TokenCounter(workers=0)
+
+
+def test_chat_truncation_keeps_assistant_message():
+    record = apply_template(PAIR, 'chat')
+    tokens = counter()
+    truncated, length = truncate_record(record, 64, tokens)
+    assert length <= 64
+    user, assistant = truncated['messages']
+    assert assistant['content'] == record['messages'][1]['content']
+    assert user['content'] and len(user['content']) < len(record['messages'][0]['content'])
+
+
+def test_chatglm_truncation_keeps_output():
+    record = apply_template(PAIR, 'chatglm')
+    truncated, length = truncate_record(record, 64, counter())
+    assert length <= 64
+    assert truncated['output'] == record['output']
+    assert truncated['instruction'] == record['instruction']
+    assert truncated['input'] and record['input'].startswith(truncated['input'])
+
+
+def test_record_dropped_when_target_does_not_fit():
+    stage = LengthStage(counter(), max_tokens=8, truncate=True)
+    for template in ('chat', 'chatglm'):
+        assert list(stage.process([apply_template(PAIR, template)])) == []
+    assert stage.dropped == 2 and stage.truncated == 0
@@ -0,0 +1,41 @@
+import ast
+import signal
+from contextlib import contextmanager
+
+import pytest
+
+from mut import Mutator
+
+
+@contextmanager
+def time_limit(seconds):
+    def expired(signum, frame):
+        raise TimeoutError(f'超过 {seconds} 秒')
+    previous = signal.signal(signal.SIGALRM, expired)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def function_def(code):
+    return ast.parse(code).body[0]
+
+
+@pytest.mark.skipif(not hasattr(signal, 'setitimer'), reason='需要 SIGALRM')
+def test_different_operator_finishes_when_patches_share_one_operator():
+    # 几乎所有补丁都是同一个算子（CRP）时，不能为了凑够 limit 扫描全部组合
+    tree = function_def('def f():\n    return [' + ', '.join(str(i) for i in range(200)) + ']\n')
+    with time_limit(10):
+        combinations = list(Mutator().iter_higher_order(tree, max_order=3, limit=10, strategy='different_operator'))
+    assert len(combinations) <= 10
+
+
+def test_different_operator_yields_distinct_operators():
+    tree = function_def('def f(a, b):\n    if a > b and not a:\n        return a + b * 2\n    return [a - 1, b // 3]\n')
+    combinations = list(Mutator().iter_higher_order(tree, max_order=3, limit=50, strategy='different_operator'))
+    assert len(combinations) == 50
+    for combination in combinations:
+        assert len({mutation.operator for mutation in combination}) == len(combination)